@@ -0,0 +1,298 @@
+"""
+Adaptive (FGK) Huffman coding.
+
+Encoder and decoder start from the same tree, which holds only a NYT
+("not yet transmitted") leaf, and update it the same way after every
+symbol, so no tree has to be stored and output can start with the first
+symbol. A symbol that has not been seen before is sent as the code for NYT
+followed by the symbol in LITERAL_BITS bits; the literal END marks the end
+of the data, so the size does not have to be known in advance either.
+
+The tree keeps the sibling property: listed from the root down, level by
+level and right to left, weights never increase. Before a node's weight
+goes up it is swapped with the first node of its weight in that list,
+which keeps the list in order.
+"""
+
+from bitio import BitReader, BitWriter
+
+
+LITERAL_BITS = 9
+END = 1 << (LITERAL_BITS - 1)
+
+
+class AdaptiveTree:
+    """ The tree shared by AdaptiveEncoder and AdaptiveDecoder.
+
+    Nodes are ids into the arrays below; order lists the ids by
+    decreasing weight, root first and NYT last.
+
+    Attributes:
+    ===========
+    @param list[int] weight: number of times each node has been passed
+    @param list[int] parent: parent of each node, -1 for the root
+    @param list[int] left: left child of each node, -1 for a leaf
+    @param list[int] right: right child of each node, -1 for a leaf
+    @param list[int] symbol: symbol of each leaf, -1 otherwise
+    @param list[int] order: node ids by decreasing weight
+    @param list[int] pos: position of each node in order
+    @param dict(int,int) first: position in order of the first node with
+        each weight
+    @param dict(int,int) leaves: leaf of each symbol seen so far
+    @param int nyt: the NYT leaf
+    """
+
+    def __init__(self):
+        """ Create a new AdaptiveTree holding only the NYT leaf.
+
+        @param AdaptiveTree self: this AdaptiveTree
+        @rtype: NoneType
+        """
+        self.weight = [0]
+        self.parent = [-1]
+        self.left = [-1]
+        self.right = [-1]
+        self.symbol = [-1]
+        self.order = [0]
+        self.pos = [0]
+        self.first = {0: 0}
+        self.leaves = {}
+        self.nyt = 0
+
+    def code(self, node):
+        """ Return the code of node as (value, length).
+
+        @param AdaptiveTree self: this AdaptiveTree
+        @param int node: a node of this tree
+        @rtype: tuple(int,int)
+
+        >>> t = AdaptiveTree()
+        >>> t.update(65)
+        >>> t.code(t.leaves[65]), t.code(t.nyt)
+        ((1, 1), (0, 1))
+        """
+        parent, right = self.parent, self.right
+        value = length = 0
+        while parent[node] >= 0:
+            if right[parent[node]] == node:
+                value |= 1 << length
+            length += 1
+            node = parent[node]
+        return value, length
+
+    def _add(self, symbol, weight, parent):
+        """ Add a leaf at the end of order and return it.
+
+        @param AdaptiveTree self: this AdaptiveTree
+        @param int symbol: symbol of the leaf
+        @param int weight: weight of the leaf
+        @param int parent: parent of the leaf
+        @rtype: int
+        """
+        node = len(self.weight)
+        self.weight.append(weight)
+        self.parent.append(parent)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.symbol.append(symbol)
+        self.pos.append(len(self.order))
+        self.order.append(node)
+        return node
+
+    def _swap(self, a, b):
+        """ Swap nodes a and b, neither an ancestor of the other, along
+        with their subtrees.
+
+        @param AdaptiveTree self: this AdaptiveTree
+        @param int a: a node
+        @param int b: another node
+        @rtype: NoneType
+        """
+        pa, pb = self.parent[a], self.parent[b]
+        if pa == pb:
+            self.left[pa], self.right[pa] = self.right[pa], self.left[pa]
+        else:
+            if self.left[pa] == a:
+                self.left[pa] = b
+            else:
+                self.right[pa] = b
+            if self.left[pb] == b:
+                self.left[pb] = a
+            else:
+                self.right[pb] = a
+            self.parent[a], self.parent[b] = pb, pa
+        i, j = self.pos[a], self.pos[b]
+        self.order[i], self.order[j] = b, a
+        self.pos[a], self.pos[b] = j, i
+
+    def _increment(self, node):
+        """ Add one to the weight of node, first swapping it with the first
+        node of its weight in order, which must not be its parent.
+
+        @param AdaptiveTree self: this AdaptiveTree
+        @param int node: a node
+        @rtype: NoneType
+        """
+        w = self.weight[node]
+        leader = self.order[self.first[w]]
+        if leader != node:
+            self._swap(node, leader)
+        i = self.pos[node]
+        if (i + 1 < len(self.order) and
+                self.weight[self.order[i + 1]] == w):
+            self.first[w] = i + 1
+        else:
+            del self.first[w]
+        self.first.setdefault(w + 1, i)
+        self.weight[node] = w + 1
+
+    def update(self, symbol):
+        """ Count one more occurrence of symbol.
+
+        @param AdaptiveTree self: this AdaptiveTree
+        @param int symbol: symbol that was just coded
+        @rtype: NoneType
+
+        >>> t = AdaptiveTree()
+        >>> for s in b"abb":
+        ...     t.update(s)
+        >>> t.code(t.leaves[98]), t.code(t.leaves[97])
+        ((1, 1), (1, 2))
+        """
+        leaf = self.leaves.get(symbol)
+        if leaf is None:
+            # NYT becomes an internal node over a new leaf and a new NYT
+            old = self.nyt
+            leaf = self.right[old] = self._add(symbol, 0, old)
+            self.nyt = self.left[old] = self._add(-1, 0, old)
+            self.leaves[symbol] = leaf
+            self.first[0] = self.pos[old]
+        node = leaf
+        last = -1
+        if self.parent[node] == self.parent[self.nyt]:
+            # the parent has the same weight as node; if it is first among
+            # nodes of that weight, increment it (and its ancestors) first
+            leader = self.order[self.first[self.weight[node]]]
+            if leader == self.parent[node]:
+                last = node
+                node = leader
+        while node >= 0:
+            self._increment(node)
+            node = self.parent[node]
+        if last >= 0:
+            self._increment(last)
+
+
+class AdaptiveEncoder:
+    """ Encodes bytes with an AdaptiveTree, one piece at a time.
+    """
+
+    def __init__(self, capacity=0):
+        """ Create a new AdaptiveEncoder.
+
+        @param AdaptiveEncoder self: this AdaptiveEncoder
+        @param int capacity: bytes to preallocate for output
+        @rtype: NoneType
+        """
+        self._tree = AdaptiveTree()
+        self._writer = BitWriter(capacity)
+
+    def encode(self, data):
+        """ Return the whole bytes of output produced by adding data.
+
+        @param AdaptiveEncoder self: this AdaptiveEncoder
+        @param bytes|memoryview data: next piece of input
+        @rtype: bytes
+        """
+        tree, write = self._tree, self._writer.write
+        leaves, code, update = tree.leaves, tree.code, tree.update
+        for symbol in bytes(data):
+            leaf = leaves.get(symbol)
+            if leaf is None:
+                write(*code(tree.nyt))
+                write(symbol, LITERAL_BITS)
+            else:
+                write(*code(leaf))
+            update(symbol)
+        return self._writer.drain()
+
+    def finish(self):
+        """ Return the rest of the output, ending with the END marker.
+
+        @param AdaptiveEncoder self: this AdaptiveEncoder
+        @rtype: bytes
+        """
+        self._writer.write(*self._tree.code(self._tree.nyt))
+        self._writer.write(END, LITERAL_BITS)
+        return self._writer.getvalue()
+
+
+class AdaptiveDecoder:
+    """ Decodes the output of AdaptiveEncoder, one piece at a time.
+
+    Attributes:
+    ===========
+    @param bool done: whether the END marker has been decoded
+    @param NoneType remaining: the size is not known in advance
+    """
+
+    def __init__(self):
+        """ Create a new AdaptiveDecoder.
+
+        @param AdaptiveDecoder self: this AdaptiveDecoder
+        @rtype: NoneType
+        """
+        self.done = False
+        self.remaining = None
+        self._tree = AdaptiveTree()
+        self._node = 0
+        self._reader = BitReader(b"")
+
+    def decode(self, data, final=False):
+        """ Return the symbols that can be decoded once data is appended to
+        the input so far. A partly read code is kept until the next call.
+
+        @param AdaptiveDecoder self: this AdaptiveDecoder
+        @param bytes|memoryview data: next piece of compressed input
+        @param bool final: whether data ends the compressed input
+        @rtype: bytes
+
+        >>> e = AdaptiveEncoder()
+        >>> data = e.encode(b"abracadabra") + e.finish()
+        >>> d = AdaptiveDecoder()
+        >>> d.decode(data[:3]) + d.decode(data[3:], final=True)
+        b'abracadabra'
+        >>> d.done
+        True
+        """
+        tree, reader = self._tree, self._reader
+        reader.feed(data)
+        read = reader.read
+        avail = reader.bits_left
+        left, right, symbol = tree.left, tree.right, tree.symbol
+        node = self._node
+        out = bytearray()
+        while not self.done:
+            if left[node] >= 0:
+                if not avail:
+                    break
+                avail -= 1
+                node = right[node] if read(1) else left[node]
+                continue
+            if node == tree.nyt:
+                if avail < LITERAL_BITS:
+                    break
+                avail -= LITERAL_BITS
+                s = read(LITERAL_BITS)
+                if s == END:
+                    self.done = True
+                    break
+            else:
+                s = symbol[node]
+            out.append(s)
+            tree.update(s)
+            node = tree.order[0]
+        if final and not self.done:
+            raise ValueError("compressed data ends before the END marker")
+        self._node = node
+        return bytes(out)
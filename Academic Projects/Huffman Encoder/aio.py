@@ -0,0 +1,235 @@
+"""
+asyncio versions of compress and uncompress, for use inside an event loop.
+
+Coding is CPU-bound, so it runs on an executor: the loop's default thread
+pool unless another is given. Threads keep the loop responsive; a
+concurrent.futures.ProcessPoolExecutor also lets files be coded in
+parallel. Files are opened, read and written on the executor too, so
+nothing here blocks the loop.
+
+iter_compress and iter_uncompress work on streams of bytes, such as the
+body of an upload, a block at a time, in the block file format of
+parallel.py.
+"""
+
+import asyncio
+from functools import partial
+
+import huffman
+from huffman import compress_bytes, uncompress_bytes, read_chunks
+from huffman import size_to_bytes, bytes_to_size, CHUNK_SIZE
+from jobs import safe_job, output_name
+from parallel import BLOCK_MAGIC, BLOCK_SIZE
+
+
+# most files compress_many codes at once
+LIMIT = 4
+
+
+async def run(executor, func, *args, **kwargs):
+    """ Return func(*args, **kwargs), called on executor.
+
+    @param Executor|NoneType executor: where to call func, None for the
+        loop's default
+    @param callable func: function to call
+    @rtype: object
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+
+async def compress(in_file, out_file, executor=None, **kwargs):
+    """ Compress in_file into out_file with huffman.compress, on executor.
+
+    Keyword arguments are passed on to huffman.compress, except that
+    verbose defaults to False.
+
+    @param str in_file: input file to compress
+    @param str out_file: output file to store compressed result
+    @param Executor|NoneType executor: where to compress
+    @rtype: NoneType
+    """
+    kwargs.setdefault("verbose", False)
+    await run(executor, huffman.compress, in_file, out_file, **kwargs)
+
+
+async def uncompress(in_file, out_file, executor=None, **kwargs):
+    """ Uncompress in_file into out_file with huffman.uncompress, on
+    executor.
+
+    Keyword arguments are passed on to huffman.uncompress.
+
+    @param str in_file: input file to uncompress
+    @param str out_file: output file that will hold the uncompressed results
+    @param Executor|NoneType executor: where to uncompress
+    @rtype: NoneType
+    """
+    await run(executor, huffman.uncompress, in_file, out_file, **kwargs)
+
+
+async def read_file(path, chunk_size=CHUNK_SIZE, executor=None):
+    """ Yield the contents of path, chunk_size bytes at a time, reading on
+    executor.
+
+    @param str path: file to read
+    @param int chunk_size: largest number of bytes to yield at once
+    @param Executor|NoneType executor: where to read; must be a thread
+        pool, since the open file cannot be sent to another process
+    @rtype: async_generator[bytes]
+    """
+    f = await run(executor, open, path, "rb")
+    try:
+        chunks = read_chunks(f, chunk_size)
+        while True:
+            chunk = await run(executor, next, chunks, b"")
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        await run(executor, f.close)
+
+
+async def _items(items):
+    """ Yield the items of items, an iterable or an async iterable.
+
+    @param iterable|async_iterable items: items to yield
+    @rtype: async_generator
+    """
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def _blocks(chunks, block_size):
+    """ Yield chunks cut and joined into blocks of block_size bytes, and a
+    shorter last block.
+
+    @param iterable[bytes]|async_iterable[bytes] chunks: pieces of input
+    @param int block_size: number of bytes per block
+    @rtype: async_generator[bytes]
+    """
+    buf = bytearray()
+    async for chunk in _items(chunks):
+        buf += chunk
+        while len(buf) >= block_size:
+            yield bytes(buf[:block_size])
+            del buf[:block_size]
+    if buf:
+        yield bytes(buf)
+
+
+async def iter_compress(chunks, block_size=BLOCK_SIZE, executor=None):
+    """ Yield the block file for the bytes in chunks, a piece at a time,
+    compressing each block on executor as soon as it is read.
+
+    @param iterable[bytes]|async_iterable[bytes] chunks: input to compress
+    @param int block_size: number of input bytes per block
+    @param Executor|NoneType executor: where to compress
+    @rtype: async_generator[bytes]
+    """
+    yield BLOCK_MAGIC + size_to_bytes(block_size)
+    async for block in _blocks(chunks, block_size):
+        packed = await run(executor, compress_bytes, block)
+        yield size_to_bytes(len(packed)) + packed
+
+
+async def iter_uncompress(chunks, executor=None):
+    """ Yield the uncompressed contents of the block file in chunks, a
+    block at a time, uncompressing each block on executor as soon as it
+    has all been read.
+
+    @param iterable[bytes]|async_iterable[bytes] chunks: block file
+    @param Executor|NoneType executor: where to uncompress
+    @rtype: async_generator[bytes]
+    """
+    buf = bytearray()
+    header = len(BLOCK_MAGIC) + 4
+    started = False
+    async for chunk in _items(chunks):
+        buf += chunk
+        if not started:
+            if len(buf) < header:
+                continue
+            if buf[:len(BLOCK_MAGIC)] != BLOCK_MAGIC:
+                raise ValueError("not a block file")
+            del buf[:header]
+            started = True
+        while len(buf) >= 4:
+            end = 4 + bytes_to_size(buf[:4])
+            if len(buf) < end:
+                break
+            block = bytes(buf[4:end])
+            del buf[:end]
+            yield await run(executor, uncompress_bytes, block)
+    if not started or buf:
+        raise ValueError("block file ends in the middle of a block")
+
+
+async def _compress_one(name, out, semaphore, executor):
+    """ Return the stats of compressing name into out on executor, once
+    semaphore lets it start.
+
+    @param str name: input file to compress
+    @param str out: output file to store compressed result
+    @param asyncio.Semaphore semaphore: limits files compressed at once
+    @param Executor|NoneType executor: where to compress
+    @rtype: dict
+    """
+    async with semaphore:
+        return await run(executor, safe_job,
+                         ("compress", name, out, 1, BLOCK_SIZE))
+
+
+async def iter_compress_many(in_files, out_files=None, limit=LIMIT,
+                             executor=None):
+    """ Compress each of in_files into the matching one of out_files,
+    default the name with ".huf" added, at most limit at a time, and
+    yield the stats of each as it finishes.
+
+    The stats are those jobs.run_job returns, or the input and the error
+    for a file that could not be compressed.
+
+    @param list[str] in_files: input files to compress
+    @param list[str]|NoneType out_files: output files
+    @param int limit: most files to compress at once
+    @param Executor|NoneType executor: where to compress
+    @rtype: async_generator[dict]
+    """
+    if out_files is None:
+        out_files = [output_name("compress", name) for name in in_files]
+    semaphore = asyncio.Semaphore(limit)
+    tasks = [asyncio.ensure_future(_compress_one(name, out, semaphore,
+                                                 executor))
+             for name, out in zip(in_files, out_files)]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def compress_many(in_files, out_files=None, limit=LIMIT,
+                        executor=None):
+    """ Return the stats of compressing each of in_files into the matching
+    one of out_files, in the order of in_files, as iter_compress_many
+    does.
+
+    @param list[str] in_files: input files to compress
+    @param list[str]|NoneType out_files: output files
+    @param int limit: most files to compress at once
+    @param Executor|NoneType executor: where to compress
+    @rtype: list[dict]
+
+    >>> asyncio.run(compress_many(["no such file"]))[0]["input"]
+    'no such file'
+    """
+    if out_files is None:
+        out_files = [output_name("compress", name) for name in in_files]
+    semaphore = asyncio.Semaphore(limit)
+    return list(await asyncio.gather(
+        *[_compress_one(name, out, semaphore, executor)
+          for name, out in zip(in_files, out_files)]))
@@ -0,0 +1,622 @@
+"""
+Timing comparisons for the Huffman codec.
+
+Run from this directory:  python benchmark.py [file ...]
+
+or, for the regression suite, which prints its results as JSON and
+compares them with a saved baseline:
+
+    python benchmark.py --suite [--baseline FILE] [--save FILE] [file ...]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+import huffman
+from huffman import byte_to_bits, get_codes, make_freq_dict, huffman_tree
+from huffman import generate_compressed, generate_uncompressed, avg_length
+from huffman import number_nodes, flat_huffman_tree, tree_to_bytes
+from nodes import HuffmanNode
+from parallel import compress_blocks, uncompress_blocks
+from dictionary import train_dictionary, compress_many, uncompress_many
+from codecache import CodeCache
+from tuner import TableTuner
+from transforms import Pipeline, RunLength, MoveToFront, BlockSort
+from transforms import BLOCK_SIZE
+
+
+DEFAULT_FILES = ["book.txt", "music.wav"]
+SUITE_FILES = ["book.txt", "book2.txt", "music.wav", "music.mp3"]
+SYNTHETIC_SIZE = 1 << 20
+BASELINE_FILE = "benchmark_baseline.json"
+# the transforms bench_suite times, by stage name
+TRANSFORMS = [("rle", RunLength()), ("mtf", MoveToFront()),
+              ("bwt", BlockSort())]
+# the pipelines bench_pipelines compares
+PIPELINES = {"rle": [RunLength()],
+             "bwt+mtf": [BlockSort(), MoveToFront()],
+             "rle+bwt+mtf+rle": [RunLength(), BlockSort(), MoveToFront(),
+                                 RunLength()]}
+# fraction by which throughput may drop, or peak memory grow, before
+# compare_results calls it a regression; timings are noisy, and stages
+# that took less than MIN_SECONDS in the baseline are too quick to compare
+TOLERANCE = 0.25
+MIN_SECONDS = 0.01
+
+
+def string_uncompressed(tree, text, size):
+    """ Decompress size bytes from text by matching growing strings of
+    '0'/'1' characters against the codes, as generate_uncompressed used to.
+    Kept as the reference point for the table-driven decoder.
+
+    @param HuffmanNode tree: a HuffmanNode tree rooted at 'tree'
+    @param bytes text: text to decompress
+    @param int size: number of bytes to decompress from text.
+    @rtype: bytes
+    """
+    dict_CtS = {code: symb for symb, code in get_codes(tree).items()}
+    text_bits = ""
+    for byt in text:
+        text_bits += byte_to_bits(byt)
+    uncompress_lst = []
+    current_bit = ""
+    for bit in text_bits:
+        current_bit += bit
+        if current_bit in dict_CtS and len(uncompress_lst) < size:
+            uncompress_lst.append(dict_CtS[current_bit])
+            current_bit = ""
+    return bytes(uncompress_lst)
+
+
+def sorted_huffman_tree(freq_dict):
+    """ Return a Huffman tree for freq_dict built by re-sorting the list of
+    trees before every merge, as huffman_tree used to. Kept as the
+    reference point for the two-queue builder.
+
+    @param dict(int,int) freq_dict: a frequency dictionary
+    @rtype: HuffmanNode
+    """
+    node_list = [[freq_dict[item], HuffmanNode(item)] for item in freq_dict]
+    while len(node_list) > 1:
+        node_list = sorted(node_list, key=lambda x: x[0])
+        n_left = node_list.pop(0)
+        n_right = node_list.pop(0)
+        node_list.append([n_left[0] + n_right[0],
+                          HuffmanNode(None, n_left[1], n_right[1])])
+    return node_list[0][1]
+
+
+def timed(func, *args):
+    """ Return (result, seconds) for calling func with args.
+
+    @param callable func: function to time
+    @rtype: tuple(object,float)
+    """
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def coded_size(text, table):
+    """ Return the number of bytes text takes coded with table.
+
+    @param bytes text: text to code
+    @param list[tuple(int,int)] table: code for each symbol
+    @rtype: int
+    """
+    out = BytesIO()
+    huffman.encode_chunks([text], table, out)
+    return len(out.getvalue())
+
+
+def traced(func, *args):
+    """ Return (result, peak bytes allocated) for calling func with args.
+
+    @param callable func: function to measure
+    @rtype: tuple(object,int)
+    """
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_decode(fname, window_sizes=(8, 12, 16)):
+    """ Print decode times for fname with the string decoder and with the
+    table decoder at each window size.
+
+    @param str fname: file to compress and then decode
+    @param tuple(int) window_sizes: lookup window widths to try
+    @rtype: NoneType
+    """
+    with open(fname, "rb") as f:
+        text = f.read()
+    tree = huffman_tree(make_freq_dict(text))
+    compressed = generate_compressed(text, get_codes(tree))
+    result, base = timed(string_uncompressed, tree, compressed, len(text))
+    assert result == text
+    print("{}: string decoder {:.3f}s".format(fname, base))
+    for bits in window_sizes:
+        result, secs = timed(generate_uncompressed, tree, compressed,
+                             len(text), bits)
+        assert result == text
+        print("{}: {:>2}-bit table  {:.3f}s ({:.1f}x)"
+              .format(fname, bits, secs, base / secs))
+
+
+def bench_blocks(fname, block_size=1 << 18, max_workers=None):
+    """ Print block-parallel compress and uncompress throughput for fname
+    with 1, 2, 4, ... worker processes.
+
+    @param str fname: file to compress and then uncompress
+    @param int block_size: number of input bytes per block
+    @param int|NoneType max_workers: most workers to try, default CPUs
+    @rtype: NoneType
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    mb = os.path.getsize(fname) / 1e6
+    with tempfile.TemporaryDirectory() as tmp:
+        packed = os.path.join(tmp, "out.hufb")
+        unpacked = os.path.join(tmp, "out.orig")
+        workers = 1
+        while workers <= max_workers:
+            _, c = timed(compress_blocks, fname, packed, block_size, workers)
+            _, u = timed(uncompress_blocks, packed, unpacked, workers)
+            print("{}: {} worker(s) compress {:.2f} MB/s, "
+                  "uncompress {:.2f} MB/s"
+                  .format(fname, workers, mb / c, mb / u))
+            workers *= 2
+
+
+def bench_length_limits(fname, limits=(8, 9, 10, 11, 12, 15)):
+    """ Print the bits per symbol of fname with each code length limit,
+    the cost against an unrestricted Huffman tree, and the decode time
+    with a lookup window as wide as the limit.
+
+    @param str fname: file to compress and then decode
+    @param tuple(int) limits: longest code lengths to try
+    @rtype: NoneType
+    """
+    with open(fname, "rb") as f:
+        text = f.read()
+    freq = make_freq_dict(text)
+    tree = huffman_tree(freq)
+    best = avg_length(tree, freq)
+    longest = max([len(code) for code in get_codes(tree).values()])
+    print("{}: unrestricted {:.4f} bits/symbol, longest code {}"
+          .format(fname, best, longest))
+    for limit in limits:
+        if 1 << limit < len(freq):
+            continue
+        tree = huffman_tree(freq, limit)
+        bits = avg_length(tree, freq)
+        compressed = generate_compressed(text, get_codes(tree))
+        _, secs = timed(generate_uncompressed, tree, compressed, len(text),
+                        limit)
+        print("{}: limit {:>2} {:.4f} bits/symbol (+{:.2f}%), "
+              "decode {:.3f}s".format(fname, limit, bits,
+                                      100 * (bits - best) / best, secs))
+
+
+def bench_tree_builders(sizes=(256, 1024, 4096, 16384, 65536),
+                        sorted_limit=4096):
+    """ Print how building, numbering and coding a tree scale with the
+    size of the alphabet, for Zipf-like frequencies, with a HuffmanTree
+    and with HuffmanNodes. The old sorting builder is only run up to
+    sorted_limit symbols.
+
+    @param tuple(int) sizes: alphabet sizes to try
+    @param int sorted_limit: largest alphabet for sorted_huffman_tree
+    @rtype: NoneType
+    """
+    rng = random.Random(0)
+    for n in sizes:
+        freq = {symbol: 1 + int(1e6 / (rank + 1) * rng.random())
+                for rank, symbol in enumerate(rng.sample(range(n), n))}
+        flat, build = timed(flat_huffman_tree, freq)
+        _, number = timed(flat.number_nodes)
+        _, codes = timed(flat.codes)
+        _, flat_mem = traced(flat_huffman_tree, freq)
+        tree, node_build = timed(huffman_tree, freq)
+        _, node_mem = traced(huffman_tree, freq)
+        _, node_number = timed(number_nodes, tree)
+        _, node_codes = timed(get_codes, tree)
+        line = ("{:>6} symbols: HuffmanTree build {:.4f}s number {:.4f}s "
+                "codes {:.4f}s {:.0f} kB; HuffmanNode build {:.4f}s "
+                "number {:.4f}s codes {:.4f}s {:.0f} kB"
+                .format(n, build, number, codes, flat_mem / 1e3,
+                        node_build, node_number, node_codes,
+                        node_mem / 1e3))
+        if n <= sorted_limit:
+            _, old = timed(sorted_huffman_tree, freq)
+            line += "; sorting build {:.4f}s".format(old)
+        print(line)
+
+
+def bench_numpy(fname):
+    """ Print make_freq_dict and generate_compressed times for fname with
+    and without the NumPy backend.
+
+    @param str fname: file to count and encode
+    @rtype: NoneType
+    """
+    if huffman.numpy_backend is None:
+        print("{}: NumPy is not installed".format(fname))
+        return
+    with open(fname, "rb") as f:
+        text = f.read()
+    codes = get_codes(huffman_tree(make_freq_dict(text)))
+    saved = huffman.USE_NUMPY
+    try:
+        for use_numpy in (False, True):
+            huffman.USE_NUMPY = use_numpy
+            _, count = timed(make_freq_dict, text)
+            _, encode = timed(generate_compressed, text, codes)
+            print("{}: {} count {:.4f}s, encode {:.4f}s"
+                  .format(fname, "numpy " if use_numpy else "python",
+                          count, encode))
+    finally:
+        huffman.USE_NUMPY = saved
+
+
+def bench_dictionary(fname, payload_size=200, count=2000):
+    """ Print the size and times for compressing count payloads of
+    payload_size bytes from the second half of fname one by one, and with
+    a dictionary trained on the first half.
+
+    @param str fname: file to take the corpus and payloads from
+    @param int payload_size: bytes per payload
+    @param int count: most payloads to compress
+    @rtype: NoneType
+    """
+    with open(fname, "rb") as f:
+        text = f.read()
+    half = len(text) // 2
+    payloads = [text[i:i + payload_size]
+                for i in range(half, len(text), payload_size)][:count]
+    total = sum([len(p) for p in payloads])
+    single, c = timed(lambda: [huffman.compress_bytes(p) for p in payloads])
+    _, u = timed(lambda: [huffman.uncompress_bytes(b) for b in single])
+    print("{}: {} payloads of {} bytes, on their own: {:.1f}% of input, "
+          "compress {:.3f}s, uncompress {:.3f}s"
+          .format(fname, len(payloads), payload_size,
+                  100 * sum([len(b) for b in single]) / total, c, u))
+    d, train = timed(train_dictionary, [text[:half]])
+    batch, c = timed(compress_many, payloads, d)
+    _, u = timed(uncompress_many, batch, d)
+    print("{}: with dictionary: {:.1f}% of input, train {:.3f}s, "
+          "compress {:.3f}s, uncompress {:.3f}s"
+          .format(fname, 100 * sum([len(b) for b in batch]) / total,
+                  train, c, u))
+
+
+def bench_cache(fname, segment_size=1 << 14, tolerances=(0.0, 0.01, 0.05)):
+    """ Print the size and times for compressing and uncompressing fname
+    in segments of segment_size bytes, like rolling log segments, without
+    a code table cache and with one at each tolerance.
+
+    @param str fname: file to cut into segments
+    @param int segment_size: bytes per segment
+    @param tuple(float) tolerances: cache tolerances to try
+    @rtype: NoneType
+    """
+    with open(fname, "rb") as f:
+        text = f.read()
+    segments = [text[i:i + segment_size]
+                for i in range(0, len(text), segment_size)]
+    for tolerance in (None,) + tuple(tolerances):
+        cache = None if tolerance is None else CodeCache(64, tolerance)
+        packed, c = timed(lambda: [huffman.compress_bytes(s, cache=cache)
+                                   for s in segments])
+        _, u = timed(lambda: [huffman.uncompress_bytes(b, cache=cache)
+                              for b in packed])
+        line = ("{}: {} segments, {}: {} bytes, compress {:.3f}s, "
+                "uncompress {:.3f}s"
+                .format(fname, len(segments),
+                        "no cache" if cache is None
+                        else "tolerance {}".format(tolerance),
+                        sum([len(b) for b in packed]), c, u))
+        if cache is not None:
+            line += ", {}".format(cache.info())
+        print(line)
+
+
+def bench_tuner(fname, corpus=None, segment_size=1 << 14):
+    """ Print the size of fname coded in segments of segment_size bytes
+    with a dictionary trained on corpus, as is, and re-fitted by a
+    TableTuner after each segment, with the time spent deciding whether to
+    re-fit. Without corpus, the dictionary is trained on the first half of
+    fname and the second half is coded.
+
+    The tuned size counts the code lengths (lengths_to_bytes) a decoder
+    would be sent at each re-fit.
+
+    @param str fname: file to code
+    @param str|NoneType corpus: file to train the dictionary on
+    @param int segment_size: bytes per segment
+    @rtype: NoneType
+    """
+    with open(fname, "rb") as f:
+        text = f.read()
+    if corpus is None:
+        start = len(text) // 2
+        sample = text[:start]
+    else:
+        start = 0
+        with open(corpus, "rb") as f:
+            sample = f.read()
+    segments = [text[i:i + segment_size]
+                for i in range(start, len(text), segment_size)]
+    d = train_dictionary([sample])
+    tuner = TableTuner(d.lengths)
+    fixed = tuned = 0
+    deciding = 0.0
+    for segment in segments:
+        fixed += coded_size(segment, d._table)
+        tuned += coded_size(segment, tuner.table)
+        tuner.update(segment)
+        refitted, t = timed(tuner.maybe_refit)
+        deciding += t
+        if refitted:
+            tuned += len(huffman.lengths_to_bytes(tuner.lengths))
+    print("{}: {} segments with a dictionary: {} bytes, tuned: {} bytes, "
+          "{} re-fits, deciding {:.4f}s"
+          .format(fname, len(segments), fixed, tuned, tuner.refits,
+                  deciding))
+
+
+def bench_pipelines(fname, pipelines=PIPELINES):
+    """ Print the throughput of each transform, and its inverse, on fname,
+    and the size and compress and uncompress times for fname with no
+    pipeline and with each of pipelines.
+
+    @param str fname: file to transform and compress
+    @param dict(str,list) pipelines: stages of each pipeline, by name
+    @rtype: NoneType
+    """
+    with open(fname, "rb") as f:
+        text = f.read()
+    mb = len(text) / 1e6
+    for name, transform in TRANSFORMS:
+        pipeline = Pipeline([transform])
+        blocks, forward = timed(lambda: list(pipeline.forward([text])))
+        _, inverse = timed(lambda: [pipeline.inverse(block[4:])
+                                    for block in blocks])
+        print("{}: {} {:.2f} MB/s, inverse {:.2f} MB/s"
+              .format(fname, name, mb / forward, mb / inverse))
+    with tempfile.TemporaryDirectory() as tmp:
+        packed = os.path.join(tmp, "out.huf")
+        unpacked = os.path.join(tmp, "out.orig")
+        for name in [None] + list(pipelines):
+            pipeline = None if name is None else Pipeline(pipelines[name])
+            _, c = timed(lambda: huffman.compress(fname, packed,
+                                                  verbose=False,
+                                                  pipeline=pipeline))
+            _, u = timed(huffman.uncompress, packed, unpacked)
+            print("{}: {}: {:.1f}% of input, compress {:.3f}s, "
+                  "uncompress {:.3f}s"
+                  .format(fname, name or "no pipeline",
+                          100 * os.path.getsize(packed) / len(text), c, u))
+
+
+def synthetic_inputs(size=SYNTHETIC_SIZE, seed=0):
+    """ Return size bytes of skewed (geometrically distributed) and of
+    uniformly random data, by name.
+
+    @param int size: number of bytes of each input
+    @param int seed: seed for the random numbers
+    @rtype: dict(str,bytes)
+    """
+    rng = random.Random(seed)
+    skewed = bytes([min(int(rng.expovariate(0.5)), 255)
+                    for _ in range(size)])
+    return {"skewed": skewed,
+            "uniform": bytes([rng.getrandbits(8) for _ in range(size)])}
+
+
+def measure(func, *args, repeat=3):
+    """ Return (result, best seconds, peak bytes allocated) for calling
+    func with args repeat times, plus once more under tracemalloc.
+
+    @param callable func: function to measure
+    @param int repeat: number of timed calls
+    @rtype: tuple(object,float,int)
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        result, secs = timed(func, *args)
+        best = min(best, secs)
+    _, peak = traced(func, *args)
+    return result, best, peak
+
+
+def round_trip(text, tmp):
+    """ Compress and uncompress text through files in tmp and return the
+    compressed size.
+
+    @param bytes text: text to compress
+    @param str tmp: directory for the files
+    @rtype: int
+    """
+    names = [os.path.join(tmp, name) for name in ("in", "in.huf", "out")]
+    with open(names[0], "wb") as f:
+        f.write(text)
+    huffman.compress(names[0], names[1], verbose=False)
+    huffman.uncompress(names[1], names[2])
+    with open(names[2], "rb") as f:
+        assert f.read() == text
+    return os.path.getsize(names[1])
+
+
+def bench_suite(text, repeat=3):
+    """ Return the time, throughput and peak memory of each stage of
+    compressing and uncompressing text, and of a round trip through
+    compress and uncompress, with the bits per symbol and ratio reached.
+    The transforms, and their inverses, are timed on the first block of
+    text only.
+
+    @param bytes text: text to compress
+    @param int repeat: number of timed runs of each stage
+    @rtype: dict
+    """
+    stages = {}
+
+    def stage(name, func, *args, size=len(text)):
+        result, secs, peak = measure(func, *args, repeat=repeat)
+        stages[name] = {"seconds": round(secs, 6),
+                        "mb_per_s": round(size / 1e6 / secs, 3)
+                        if secs else None,
+                        "peak_kb": round(peak / 1e3, 1)}
+        return result
+
+    freq = stage("make_freq_dict", make_freq_dict, text)
+    tree = stage("huffman_tree", huffman_tree, freq)
+    codes = stage("get_codes", get_codes, tree)
+    number_nodes(tree)
+    stage("tree_to_bytes", tree_to_bytes, tree)
+    compressed = stage("generate_compressed", generate_compressed, text,
+                       codes)
+    result = stage("generate_uncompressed", generate_uncompressed, tree,
+                   compressed, len(text))
+    assert result == text
+    with tempfile.TemporaryDirectory() as tmp:
+        size = stage("round_trip", round_trip, text, tmp)
+    block = text[:BLOCK_SIZE]
+    for name, transform in TRANSFORMS:
+        result = stage(name, transform.forward, block, size=len(block))
+        result = stage(name + "_inverse", transform.inverse, result,
+                       size=len(block))
+        assert result == block
+    return {"size": len(text),
+            "bits_per_symbol": round(avg_length(tree, freq), 6),
+            "ratio": round(size / len(text), 6),
+            "stages": stages}
+
+
+def run_suite(fnames=SUITE_FILES, synthetic_size=SYNTHETIC_SIZE, repeat=3):
+    """ Return bench_suite results for each of fnames and for the
+    synthetic inputs, with a description of the machine.
+
+    @param list[str] fnames: files to benchmark
+    @param int synthetic_size: bytes of each synthetic input, 0 for none
+    @param int repeat: number of timed runs of each stage
+    @rtype: dict
+    """
+    inputs = {}
+    for fname in fnames:
+        with open(fname, "rb") as f:
+            inputs[os.path.basename(fname)] = f.read()
+    if synthetic_size:
+        inputs.update(synthetic_inputs(synthetic_size))
+    return {"python": platform.python_version(),
+            "machine": platform.machine(),
+            "numpy": huffman.numpy_backend is not None and huffman.USE_NUMPY,
+            "inputs": {name: bench_suite(text, repeat)
+                       for name, text in inputs.items()}}
+
+
+def compare_results(results, baseline, tolerance=TOLERANCE):
+    """ Return a description of each regression of results from baseline:
+    throughput that dropped or peak memory that grew by more than
+    tolerance, or bits per symbol or ratio that got any worse. Inputs and
+    stages missing from either are skipped, as is the throughput of stages
+    faster than MIN_SECONDS.
+
+    @param dict results: output of run_suite
+    @param dict baseline: earlier output of run_suite
+    @param float tolerance: fraction of noise to allow in measurements
+    @rtype: list[str]
+
+    >>> old = {"inputs": {"a": {"size": 8, "bits_per_symbol": 2.0,
+    ...     "ratio": 0.5, "stages": {"s": {"seconds": 1.0,
+    ...     "mb_per_s": 10.0, "peak_kb": 100.0}}}}}
+    >>> new = {"inputs": {"a": {"size": 8, "bits_per_symbol": 2.0,
+    ...     "ratio": 0.6, "stages": {"s": {"seconds": 2.0,
+    ...     "mb_per_s": 5.0, "peak_kb": 110.0}}}}}
+    >>> for line in compare_results(new, old):
+    ...     print(line)
+    a: ratio 0.5 -> 0.6
+    a/s: mb_per_s 10.0 -> 5.0
+    """
+    regressions = []
+    for name, new in results["inputs"].items():
+        old = baseline["inputs"].get(name)
+        if old is None or old["size"] != new["size"]:
+            continue
+        for key in ("bits_per_symbol", "ratio"):
+            if new[key] > old[key] + 1e-6:
+                regressions.append("{}: {} {} -> {}".format(
+                    name, key, old[key], new[key]))
+        for stage, now in new["stages"].items():
+            then = old["stages"].get(stage)
+            if then is None:
+                continue
+            if (then["seconds"] >= MIN_SECONDS and now["mb_per_s"] and
+                    now["mb_per_s"] < then["mb_per_s"] * (1 - tolerance)):
+                regressions.append("{}/{}: mb_per_s {} -> {}".format(
+                    name, stage, then["mb_per_s"], now["mb_per_s"]))
+            if now["peak_kb"] > then["peak_kb"] * (1 + tolerance):
+                regressions.append("{}/{}: peak_kb {} -> {}".format(
+                    name, stage, then["peak_kb"], now["peak_kb"]))
+    return regressions
+
+
+def suite_main(args):
+    """ Run the regression suite as asked for on the command line, print
+    the results as JSON and return the exit status: 1 if anything
+    regressed from the baseline, otherwise 0.
+
+    @param argparse.Namespace args: parsed command line
+    @rtype: int
+    """
+    results = run_suite(args.files or SUITE_FILES, args.synthetic_size,
+                        args.repeat)
+    print(json.dumps(results, indent=2, sort_keys=True))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if not args.baseline or not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare_results(results, json.load(f), args.tolerance)
+    for line in regressions:
+        print("regression:", line, file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--suite", action="store_true",
+                        help="run the regression suite and print JSON")
+    parser.add_argument("--baseline", default=BASELINE_FILE,
+                        help="suite results to compare with")
+    parser.add_argument("--save", help="also write suite results here")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--synthetic-size", type=int,
+                        default=SYNTHETIC_SIZE)
+    args = parser.parse_args()
+    if args.suite:
+        sys.exit(suite_main(args))
+    bench_tree_builders()
+    for name in args.files or DEFAULT_FILES:
+        bench_numpy(name)
+        bench_decode(name)
+        bench_length_limits(name)
+        bench_blocks(name)
+        bench_dictionary(name)
+        bench_cache(name)
+        bench_tuner(name)
+        bench_pipelines(name)
@@ -0,0 +1,313 @@
+"""
+Reading and writing integer codes bit by bit, most significant bit first.
+"""
+
+# bits moved between the accumulator and the buffer at a time
+WORD_BITS = 64
+WORD_BYTES = WORD_BITS // 8
+
+
+class BitWriter:
+    """ Packs (value, length) codes into a bytearray.
+
+    Codes are shifted into an integer accumulator that is written out a
+    whole word at a time, so writing never builds per-bit strings or lists.
+    The last byte is padded with zeros on the right.
+
+    A BitWriter can also write into a buffer it is given, such as a
+    memoryview of a caller's bytearray, which is then never grown; it must
+    have room for everything written.
+
+    Attributes:
+    ===========
+    @param int bit_length: number of bits written so far
+    """
+
+    def __init__(self, capacity=0, buffer=None):
+        """ Create a new BitWriter with room for capacity bytes before
+        its buffer has to grow, or that writes into buffer.
+
+        @param BitWriter self: this BitWriter
+        @param int capacity: number of bytes to preallocate
+        @param bytearray|memoryview|NoneType buffer: where to write
+        @rtype: NoneType
+        """
+        self._buf = bytearray(capacity) if buffer is None else buffer
+        self._pos = 0
+        self._acc = 0
+        self._nacc = 0
+
+    @property
+    def bit_length(self):
+        """ Return the number of bits written so far.
+
+        @param BitWriter self: this BitWriter
+        @rtype: int
+        """
+        return self._pos * 8 + self._nacc
+
+    def write(self, value, length):
+        """ Write the low length bits of value.
+
+        @param BitWriter self: this BitWriter
+        @param int value: code to write
+        @param int length: number of bits in the code
+        @rtype: NoneType
+
+        >>> w = BitWriter()
+        >>> w.write(0b101, 3)
+        >>> w.write(0b11, 2)
+        >>> w.getvalue() == bytes([0b10111000])
+        True
+        """
+        self._acc = (self._acc << length) | value
+        self._nacc += length
+        if self._nacc >= WORD_BITS:
+            self._flush_words()
+
+    def write_symbols(self, symbols, table):
+        """ Write the code table[s] = (value, length) of each s in symbols.
+
+        @param BitWriter self: this BitWriter
+        @param bytes|iterable[int] symbols: symbols to encode
+        @param list[tuple(int,int)] table: code for each symbol
+        @rtype: NoneType
+
+        >>> w = BitWriter()
+        >>> w.write_symbols(bytes([1, 0, 1]), [(0, 1), (0b10, 2)])
+        >>> w.getvalue() == bytes([0b10010000])
+        True
+        """
+        buf, pos = self._buf, self._pos
+        acc, nacc = self._acc, self._nacc
+        for s in symbols:
+            value, length = table[s]
+            acc = (acc << length) | value
+            nacc += length
+            while nacc >= WORD_BITS:
+                nacc -= WORD_BITS
+                if pos + WORD_BYTES > len(buf):
+                    buf.extend(bytes(len(buf) + WORD_BYTES))
+                buf[pos:pos + WORD_BYTES] = (acc >> nacc).to_bytes(
+                    WORD_BYTES, "big")
+                pos += WORD_BYTES
+                acc &= (1 << nacc) - 1
+        self._pos, self._acc, self._nacc = pos, acc, nacc
+
+    def write_bits(self, data, nbits):
+        """ Write the first nbits bits of data, e.g. codes that have
+        already been packed into bytes.
+
+        @param BitWriter self: this BitWriter
+        @param bytes data: packed bits, most significant bit first
+        @param int nbits: number of bits of data to write
+        @rtype: NoneType
+
+        >>> w = BitWriter()
+        >>> w.write(0b1, 1)
+        >>> w.write_bits(bytes([0b11110000, 0b11000000]), 10)
+        >>> w.getvalue() == bytes([0b11111000, 0b01100000])
+        True
+        """
+        value = int.from_bytes(data, "big") >> (len(data) * 8 - nbits)
+        acc = (self._acc << nbits) | value
+        nacc = self._nacc + nbits
+        nbytes = nacc // 8
+        self._nacc = nacc - nbytes * 8
+        end = self._pos + nbytes
+        if end > len(self._buf):
+            self._buf.extend(bytes(end - len(self._buf)))
+        self._buf[self._pos:end] = (acc >> self._nacc).to_bytes(nbytes, "big")
+        self._pos = end
+        self._acc = acc & ((1 << self._nacc) - 1)
+
+    def _flush_words(self):
+        """ Move whole words from the accumulator into the buffer.
+
+        @param BitWriter self: this BitWriter
+        @rtype: NoneType
+        """
+        buf = self._buf
+        while self._nacc >= WORD_BITS:
+            self._nacc -= WORD_BITS
+            if self._pos + WORD_BYTES > len(buf):
+                buf.extend(bytes(len(buf) + WORD_BYTES))
+            buf[self._pos:self._pos + WORD_BYTES] = (
+                self._acc >> self._nacc).to_bytes(WORD_BYTES, "big")
+            self._pos += WORD_BYTES
+            self._acc &= (1 << self._nacc) - 1
+
+    def drain(self):
+        """ Return the whole bytes written since the last drain and remove
+        them from the buffer. Bits of an unfinished byte stay behind.
+
+        @param BitWriter self: this BitWriter
+        @rtype: bytes
+
+        >>> w = BitWriter()
+        >>> w.write(0b1010101011, 10)
+        >>> w.drain() == bytes([0b10101010])
+        True
+        >>> w.getvalue() == bytes([0b11000000])
+        True
+        """
+        nbytes = self._nacc // 8
+        self._nacc -= nbytes * 8
+        tail = (self._acc >> self._nacc).to_bytes(nbytes, "big")
+        self._acc &= (1 << self._nacc) - 1
+        result = bytes(self._buf[:self._pos]) + tail
+        self._pos = 0
+        return result
+
+    def finish(self):
+        """ Write the last byte, padded, into the buffer and return the
+        number of bytes in the buffer since the last drain.
+
+        @param BitWriter self: this BitWriter
+        @rtype: int
+
+        >>> buf = bytearray(2)
+        >>> w = BitWriter(buffer=memoryview(buf))
+        >>> w.write(0b1010101011, 10)
+        >>> w.finish(), buf == bytes([0b10101010, 0b11000000])
+        (2, True)
+        """
+        nbytes = (self._nacc + 7) // 8
+        end = self._pos + nbytes
+        self._buf[self._pos:end] = (
+            self._acc << (nbytes * 8 - self._nacc)).to_bytes(nbytes, "big")
+        self._pos = end
+        self._acc = self._nacc = 0
+        return end
+
+    def getvalue(self):
+        """ Return everything written since the last drain, padding the
+        last byte.
+
+        @param BitWriter self: this BitWriter
+        @rtype: bytes
+        """
+        nbytes = (self._nacc + 7) // 8
+        tail = (self._acc << (nbytes * 8 - self._nacc)).to_bytes(nbytes,
+                                                                  "big")
+        return bytes(self._buf[:self._pos]) + tail
+
+
+class BitReader:
+    """ Reads bits from a bytes-like object.
+
+    Bytes are loaded into an integer accumulator a word at a time. Reading
+    past the end of the data yields zero bits; bits_left tells the caller
+    how much real data remains.
+    """
+
+    def __init__(self, data):
+        """ Create a new BitReader over data.
+
+        @param BitReader self: this BitReader
+        @param bytes|bytearray|memoryview data: bytes to read
+        @rtype: NoneType
+        """
+        self._data = data
+        self._pos = 0
+        self._acc = 0
+        self._nacc = 0
+        self._padding = 0
+
+    @property
+    def bits_left(self):
+        """ Return the number of unread bits of real (unpadded) data.
+
+        @param BitReader self: this BitReader
+        @rtype: int
+        """
+        return (len(self._data) - self._pos) * 8 + self._nacc - self._padding
+
+    def feed(self, data):
+        """ Append data to the bits still to be read.
+
+        Only call this before any padding has been read, i.e. while
+        bits_left has never gone below what was peeked at.
+
+        @param BitReader self: this BitReader
+        @param bytes|bytearray|memoryview data: bytes to append
+        @rtype: NoneType
+
+        >>> r = BitReader(bytes([0b10100000]))
+        >>> r.read(3)
+        5
+        >>> r.feed(bytes([0b11110000]))
+        >>> r.read(9)
+        15
+        """
+        # move the unread bytes into the accumulator rather than copy data
+        rest = self._data[self._pos:]
+        self._acc = (self._acc << (8 * len(rest))) | \
+            int.from_bytes(rest, "big")
+        self._nacc += 8 * len(rest)
+        self._data = data
+        self._pos = 0
+
+    def peek(self, n):
+        """ Return the next n bits as an int without consuming them.
+
+        @param BitReader self: this BitReader
+        @param int n: number of bits
+        @rtype: int
+
+        >>> r = BitReader(bytes([0b10110000]))
+        >>> r.peek(4) == 0b1011
+        True
+        >>> r.peek(12) == 0b101100000000
+        True
+        """
+        if self._nacc < n:
+            self._refill(n)
+        return (self._acc >> (self._nacc - n)) & ((1 << n) - 1)
+
+    def skip(self, n):
+        """ Consume n bits that have already been peeked at.
+
+        @param BitReader self: this BitReader
+        @param int n: number of bits
+        @rtype: NoneType
+        """
+        self._nacc -= n
+        self._acc &= (1 << self._nacc) - 1
+
+    def read(self, n):
+        """ Return the next n bits as an int and consume them.
+
+        @param BitReader self: this BitReader
+        @param int n: number of bits
+        @rtype: int
+
+        >>> r = BitReader(bytes([0b10110000]))
+        >>> r.read(2), r.read(3)
+        (2, 6)
+        >>> r.bits_left
+        3
+        """
+        value = self.peek(n)
+        self.skip(n)
+        return value
+
+    def _refill(self, n):
+        """ Load words until at least n bits are in the accumulator.
+
+        @param BitReader self: this BitReader
+        @param int n: number of bits needed
+        @rtype: NoneType
+        """
+        data = self._data
+        while self._nacc < n:
+            chunk = data[self._pos:self._pos + WORD_BYTES]
+            if chunk:
+                self._pos += len(chunk)
+                self._acc = (self._acc << (8 * len(chunk))) | \
+                    int.from_bytes(chunk, "big")
+                self._nacc += 8 * len(chunk)
+            else:
+                self._acc <<= WORD_BITS
+                self._nacc += WORD_BITS
+                self._padding += WORD_BITS
@@ -0,0 +1,122 @@
+"""
+Command-line interface to the Huffman codec.
+
+    python cli.py compress [options] FILE ...
+    python cli.py decompress [options] FILE ...
+
+(or python huffman.py with the same arguments). Each FILE may be a glob
+pattern, which is expanded here so that quoted patterns work from cron
+too. Files are compressed to FILE + ".huf" and decompressed to FILE
+without ".huf", or FILE + ".orig" if it does not end in ".huf", unless
+-o names the output of a single input.
+
+"-" as FILE reads standard input, and "-o -" writes to standard output.
+Either one makes compress write a block file (see parallel.py), which
+is coded a block at a time and so never needs the whole input; decompress
+reads both block files and the usual format, from standard input or
+from files.
+
+With -j N, up to N files are coded at once, or the blocks of a single
+stream are coded on N processes. --stats prints a line for each file to
+standard error, with the measurements of each stage for files that go
+through huffman.compress or huffman.uncompress.
+"""
+
+import argparse
+import glob
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from jobs import safe_job, output_name, STDIO
+from parallel import BLOCK_SIZE
+
+
+def expand_inputs(patterns):
+    """ Return the files named by patterns, expanding glob patterns, in
+    order and without repeats.
+
+    @param list[str] patterns: file names, glob patterns or "-"
+    @rtype: list[str]
+    """
+    names = []
+    for pattern in patterns:
+        if pattern == STDIO or not glob.has_magic(pattern):
+            matches = [pattern]
+        else:
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                raise FileNotFoundError("no files match {}".format(pattern))
+        for name in matches:
+            if name not in names:
+                names.append(name)
+    return names
+
+
+def make_parser():
+    """ Return the parser for the command line.
+
+    @rtype: argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(
+        prog="huffman", description="Huffman compression.")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+    for command in ("compress", "decompress"):
+        sub = commands.add_parser(command)
+        sub.add_argument("files", nargs="+", metavar="FILE",
+                         help='files or glob patterns, "-" for stdin')
+        sub.add_argument("-o", "--output",
+                         help='output for a single input, "-" for stdout')
+        sub.add_argument("-j", "--workers", type=int, default=1,
+                         help="files, or blocks of a stream, to code at "
+                              "once")
+        sub.add_argument("--stats", action="store_true",
+                         help="print measurements to stderr as JSON")
+        if command == "compress":
+            sub.add_argument("--block-size", type=int, default=BLOCK_SIZE,
+                             help="input bytes per block for streams")
+    return parser
+
+
+def main(argv=None):
+    """ Run the command line argv and return the exit status.
+
+    @param list[str]|NoneType argv: arguments, default sys.argv[1:]
+    @rtype: int
+    """
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    try:
+        names = expand_inputs(args.files)
+    except FileNotFoundError as error:
+        parser.error(str(error))
+    if args.output is not None and len(names) > 1:
+        parser.error("-o needs a single input")
+    if names.count(STDIO) > 1:
+        parser.error('"-" can only be read once')
+    block_size = getattr(args, "block_size", BLOCK_SIZE)
+    jobs = []
+    for name in names:
+        out = args.output or output_name(args.command, name)
+        # a single job gets the workers for its blocks instead
+        workers = args.workers if len(names) == 1 else 1
+        jobs.append((args.command, name, out, workers, block_size))
+    if len(jobs) > 1 and args.workers > 1:
+        with ProcessPoolExecutor(args.workers) as pool:
+            results = list(pool.map(safe_job, jobs))
+    else:
+        results = [safe_job(job) for job in jobs]
+    status = 0
+    for stats in results:
+        if "error" in stats:
+            print("huffman: {}: {}".format(stats["input"], stats["error"]),
+                  file=sys.stderr)
+            status = 1
+        elif args.stats:
+            print(json.dumps(stats, sort_keys=True), file=sys.stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
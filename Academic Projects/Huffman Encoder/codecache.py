@@ -0,0 +1,322 @@
+"""
+An LRU cache of code tables, for compressing many similar inputs.
+
+Rolling log segments and the like have nearly the same histogram every
+time, so the tree, the encoder table and the decoder table built for one
+of them can be used again for the next instead of being rebuilt.
+
+Histograms are looked up by a signature. With tolerance 0 the signature
+is the exact histogram, so the cache never changes the output. With a
+positive tolerance, counts are rounded to half-bit steps of their ideal
+code length, and a cached table is used if coding the new histogram
+with it is estimated to cost at most tolerance (as a fraction, e.g. 0.01
+for 1%) more than a table built for it would. If the signature is not
+found, or its table is too costly, the other cached tables that have a
+code for every symbol are tried, most recently used first.
+"""
+
+from collections import OrderedDict, namedtuple
+from math import log2
+
+from huffman import code_lengths, canonical_codes, codes_to_table
+from huffman import build_decode_table, TableDecoder, DECODE_BITS
+from nodes import HuffmanTree
+
+
+CacheInfo = namedtuple("CacheInfo",
+                       "hits misses rejected evictions maxsize currsize")
+
+
+def least_bits(freq_dict):
+    """ Return a lower bound on the bits any prefix code uses for
+    freq_dict: its entropy, but at least one bit per symbol, since no
+    code is shorter than that.
+
+    @param dict(int,int) freq_dict: a frequency dictionary
+    @rtype: float
+
+    >>> least_bits({65: 2, 66: 1, 67: 1})
+    6.0
+    >>> least_bits({65: 100})
+    100
+    """
+    total = sum(freq_dict.values())
+    return max(total, sum([count * log2(total / count)
+                           for count in freq_dict.values()]))
+
+
+class CodeTables:
+    """ The tables for one set of canonical code lengths, each built the
+    first time it is asked for.
+
+    Attributes:
+    ===========
+    @param dict(int,int) lengths: mapping from symbols to code lengths
+    @param dict(int,str) codes: canonical codes for lengths
+    @param float ratio: bits over least_bits for the histogram it was built
+        for, 1.0 if not built from a histogram
+    """
+
+    def __init__(self, lengths, bits=DECODE_BITS):
+        """ Create a new CodeTables for code lengths lengths.
+
+        @param CodeTables self: this CodeTables
+        @param dict(int,int) lengths: mapping from symbols to code lengths
+        @param int bits: width of the decode lookup window
+        @rtype: NoneType
+        """
+        self.lengths = lengths
+        self.codes = canonical_codes(lengths)
+        self.ratio = 1.0
+        self._bits = bits
+        self._tree = None
+        self._table = None
+        self._decode_table = None
+
+    @property
+    def tree(self):
+        """ Return the tree of the codes.
+
+        @param CodeTables self: this CodeTables
+        @rtype: HuffmanTree
+        """
+        if self._tree is None:
+            self._tree = HuffmanTree.from_codes(self.codes)
+        return self._tree
+
+    @property
+    def table(self):
+        """ Return the encoder table, as made by codes_to_table.
+
+        @param CodeTables self: this CodeTables
+        @rtype: list[tuple(int,int)|NoneType]
+        """
+        if self._table is None:
+            self._table = codes_to_table(self.codes)
+        return self._table
+
+    @property
+    def decode_table(self):
+        """ Return the decoder table, as made by build_decode_table.
+
+        @param CodeTables self: this CodeTables
+        @rtype: list
+        """
+        if self._decode_table is None:
+            self._decode_table = (build_decode_table(self.codes, self._bits)
+                                  if self.codes else [])
+        return self._decode_table
+
+    def decoder(self, size):
+        """ Return a decoder for size symbols coded with these codes.
+
+        @param CodeTables self: this CodeTables
+        @param int size: number of symbols to decode
+        @rtype: TableDecoder
+        """
+        return TableDecoder(None, size, self._bits, table=self.decode_table)
+
+    def loss(self, freq_dict, least):
+        """ Return the estimated fraction of extra bits from coding
+        freq_dict with these codes rather than with codes built for it,
+        or infinity if some symbol in freq_dict has no code.
+
+        @param CodeTables self: this CodeTables
+        @param dict(int,int) freq_dict: a frequency dictionary
+        @param float least: least_bits(freq_dict)
+        @rtype: float
+
+        >>> t = CodeTables({65: 1, 66: 2, 67: 2})
+        >>> t.loss({65: 2, 66: 1, 67: 1}, 6.0)
+        0.0
+        >>> t.loss({65: 1, 66: 1, 67: 2}, 6.0) > 0.1
+        True
+        >>> t.loss({66: 100}, least_bits({66: 100}))
+        1.0
+        """
+        lengths = self.lengths
+        bits = 0
+        for symbol, count in freq_dict.items():
+            if symbol not in lengths:
+                return float("inf")
+            bits += count * lengths[symbol]
+        if not least:
+            return 0.0
+        return bits / (least * self.ratio) - 1
+
+
+class CodeCache:
+    """ A bounded LRU cache of CodeTables.
+
+    Attributes:
+    ===========
+    @param int maxsize: most entries kept
+    @param float tolerance: largest estimated loss for a near match
+    """
+
+    def __init__(self, maxsize=128, tolerance=0.0, bits=DECODE_BITS):
+        """ Create a new, empty CodeCache.
+
+        @param CodeCache self: this CodeCache
+        @param int maxsize: most entries kept
+        @param float tolerance: largest estimated loss for a near match
+        @param int bits: width of the decode lookup window
+        @rtype: NoneType
+        """
+        self.maxsize = maxsize
+        self.tolerance = tolerance
+        self._bits = bits
+        self._entries = OrderedDict()
+        self._hits = self._misses = self._rejected = self._evictions = 0
+
+    def info(self):
+        """ Return the hit, miss, rejection and eviction counts so far, and
+        the size of the cache.
+
+        A rejection is a near match whose estimated loss was too high.
+
+        @param CodeCache self: this CodeCache
+        @rtype: CacheInfo
+        """
+        return CacheInfo(self._hits, self._misses, self._rejected,
+                         self._evictions, self.maxsize, len(self._entries))
+
+    def clear(self):
+        """ Remove all entries and reset the counts.
+
+        @param CodeCache self: this CodeCache
+        @rtype: NoneType
+        """
+        self._entries.clear()
+        self._hits = self._misses = self._rejected = self._evictions = 0
+
+    def signature(self, freq_dict, max_code_length=None):
+        """ Return the key for freq_dict in this cache.
+
+        @param CodeCache self: this CodeCache
+        @param dict(int,int) freq_dict: a frequency dictionary
+        @param int|NoneType max_code_length: longest code allowed, if any
+        @rtype: tuple
+
+        >>> cache = CodeCache(tolerance=0.01)
+        >>> a = cache.signature({65: 1000, 66: 500})
+        >>> a == cache.signature({65: 1010, 66: 495})
+        True
+        >>> a == cache.signature({65: 1000, 66: 100})
+        False
+        """
+        items = sorted(freq_dict.items())
+        if self.tolerance:
+            total = sum(freq_dict.values())
+            items = [(symbol, round(2 * log2(total / count)))
+                     for symbol, count in items]
+        return ("freq", max_code_length, tuple(items))
+
+    def for_freq(self, freq_dict, max_code_length=None):
+        """ Return the CodeTables for freq_dict, building them if they
+        are not cached.
+
+        @param CodeCache self: this CodeCache
+        @param dict(int,int) freq_dict: a frequency dictionary
+        @param int|NoneType max_code_length: longest code allowed, if any
+        @rtype: CodeTables
+
+        >>> cache = CodeCache()
+        >>> t = cache.for_freq({65: 2, 66: 1})
+        >>> cache.for_freq({65: 2, 66: 1}) is t
+        True
+        >>> cache.info()
+        CacheInfo(hits=1, misses=1, rejected=0, evictions=0, maxsize=128, \
+currsize=1)
+        """
+        key = self.signature(freq_dict, max_code_length)
+        tables = self._lookup(key)
+        if tables is not None and not self.tolerance:
+            self._hits += 1
+            return tables
+        least = least_bits(freq_dict)
+        if self.tolerance:
+            tables = self._near(freq_dict, least, max_code_length, tables)
+            if tables is not None:
+                self._hits += 1
+                return tables
+        self._misses += 1
+        tables = CodeTables(code_lengths(freq_dict, max_code_length),
+                            self._bits)
+        if least:
+            tables.ratio = tables.loss(freq_dict, least) + 1
+        self._store(key, tables)
+        return tables
+
+    def _near(self, freq_dict, least, max_code_length, tables):
+        """ Return the cached table for freq_dict with an estimated loss
+        of at most tolerance, trying tables first and then the others,
+        most recently used first; or None if there is none.
+
+        @param CodeCache self: this CodeCache
+        @param dict(int,int) freq_dict: a frequency dictionary
+        @param float least: least_bits(freq_dict)
+        @param int|NoneType max_code_length: longest code allowed, if any
+        @param CodeTables|NoneType tables: the table with the same
+            signature, if any
+        @rtype: CodeTables|NoneType
+        """
+        if tables is not None:
+            if tables.loss(freq_dict, least) <= self.tolerance:
+                return tables
+            self._rejected += 1
+        for key in reversed(self._entries):
+            if key[0] != "freq" or key[1] != max_code_length:
+                continue
+            candidate = self._entries[key]
+            if (candidate is not tables and
+                    candidate.loss(freq_dict, least) <= self.tolerance):
+                self._entries.move_to_end(key)
+                return candidate
+        return None
+
+    def for_lengths(self, lengths):
+        """ Return the CodeTables for code lengths lengths, as read from a
+        header, building them if they are not cached.
+
+        @param CodeCache self: this CodeCache
+        @param dict(int,int) lengths: mapping from symbols to code lengths
+        @rtype: CodeTables
+        """
+        key = ("lengths", tuple(sorted(lengths.items())))
+        tables = self._lookup(key)
+        if tables is None:
+            self._misses += 1
+            tables = CodeTables(lengths, self._bits)
+            self._store(key, tables)
+        else:
+            self._hits += 1
+        return tables
+
+    def _lookup(self, key):
+        """ Return the entry for key, marking it most recently used, or
+        None if there is none.
+
+        @param CodeCache self: this CodeCache
+        @param tuple key: a cache key
+        @rtype: CodeTables|NoneType
+        """
+        tables = self._entries.get(key)
+        if tables is not None:
+            self._entries.move_to_end(key)
+        return tables
+
+    def _store(self, key, tables):
+        """ Store tables under key, evicting the least recently used
+        entries if the cache is full.
+
+        @param CodeCache self: this CodeCache
+        @param tuple key: a cache key
+        @param CodeTables tables: tables to store
+        @rtype: NoneType
+        """
+        self._entries[key] = tables
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self._evictions += 1
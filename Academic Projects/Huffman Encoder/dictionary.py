@@ -0,0 +1,233 @@
+"""
+Pre-trained code tables for compressing many small payloads.
+
+A Dictionary holds code lengths trained once from a sample corpus. Files
+compressed with it (MODE_DICTIONARY) store only its ID instead of their
+own code table, and compressing them skips counting and tree building.
+Every byte gets a code, so payloads need not resemble the corpus; they
+just compress less well if they do not.
+
+A dictionary file is laid out as
+
+    DICT_MAGIC | version (1 byte) | ID (4 bytes) | code lengths
+
+with the code lengths as written by huffman.lengths_to_bytes. The ID is
+the CRC-32 of the code lengths.
+"""
+
+from io import BytesIO
+from zlib import crc32
+
+from bitio import BitWriter
+from huffman import make_freq_dict, code_lengths, canonical_codes
+from huffman import codes_to_table, lengths_to_bytes, read_lengths
+from huffman import build_decode_table, write_codes, read_chunks
+from huffman import encode_chunks
+from huffman import dictionary_header_bytes, uncompress_bytes, size_to_bytes
+from huffman import bytes_to_size, TableDecoder, DECODE_BITS, CHUNK_SIZE
+
+
+DICT_MAGIC = b"HUFD"
+DICT_VERSION = 1
+# longest code a trained dictionary may have, so that bytes missing from
+# the corpus do not get very long codes
+DICT_MAX_CODE_LENGTH = 16
+
+
+class Dictionary:
+    """ Code lengths for all 256 bytes, with the tables for coding with
+    them built once.
+
+    Attributes:
+    ===========
+    @param int id: CRC-32 of the code lengths
+    @param dict(int,int) lengths: mapping from bytes to code lengths
+    @param dict(int,str) codes: canonical codes for lengths
+    """
+
+    def __init__(self, lengths, bits=DECODE_BITS):
+        """ Create a new Dictionary with code lengths lengths.
+
+        @param Dictionary self: this Dictionary
+        @param dict(int,int) lengths: a code length for every byte
+        @param int bits: width of the decode lookup window
+        @rtype: NoneType
+        """
+        if len(lengths) != 256:
+            raise ValueError("a dictionary needs a code for every byte")
+        self.lengths = lengths
+        self.id = crc32(lengths_to_bytes(lengths))
+        self.codes = canonical_codes(lengths)
+        self._table = codes_to_table(self.codes)
+        self._bits = bits
+        self._decode_table = build_decode_table(self.codes, bits)
+
+    def __eq__(self, other):
+        """ Return whether self is equivalent to other.
+
+        @param Dictionary self: this Dictionary
+        @param Dictionary|Any other: object to compare with
+        @rtype: bool
+        """
+        return type(self) == type(other) and self.lengths == other.lengths
+
+    def __repr__(self):
+        """ Return a string representation of self.
+
+        @param Dictionary self: this Dictionary
+        @rtype: str
+        """
+        return "Dictionary({:08x})".format(self.id)
+
+    def compress(self, text):
+        """ Return text compressed in MODE_DICTIONARY.
+
+        @param Dictionary self: this Dictionary
+        @param bytes text: a bytes object
+        @rtype: bytes
+        """
+        writer = BitWriter(len(text))
+        write_codes(writer, text, self._table)
+        return dictionary_header_bytes(self.id, len(text)) + writer.getvalue()
+
+    def uncompress(self, buf):
+        """ Return the uncompressed form of buf, compressed with self.
+
+        @param Dictionary self: this Dictionary
+        @param bytes buf: compressed bytes
+        @rtype: bytes
+
+        >>> d = train_dictionary([b"abracadabra"])
+        >>> d.uncompress(d.compress(b"cadabra!"))
+        b'cadabra!'
+        """
+        return uncompress_bytes(buf, self)
+
+    def decoder(self, size):
+        """ Return a decoder for size symbols coded with self.
+
+        @param Dictionary self: this Dictionary
+        @param int size: number of symbols to decode
+        @rtype: TableDecoder
+        """
+        return TableDecoder(None, size, self._bits, table=self._decode_table)
+
+    def to_bytes(self):
+        """ Return the dictionary file contents for self.
+
+        @param Dictionary self: this Dictionary
+        @rtype: bytes
+        """
+        return (DICT_MAGIC + bytes([DICT_VERSION]) +
+                size_to_bytes(self.id) + lengths_to_bytes(self.lengths))
+
+    @classmethod
+    def from_bytes(cls, buf):
+        """ Return the Dictionary stored in buf, the contents of a
+        dictionary file.
+
+        @param type cls: Dictionary
+        @param bytes buf: dictionary file contents
+        @rtype: Dictionary
+
+        >>> d = train_dictionary([b"abracadabra"])
+        >>> Dictionary.from_bytes(d.to_bytes()) == d
+        True
+        """
+        f = BytesIO(buf)
+        if f.read(len(DICT_MAGIC)) != DICT_MAGIC:
+            raise ValueError("not a dictionary file")
+        version = f.read(1)[0]
+        if version > DICT_VERSION:
+            raise ValueError("unsupported dictionary version {}"
+                             .format(version))
+        dictionary_id = bytes_to_size(f.read(4))
+        result = cls(read_lengths(f))
+        if result.id != dictionary_id:
+            raise ValueError("dictionary ID does not match its contents")
+        return result
+
+
+def train_dictionary(samples, max_code_length=DICT_MAX_CODE_LENGTH):
+    """ Return a Dictionary fitted to the bytes of samples.
+
+    Every byte is counted once more than it occurs, so that bytes missing
+    from samples still get a code.
+
+    @param iterable[bytes] samples: sample corpus
+    @param int|NoneType max_code_length: longest code allowed, if any
+    @rtype: Dictionary
+
+    >>> d = train_dictionary([b"aaaa", b"ab"])
+    >>> d.lengths[97] < d.lengths[99], len(d.lengths)
+    (True, 256)
+    """
+    freq = {symbol: 1 for symbol in range(256)}
+    for sample in samples:
+        for symbol, count in make_freq_dict(sample).items():
+            freq[symbol] += count
+    return Dictionary(code_lengths(freq, max_code_length))
+
+
+def save_dictionary(dictionary, path):
+    """ Write dictionary to the dictionary file path.
+
+    @param Dictionary dictionary: dictionary to save
+    @param str path: dictionary file to create
+    @rtype: NoneType
+    """
+    with open(path, "wb") as f:
+        f.write(dictionary.to_bytes())
+
+
+def load_dictionary(path):
+    """ Return the Dictionary in the dictionary file path.
+
+    @param str path: dictionary file to read
+    @rtype: Dictionary
+    """
+    with open(path, "rb") as f:
+        return Dictionary.from_bytes(f.read())
+
+
+def compress_many(payloads, dictionary):
+    """ Return each of payloads compressed with dictionary.
+
+    @param iterable[bytes] payloads: texts to compress
+    @param Dictionary dictionary: dictionary to compress with
+    @rtype: list[bytes]
+    """
+    return [dictionary.compress(payload) for payload in payloads]
+
+
+def uncompress_many(buffers, dictionary):
+    """ Return each of buffers, compressed with dictionary, uncompressed.
+
+    @param iterable[bytes] buffers: compressed payloads
+    @param Dictionary dictionary: dictionary they were compressed with
+    @rtype: list[bytes]
+
+    >>> d = train_dictionary([b"abracadabra"])
+    >>> uncompress_many(compress_many([b"ab", b"", b"cd"], d), d)
+    [b'ab', b'', b'cd']
+    """
+    return [dictionary.uncompress(buf) for buf in buffers]
+
+
+def compress_file(in_file, out_file, dictionary, chunk_size=CHUNK_SIZE):
+    """ Compress contents of in_file with dictionary and store results in
+    out_file, which huffman.uncompress can read given the same
+    dictionary.
+
+    @param str in_file: input file to compress
+    @param str out_file: output file to store compressed result
+    @param Dictionary dictionary: dictionary to compress with
+    @param int chunk_size: number of bytes to read at a time
+    @rtype: NoneType
+    """
+    with open(in_file, "rb") as f1, open(out_file, "wb") as f2:
+        f1.seek(0, 2)
+        f2.write(dictionary_header_bytes(dictionary.id, f1.tell()))
+        f1.seek(0)
+        encode_chunks(read_chunks(f1, chunk_size), dictionary._table, f2,
+                      chunk_size)
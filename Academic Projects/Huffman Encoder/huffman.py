@@ -2,7 +2,70 @@
 Code for compressing and decompressing using Huffman compression.
 """
 
-from nodes import HuffmanNode, ReadNode
+import mmap
+import os
+import tempfile
+from collections import Counter, deque
+from functools import partial
+from heapq import merge
+from io import BytesIO
+from itertools import chain, repeat
+from operator import lshift, or_
+
+from adaptive import AdaptiveDecoder, AdaptiveEncoder
+from metrics import NO_METRICS
+from bitio import BitReader, BitWriter
+from nodes import HuffmanNode, HuffmanTree, ReadNode
+from seekindex import SeekIndex, INDEX_SUFFIX, read_index, write_index
+from seekindex import remove_index
+from symbolizer import SYMBOLIZERS, SYMBOL_BYTES
+from transforms import Pipeline, PipelineDecoder
+
+try:
+    import numpy_backend
+except ImportError:
+    numpy_backend = None
+
+# whether to count and encode with numpy_backend; on when NumPy is installed
+USE_NUMPY = numpy_backend is not None
+# number of symbols numpy_backend encodes at a time
+NUMPY_SLICE = 1 << 18
+# below this many symbols NumPy's overhead per call outweighs its speed
+NUMPY_MIN = 1 << 9
+
+
+# number of bytes compress and uncompress read from a file at a time
+CHUNK_SIZE = 1 << 20
+# number of bytes iter_decompress reads at a time; smaller, so the first
+# bytes come out sooner
+ITER_CHUNK_SIZE = 1 << 16
+
+# Compressed files start with MAGIC, a version byte and a mode byte. In
+# MODE_STATIC the uncompressed size in SIZE_BYTES bytes, the canonical code
+# lengths (see lengths_to_bytes) and the coded data follow. In
+# MODE_ADAPTIVE the data coded by adaptive.AdaptiveEncoder follows at once.
+# MODE_CONTEXT is like MODE_STATIC but with a code table per previous byte,
+# see context_header_bytes. MODE_DICTIONARY stores the size and the ID of
+# a dictionary.Dictionary that holds the code lengths. MODE_STORED stores
+# the size and then the input as it is, for data that coding would not
+# make smaller. MODE_SYMBOLS is like MODE_STATIC for the symbols of a
+# symbolizer.ByteSymbols or one of its subclasses, which may go past 255;
+# see symbols_header_bytes. MODE_PIPELINE stores the size and a
+# transforms.Pipeline, then a whole compressed file of the pipeline's
+# output.
+# Files without MAGIC are in the original format: node count, tree nodes
+# and a 4-byte size.
+MAGIC = b"HUF"
+FORMAT_VERSION = 1
+MODE_STATIC = 0
+MODE_ADAPTIVE = 1
+MODE_CONTEXT = 2
+MODE_DICTIONARY = 3
+MODE_STORED = 4
+MODE_SYMBOLS = 5
+MODE_PIPELINE = 6
+DICTIONARY_ID_BYTES = 4
+SIZE_BYTES = 8
 
 
 # ====================
@@ -37,6 +100,64 @@ def byte_to_bits(byte):
                     for bit_num in range(7, -1, -1)])
 
 
+def read_chunks(f, chunk_size=CHUNK_SIZE):
+    """ Yield the rest of binary file f, chunk_size bytes at a time.
+
+    @param file f: a file opened for reading in binary mode
+    @param int chunk_size: largest number of bytes to yield at once
+    @rtype: iterator[bytes]
+    """
+    return iter(partial(f.read, chunk_size), b"")
+
+
+def map_input(f):
+    """ Return a read-only memory map of binary file f, or None if f is
+    empty (an empty file cannot be mapped).
+
+    @param file f: a file opened for reading in binary mode
+    @rtype: mmap.mmap|NoneType
+    """
+    if not os.fstat(f.fileno()).st_size:
+        return None
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def map_chunks(source, chunk_size=CHUNK_SIZE, start=0):
+    """ Yield source from start on as memoryviews of chunk_size bytes,
+    without copying it.
+
+    @param mmap.mmap|bytes source: bytes to cut up
+    @param int chunk_size: largest number of bytes to yield at once
+    @param int start: offset of the first byte to yield
+    @rtype: iterator[memoryview]
+    """
+    view = memoryview(source)
+    for i in range(start, len(view), chunk_size):
+        yield view[i:i + chunk_size]
+
+
+def split_chunks(chunks, interval):
+    """ Yield the pieces of chunks, cut so that no piece crosses a multiple
+    of interval bytes from the start.
+
+    @param iterable[bytes] chunks: pieces of a text
+    @param int interval: distance between cuts
+    @rtype: iterator[memoryview]
+
+    >>> [bytes(p) for p in split_chunks([b"abc", b"defgh"], 2)]
+    [b'ab', b'c', b'd', b'ef', b'gh']
+    """
+    pos = 0
+    for chunk in chunks:
+        view = memoryview(chunk)
+        start = 0
+        while start < len(view):
+            end = start + interval - (pos + start) % interval
+            yield view[start:end]
+            start = end
+        pos += len(view)
+
+
 def bits_to_byte(bits):
     """ Return int represented by bits, padded on right.
 
@@ -66,20 +187,22 @@ def make_freq_dict(text): #Done
     >>> d == {65: 1, 66: 2, 67: 1}
     True
     """
-    d = {}
-    for i in range(len(text)):
-        if text[i] not in d:
-            d[text[i]] = 1
-        else:
-            d[text[i]] += 1
-    return d
+    if USE_NUMPY and isinstance(text, (bytes, bytearray, memoryview)):
+        return numpy_backend.freq_counts(text)
+    # same order as the NumPy histogram, so both give the same tree
+    counts = Counter(text)
+    return {symbol: counts[symbol] for symbol in sorted(counts)}
 
 
-def huffman_tree(freq_dict): #done
+def huffman_tree(freq_dict, max_code_length=None): #done
     """ Return the root HuffmanNode of a Huffman tree corresponding
     to frequency dictionary freq_dict.
 
+    If max_code_length is given, return instead an optimal tree among
+    those with no code longer than max_code_length bits.
+
     @param dict(int,int) freq_dict: a frequency dictionary
+    @param int|NoneType max_code_length: longest code allowed, if any
     @rtype: HuffmanNode
 
     >>> freq = {2: 6, 3: 4}
@@ -88,27 +211,115 @@ def huffman_tree(freq_dict): #done
     >>> result2 = HuffmanNode(None, HuffmanNode(2), HuffmanNode(3))
     >>> t == result1 or t == result2
     True
+    >>> freq = {0: 1, 1: 1, 2: 2, 3: 4, 4: 8}
+    >>> max(len(c) for c in get_codes(huffman_tree(freq)).values())
+    4
+    >>> max(len(c) for c in get_codes(huffman_tree(freq, 3)).values())
+    3
     """
-    #creates a list of lists where the first item in the tuple is the frequency of the symbol and the second item is the HuffmanNode of the symbol
-    node_list = []
-    for item in freq_dict:
-        node_list.append([freq_dict[item], HuffmanNode(item)])
-    
-    #create huffman tree
+    return flat_huffman_tree(freq_dict, max_code_length).to_node()
+
+
+def flat_huffman_tree(freq_dict, max_code_length=None):
+    """ Return the same tree as huffman_tree, as a HuffmanTree.
+
+    @param dict(int,int) freq_dict: a frequency dictionary
+    @param int|NoneType max_code_length: longest code allowed, if any
+    @rtype: HuffmanTree
+
+    >>> t = flat_huffman_tree({2: 6, 3: 4})
+    >>> t.codes() == {3: "0", 2: "1"}
+    True
+    """
+    if max_code_length is not None and len(freq_dict) > 1:
+        tree = flat_huffman_tree(freq_dict)
+        if max(tree.code_lengths().values()) <= max_code_length:
+            return tree
+        return HuffmanTree.from_codes(canonical_codes(
+            limited_code_lengths(freq_dict, max_code_length)))
+    tree = HuffmanTree()
     #if there is only one symbol in freq_dict, returns the HuffmanNode of that symbol with 2 child nodes as the bit for the symbol can be either 0 or 1
-    if len(node_list) == 1:
-        return HuffmanNode(None, node_list[0][1], node_list[0][1])
-    #first sorts freq_dict in ascending order
-    #takes 2 symbols in the list with the lowest frequency(which are at the front of the tree) and creates a tree using them
-    #and then appends the tree to the list as a list combined with the total frequency of the symbol in the tree
-    #repeats until length of list is 1
-    #with reference to 'Huffman Coding' section in https://www2.cs.duke.edu/csed/poop/huff/info/  
-    while len(node_list) > 1:
-        node_list = sorted(node_list, key=lambda x: x[0])
-        n_left = node_list.pop(0)
-        n_right = node_list.pop(0)
-        node_list.append([n_left[0] + n_right[0], HuffmanNode(None, n_left[1], n_right[1])])
-    return node_list[0][1]
+    if len(freq_dict) == 1:
+        leaf = tree.add_leaf(next(iter(freq_dict)))
+        tree.add_node(leaf, leaf)
+        return tree
+    #two-queue construction: leaves sorted by frequency in one queue, merged
+    #trees in another. Merged trees are made in order of increasing
+    #frequency, so the two lightest trees are always at the front of the
+    #queues and each merge is O(1); sorting makes the whole O(n log n),
+    #and O(n) when freq_dict is already in frequency order.
+    #ties go to the leaf queue, then to the older tree
+    #with reference to 'Huffman Coding' section in https://www2.cs.duke.edu/csed/poop/huff/info/
+    leaves = deque([(freq_dict[item], tree.add_leaf(item))
+                    for item in sorted(freq_dict, key=freq_dict.get)])
+    merged = deque()
+
+    def pop_lightest():
+        if not merged or (leaves and leaves[0][0] <= merged[0][0]):
+            return leaves.popleft()
+        return merged.popleft()
+
+    while len(leaves) + len(merged) > 1:
+        n_left = pop_lightest()
+        n_right = pop_lightest()
+        merged.append((n_left[0] + n_right[0],
+                       tree.add_node(n_left[1], n_right[1])))
+    return tree
+
+
+def limited_code_lengths(freq_dict, max_code_length):
+    """ Return a dictionary that maps each symbol in freq_dict to its code
+    length in an optimal prefix code with no code longer than
+    max_code_length, found with the package-merge algorithm.
+
+    @param dict(int,int) freq_dict: a frequency dictionary with 2 or more
+    symbols
+    @param int max_code_length: longest code allowed
+    @rtype: dict(int,int)
+
+    >>> d = limited_code_lengths({0: 1, 1: 1, 2: 2, 3: 4, 4: 8}, 3)
+    >>> d == {0: 3, 1: 3, 2: 3, 3: 3, 4: 1}
+    True
+    """
+    if len(freq_dict) > 1 << max_code_length:
+        raise ValueError("{} symbols do not fit in {}-bit codes".format(
+            len(freq_dict), max_code_length))
+    # an item is (weight, symbol, None) for a coin of one symbol, or
+    # (weight, None, (item, item)) for a package of two items
+    coins = [(freq, symbol, None)
+             for symbol, freq in sorted(freq_dict.items(),
+                                        key=lambda x: (x[1], x[0]))]
+    items = coins
+    for _ in range(max_code_length - 1):
+        packages = [(items[i][0] + items[i + 1][0], None,
+                     (items[i], items[i + 1]))
+                    for i in range(0, len(items) - 1, 2)]
+        items = list(merge(coins, packages, key=lambda item: item[0]))
+    # each time a symbol's coin is among the cheapest 2n - 2 items, its
+    # code gets one bit longer
+    lengths = dict.fromkeys(freq_dict, 0)
+    stack = items[:2 * len(freq_dict) - 2]
+    while stack:
+        _, symbol, pair = stack.pop()
+        if pair is None:
+            lengths[symbol] += 1
+        else:
+            stack.extend(pair)
+    return lengths
+
+
+def tree_from_codes(codes):
+    """ Return the root HuffmanNode of the tree whose leaves have the
+    given codes.
+
+    @param dict(int,str) codes: mapping from symbols to prefix-free codes
+    @rtype: HuffmanNode
+
+    >>> tree_from_codes({3: "0", 2: "1"})
+    HuffmanNode(None, HuffmanNode(3, None, None), HuffmanNode(2, None, None))
+    """
+    return HuffmanTree.from_codes(codes).to_node()
+
 
 def get_codes(tree):
     """ Return a dict mapping symbols from Huffman tree to codes.
@@ -122,21 +333,19 @@ def get_codes(tree):
     True
     """
     symbol_bits_dict = {}
-    
-    
-    def get_code_preorder(BTNode, symbol_path):
-      #if node on left exists, recurse function and add "0" to symbol_bit
-      #if node on right exists, recurse function and add "1" to symbol_bit
-        if BTNode.left:
-            get_code_preorder(BTNode.left, symbol_path + "0")
-        if BTNode.right:
-            get_code_preorder(BTNode.right, symbol_path + "1")
-        if BTNode.is_leaf and BTNode.symbol != None:
-            symbol_bits_dict[BTNode.symbol] = symbol_path
-
-    get_code_preorder(tree, "")    
+    #preorder with an explicit stack of (node, path to node); right is
+    #pushed first so that left is visited first
+    stack = [(tree, "")]
+    while stack:
+        node, symbol_path = stack.pop()
+        if node.right:
+            stack.append((node.right, symbol_path + "1"))
+        if node.left:
+            stack.append((node.left, symbol_path + "0"))
+        if node.symbol is not None:
+            symbol_bits_dict[node.symbol] = symbol_path
     return symbol_bits_dict
-        
+
 
 def number_nodes(tree):
     """ Number internal nodes in tree according to postorder traversal;
@@ -156,22 +365,33 @@ def number_nodes(tree):
     >>> tree.number
     2
     """
-    L = postorder(tree)
-    counter = 0
-    for item in L:
-      item.number = counter
-      counter += 1
-    
+    for counter, item in enumerate(postorder(tree)):
+        item.number = counter
+
+
 def postorder(tree):
-  if not tree:
-    return []
-  elif tree.is_leaf():
-    return []
-  else:
-    L = postorder(tree.left) + postorder(tree.right)
-    L.append(tree)
+    """ Return the internal nodes of tree in postorder.
+
+    @param HuffmanNode tree: a Huffman tree rooted at node 'tree'
+    @rtype: list[HuffmanNode]
+
+    >>> left = HuffmanNode(None, HuffmanNode(3), HuffmanNode(2))
+    >>> tree = HuffmanNode(None, left, HuffmanNode(5))
+    >>> postorder(tree) == [left, tree]
+    True
+    """
+    #visit node, right, left with a stack, then reverse to get
+    #left, right, node
+    L = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if node and not node.is_leaf():
+            L.append(node)
+            stack.append(node.left)
+            stack.append(node.right)
+    L.reverse()
     return L
-  
 
 
 def avg_length(tree, freq_dict):
@@ -218,18 +438,77 @@ def generate_compressed(text, codes):
     >>> [byte_to_bits(byte) for byte in result]
     ['10111001', '10000000']
     """
-    byte_list = []
-    txt_to_bit = ""
-    for symb in text:
-      txt_to_bit += codes[symb]
-      if len(txt_to_bit) > 8:
-        byte_list.append(bits_to_byte(txt_to_bit[:8]))
-        txt_to_bit = txt_to_bit[8:]
-    if txt_to_bit != "":
-      byte_list.append(bits_to_byte(txt_to_bit))
-    return bytes(byte_list)
-        
-      
+    writer = BitWriter(len(text))
+    write_codes(writer, text, codes_to_table(codes))
+    return writer.getvalue()
+
+
+def write_codes(writer, text, table, prev=None):
+    """ Write the code of each symbol of text to writer.
+
+    If prev is given, table is indexed by pair_symbols(text, prev) rather
+    than by byte, as made by pair_table.
+
+    @param BitWriter writer: where to write the codes
+    @param bytes text: a bytes object
+    @param list[tuple(int,int)] table: code for each symbol, as made by
+    codes_to_table
+    @param int|NoneType prev: the byte before text, for pair codes
+    @rtype: NoneType
+    """
+    arrays = None
+    # symbols from a symbolizer come as lists or arrays, not bytes
+    if (USE_NUMPY and len(text) >= NUMPY_MIN and
+            isinstance(text, (bytes, bytearray, memoryview))):
+        arrays = numpy_arrays(table)
+    if arrays is not None:
+        values, lengths = arrays
+        # pack_codes needs about 40 bytes per symbol of scratch space
+        view = memoryview(text)
+        for start in range(0, len(view), NUMPY_SLICE):
+            if prev is not None and start:
+                prev = view[start - 1]
+            writer.write_bits(*numpy_backend.pack_codes(
+                view[start:start + NUMPY_SLICE], values, lengths, prev))
+    elif prev is not None:
+        writer.write_symbols(pair_symbols(text, prev), table)
+    else:
+        writer.write_symbols(text, table)
+
+
+# the last table numpy_arrays was called with, and its arrays
+_last_arrays = [None, None]
+
+
+def numpy_arrays(table):
+    """ Return numpy_backend.code_arrays(table), or None if a code is too
+    long for numpy_backend.pack_codes. The arrays for the last table are
+    kept, as write_codes is called with the same table for every chunk.
+
+    @param list[tuple(int,int)] table: code for each symbol
+    @rtype: tuple(numpy.ndarray,numpy.ndarray)|NoneType
+    """
+    if _last_arrays[0] is not table:
+        fits = max([code[1] for code in table if code] or [0]) <= 64
+        _last_arrays[:] = [table,
+                           numpy_backend.code_arrays(table) if fits else None]
+    return _last_arrays[1]
+
+
+def codes_to_table(codes):
+    """ Return a list that maps each symbol in codes to its code as a
+    (value, length) pair of ints, for use with BitWriter.
+
+    @param dict(int,str) codes: mapping from symbols to codes
+    @rtype: list[tuple(int,int)|NoneType]
+
+    >>> codes_to_table({0: "0", 2: "11"})
+    [(0, 1), None, (3, 2)]
+    """
+    table = [None] * (max(codes, default=-1) + 1)
+    for symbol, code in codes.items():
+        table[symbol] = (int(code, 2), len(code))
+    return table
 
 
 def tree_to_bytes(tree):
@@ -253,24 +532,8 @@ def tree_to_bytes(tree):
     >>> list(tree_to_bytes(tree))
     [0, 3, 0, 2, 1, 0, 0, 5]
     """
-    if not tree or not (tree.left and tree.right):  #if tree is a leaf, return []
-      return bytes([])
-    elif tree.left.symbol and tree.right.symbol:
-      L = []
-      if tree.left and tree.left.is_leaf(): #if left child is a leaf, set 1st byte to 0 and 2nd byte to child's symbol
-        L.append(0)
-        L.append(tree.left.symbol)
-      else:																	#else, set 1st byte to 1 and 2nd byte to node's number
-        L.append(1)
-        L.append(tree.number)
-      if tree.right and tree.right.is_leaf(): 
-        L.append(0)
-        L.append(tree.right.symbol)
-      else:
-        L.append(1)
-        L.append(tree.number)
-      return bytes(L)
-    return bytes(tree_to_bytes(tree.left) + tree_to_bytes(tree.right) + node_to_bytes(tree))
+    return b"".join([node_to_bytes(node) for node in postorder(tree)])
+
 
 def node_to_bytes(tree):
   L = []
@@ -301,43 +564,683 @@ def num_nodes_to_bytes(tree):
     return bytes([tree.number + 1])
 
 
-def size_to_bytes(size):
+def size_to_bytes(size, nbytes=4):
     """ Return the size as a bytes object.
 
-    @param int size: a 32-bit integer to convert to bytes
+    @param int size: an integer of at most nbytes bytes to convert
+    @param int nbytes: number of bytes to use
     @rtype: bytes
 
     >>> list(size_to_bytes(300))
     [44, 1, 0, 0]
     """
-    # little-endian representation of 32-bit (4-byte)
-    # int size
-    return size.to_bytes(4, "little")
+    # little-endian representation of size in nbytes bytes
+    return size.to_bytes(nbytes, "little")
+
+
+def code_lengths(freq_dict, max_code_length=None):
+    """ Return a dictionary that maps each symbol in freq_dict to the
+    length of its code in a Huffman tree for freq_dict.
+
+    @param dict(int,int) freq_dict: a frequency dictionary
+    @param int|NoneType max_code_length: longest code allowed, if any
+    @rtype: dict(int,int)
+
+    >>> code_lengths({65: 5, 66: 2, 67: 2}) == {65: 1, 66: 2, 67: 2}
+    True
+    >>> code_lengths({})
+    {}
+    """
+    return flat_huffman_tree(freq_dict, max_code_length).code_lengths()
+
+
+def canonical_order(lengths):
+    """ Return the symbols of lengths ordered by code length, then symbol.
+
+    @param dict(int,int) lengths: mapping from symbols to code lengths
+    @rtype: list[int]
+    """
+    return sorted(lengths, key=lambda symbol: (lengths[symbol], symbol))
+
 
+def canonical_codes(lengths):
+    """ Return the canonical Huffman codes with the given code lengths.
 
-def compress(in_file, out_file):
+    Shorter codes come first, and codes of the same length are consecutive
+    binary numbers in symbol order, so the lengths alone fix every code.
+
+    @param dict(int,int) lengths: mapping from symbols to code lengths
+    @rtype: dict(int,str)
+
+    >>> d = canonical_codes({67: 2, 65: 1, 66: 2})
+    >>> d == {65: "0", 66: "10", 67: "11"}
+    True
+    """
+    codes = {}
+    code = 0
+    prev_len = 0
+    for symbol in canonical_order(lengths):
+        code <<= lengths[symbol] - prev_len
+        prev_len = lengths[symbol]
+        codes[symbol] = format(code, "0{}b".format(prev_len))
+        code += 1
+    return codes
+
+
+def lengths_to_bytes(lengths, symbol_bytes=1):
+    """ Return a bytes representation of the code lengths: the longest
+    length, the number of codes of each length from 1 up (2 bytes each),
+    then the symbols in canonical order.
+
+    Symbols past 255 need symbol_bytes > 1; each symbol, and each count,
+    then takes symbol_bytes bytes.
+
+    @param dict(int,int) lengths: mapping from symbols to code lengths
+    @param int symbol_bytes: bytes per symbol
+    @rtype: bytes
+
+    >>> list(lengths_to_bytes({67: 2, 65: 1, 66: 2}))
+    [2, 1, 0, 2, 0, 65, 66, 67]
+    >>> list(lengths_to_bytes({300: 1, 65: 1}, 3))
+    [1, 2, 0, 0, 65, 0, 0, 44, 1, 0]
+    """
+    max_len = max(lengths.values(), default=0)
+    counts = [0] * (max_len + 1)
+    for n in lengths.values():
+        counts[n] += 1
+    if symbol_bytes == 1:
+        return (bytes([max_len]) +
+                b"".join([size_to_bytes(count, 2) for count in counts[1:]]) +
+                bytes(canonical_order(lengths)))
+    return (bytes([max_len]) +
+            b"".join([size_to_bytes(n, symbol_bytes)
+                      for n in chain(counts[1:], canonical_order(lengths))]))
+
+
+def header_bytes(lengths, size):
+    """ Return the header of a MODE_STATIC compressed file.
+
+    @param dict(int,int) lengths: mapping from symbols to code lengths
+    @param int size: number of symbols that will follow
+    @rtype: bytes
+    """
+    return (MAGIC + bytes([FORMAT_VERSION, MODE_STATIC]) +
+            size_to_bytes(size, SIZE_BYTES) + lengths_to_bytes(lengths))
+
+
+def symbols_header_bytes(symbolizer, lengths, size):
+    """ Return the header of a MODE_SYMBOLS compressed file: the size, the
+    symbolizer's ID (1 byte), the length of its to_bytes (4 bytes) and
+    to_bytes itself, then the code lengths with SYMBOL_BYTES per symbol.
+
+    @param symbolizer.ByteSymbols symbolizer: what cut the input up
+    @param dict(int,int) lengths: mapping from symbols to code lengths
+    @param int size: number of bytes the symbols expand to
+    @rtype: bytes
+    """
+    state = symbolizer.to_bytes()
+    return (MAGIC + bytes([FORMAT_VERSION, MODE_SYMBOLS]) +
+            size_to_bytes(size, SIZE_BYTES) + bytes([symbolizer.ID]) +
+            size_to_bytes(len(state), 4) + state +
+            lengths_to_bytes(lengths, SYMBOL_BYTES))
+
+
+def pipeline_header_bytes(pipeline, size):
+    """ Return the header of a MODE_PIPELINE compressed file, up to the
+    compressed file of the pipeline's output.
+
+    @param transforms.Pipeline pipeline: what the input went through
+    @param int size: number of bytes of input
+    @rtype: bytes
+    """
+    return (MAGIC + bytes([FORMAT_VERSION, MODE_PIPELINE]) +
+            size_to_bytes(size, SIZE_BYTES) + pipeline.to_bytes())
+
+
+def dictionary_header_bytes(dictionary_id, size):
+    """ Return the header of a MODE_DICTIONARY compressed file.
+
+    @param int dictionary_id: ID of the dictionary the data is coded with
+    @param int size: number of symbols that will follow
+    @rtype: bytes
+    """
+    return (MAGIC + bytes([FORMAT_VERSION, MODE_DICTIONARY]) +
+            size_to_bytes(size, SIZE_BYTES) +
+            size_to_bytes(dictionary_id, DICTIONARY_ID_BYTES))
+
+
+def stored_header_bytes(size):
+    """ Return the header of a MODE_STORED compressed file.
+
+    @param int size: number of bytes that will follow
+    @rtype: bytes
+    """
+    return (MAGIC + bytes([FORMAT_VERSION, MODE_STORED]) +
+            size_to_bytes(size, SIZE_BYTES))
+
+
+def worth_coding(header, nbits, size):
+    """ Return whether header followed by nbits bits of codes is shorter
+    than storing size bytes as they are.
+
+    @param bytes header: header for the coded data
+    @param int nbits: number of bits the codes take up
+    @param int size: number of bytes coded
+    @rtype: bool
+
+    >>> worth_coding(bytes(20), 8 * 900, 1000)
+    True
+    >>> worth_coding(bytes(20), 8 * 995, 1000)
+    False
+    """
+    stored = len(stored_header_bytes(size)) + size
+    return len(header) + (nbits + 7) // 8 < stored
+
+
+def compress_bound(size):
+    """ Return the most bytes compress_bytes or compress_into can produce
+    from size bytes, as data that coding would not shrink is stored.
+
+    @param int size: number of bytes to compress
+    @rtype: int
+
+    >>> compress_bound(100)
+    113
+    """
+    return len(stored_header_bytes(size)) + size
+
+
+def compress_into(src, dst, max_code_length=None, cache=None):
+    """ Compress the bytes of src into the start of writable buffer dst,
+    in the format compress_bytes returns, and return the number of bytes
+    written. The codes are written straight into dst, so a buffer of
+    compress_bound(len(src)) bytes can be reused for every call.
+
+    @param bytes|bytearray|memoryview src: bytes to compress
+    @param bytearray|memoryview|mmap.mmap dst: where to write the result
+    @param int|NoneType max_code_length: longest code allowed, if any
+    @param codecache.CodeCache|NoneType cache: where to look up tables
+    @rtype: int
+
+    >>> buf = bytearray(compress_bound(11))
+    >>> n = compress_into(b"abracadabra", buf)
+    >>> uncompress_bytes(bytes(buf[:n]))
+    b'abracadabra'
+    """
+    src = memoryview(src).cast("B")
+    out = memoryview(dst).cast("B")
+    size = len(src)
+    freq = make_freq_dict(src)
+    lengths, table = code_table(freq, max_code_length, cache)
+    header = header_bytes(lengths, size)
+    nbits = sum([lengths[s] * freq[s] for s in freq])
+    stored = not worth_coding(header, nbits, size)
+    if stored:
+        header = stored_header_bytes(size)
+        total = len(header) + size
+    else:
+        total = len(header) + (nbits + 7) // 8
+    if len(out) < total:
+        raise ValueError("{} bytes needed, buffer has {}"
+                         .format(total, len(out)))
+    out[:len(header)] = header
+    if stored:
+        out[len(header):total] = src
+    else:
+        writer = BitWriter(buffer=out[len(header):total])
+        write_codes(writer, src, table)
+        writer.finish()
+    return total
+
+
+def compress_bytes(text, max_code_length=None, cache=None):
+    """ Return text compressed into the same format compress writes, or
+    stored as it is if coding would not make it smaller.
+
+    @param bytes text: a bytes object
+    @param int|NoneType max_code_length: longest code allowed, if any
+    @param codecache.CodeCache|NoneType cache: where to look up tables
+    @rtype: bytes
+    """
+    buf = bytearray(compress_bound(len(text)))
+    del buf[compress_into(text, buf, max_code_length, cache):]
+    return bytes(buf)
+
+
+def code_table(freq_dict, max_code_length=None, cache=None):
+    """ Return the code lengths for freq_dict and the encoder table for
+    their canonical codes, from cache if one is given.
+
+    @param dict(int,int) freq_dict: a frequency dictionary
+    @param int|NoneType max_code_length: longest code allowed, if any
+    @param codecache.CodeCache|NoneType cache: where to look up tables
+    @rtype: tuple(dict(int,int),list[tuple(int,int)|NoneType])
+    """
+    if cache is not None:
+        tables = cache.for_freq(freq_dict, max_code_length)
+        return tables.lengths, tables.table
+    lengths = code_lengths(freq_dict, max_code_length)
+    return lengths, codes_to_table(canonical_codes(lengths))
+
+
+def count_symbols(chunks):
+    """ Return the frequency dictionary and the total size of chunks.
+
+    @param iterable[bytes] chunks: pieces of the text to count
+    @rtype: tuple(dict(int,int),int)
+    """
+    freq = {}
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        for symbol, count in make_freq_dict(chunk).items():
+            freq[symbol] = freq.get(symbol, 0) + count
+    return freq, size
+
+
+def count_tokens(chunks, symbolizer):
+    """ Return the counts of symbolizer's tokens in chunks, and the total
+    size of chunks.
+
+    @param iterable[bytes] chunks: pieces of the text to count
+    @param symbolizer.ByteSymbols symbolizer: what cuts chunks into tokens
+    @rtype: tuple(Counter,int)
+    """
+    counts = Counter()
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        counts.update(symbolizer.tokens(chunk))
+    return counts, size
+
+
+def copy_chunks(chunks, out):
+    """ Write each of chunks to out as it is.
+
+    @param iterable[bytes|memoryview] chunks: pieces of input
+    @param file|mmap.mmap out: where to write them
+    @rtype: NoneType
+    """
+    for chunk in chunks:
+        out.write(chunk)
+
+
+def encode_chunks(chunks, table, out, capacity=CHUNK_SIZE, index=None):
+    """ Encode chunks with table and write the result to out as it is
+    produced.
+
+    If index is given, the bit offset of every index.interval-th symbol is
+    appended to index.offsets; chunks must then be cut with split_chunks.
+
+    @param iterable[bytes] chunks: pieces of the text to encode
+    @param list[tuple(int,int)] table: code for each symbol
+    @param file|mmap.mmap out: where to write the compressed bytes
+    @param int capacity: bytes to preallocate for each chunk's output
+    @param SeekIndex|NoneType index: index to record offsets in
+    @rtype: NoneType
+    """
+    writer = BitWriter(capacity)
+    pos = written = 0
+    for chunk in chunks:
+        if index is not None and pos % index.interval == 0:
+            index.offsets.append(written * 8 + writer.bit_length)
+        write_codes(writer, chunk, table)
+        pos += len(chunk)
+        data = writer.drain()
+        written += len(data)
+        out.write(data)
+    out.write(writer.getvalue())
+
+
+def compress(in_file, out_file, chunk_size=CHUNK_SIZE,
+             max_code_length=None, use_mmap=False, index_interval=None,
+             cache=None, metrics=None, verbose=True, symbolizer=None,
+             pipeline=None):
     """ Compress contents of in_file and store results in out_file.
 
+    in_file is read twice, chunk_size bytes at a time: once to count the
+    symbols and once to encode them straight into out_file, so memory use
+    does not grow with the size of in_file. If the counts show that coding
+    would not make in_file smaller, it is copied in MODE_STORED instead.
+
+    With use_mmap, in_file is memory-mapped and read through memoryviews
+    instead of copied out chunk by chunk, and out_file is created at its
+    final size (known from the code lengths) and written through a memory
+    map too.
+
+    With index_interval, a seek index with the bit offset of every
+    index_interval-th symbol is written to out_file + INDEX_SUFFIX, for
+    read_range; without it, any index already there is removed.
+
+    With symbolizer, e.g. a symbolizer.WordSymbols, the code is built for
+    its symbols instead of bytes and in_file is written in MODE_SYMBOLS.
+    Each chunk is cut into symbols on its own, so a word that straddles
+    two chunks becomes two tokens. There is no seek index for these
+    files.
+
+    With pipeline, a transforms.Pipeline, in_file is run through it a
+    block at a time into a temporary file first, which is compressed as
+    above, and written in MODE_PIPELINE; see compress_pipeline.
+
+    The "count", "code_table" and "encode" stages are measured into
+    metrics, if given.
+
     @param str in_file: input file to compress
     @param str out_file: output file to store compressed result
+    @param int chunk_size: number of bytes to read at a time
+    @param int|NoneType max_code_length: longest code allowed, if any
+    @param bool use_mmap: whether to go through memory maps
+    @param int|NoneType index_interval: symbols between seek index entries
+    @param codecache.CodeCache|NoneType cache: where to look up tables
+    @param metrics.Metrics|NoneType metrics: where to record measurements
+    @param bool verbose: whether to print the bits per symbol
+    @param symbolizer.ByteSymbols|NoneType symbolizer: what to cut in_file
+        into symbols with, if not bytes
+    @param transforms.Pipeline|NoneType pipeline: what to run in_file
+        through first, if anything
     @rtype: NoneType
     """
+    if metrics is None:
+        metrics = NO_METRICS
+    if pipeline is not None:
+        if index_interval:
+            raise ValueError("no seek index for files with a pipeline")
+        compress_pipeline(in_file, out_file, pipeline, chunk_size,
+                          max_code_length=max_code_length,
+                          use_mmap=use_mmap, cache=cache, metrics=metrics,
+                          verbose=verbose, symbolizer=symbolizer)
+        remove_index(out_file + INDEX_SUFFIX)
+        return
+    if symbolizer is not None and index_interval:
+        raise ValueError("no seek index for files with a symbolizer")
     with open(in_file, "rb") as f1:
-        text = f1.read()
-    freq = make_freq_dict(text)
-    tree = huffman_tree(freq)
-    codes = get_codes(tree)
-    number_nodes(tree)
-    print("Bits per symbol:", avg_length(tree, freq))
-    result = (num_nodes_to_bytes(tree) + tree_to_bytes(tree) +
-              size_to_bytes(len(text)))
-    result += generate_compressed(text, codes)
-    with open(out_file, "wb") as f2:
-        f2.write(result)
+        source = map_input(f1) if use_mmap else None
+        try:
+            with metrics.stage("count") as stage:
+                if source is None:
+                    chunks = read_chunks(f1, chunk_size)
+                else:
+                    chunks = map_chunks(source, chunk_size)
+                if symbolizer is None:
+                    freq, size = count_symbols(chunks)
+                    stage.symbols = size
+                else:
+                    counts, size = count_tokens(chunks, symbolizer)
+                    symbolizer.fit(counts)
+                    freq = symbolizer.freq(counts)
+                    stage.symbols = sum(freq.values())
+                stage.bytes_in = size
+            with metrics.stage("code_table") as stage:
+                lengths, table = code_table(freq, max_code_length, cache)
+                nbits = sum([lengths[s] * freq[s] for s in freq])
+                if symbolizer is None:
+                    header = header_bytes(lengths, size)
+                else:
+                    header = symbols_header_bytes(symbolizer, lengths, size)
+                total = len(header) + (nbits + 7) // 8
+                stored = not worth_coding(header, nbits, size)
+                if stored:
+                    header = stored_header_bytes(size)
+                    total = len(header) + size
+                stage.symbols = len(freq)
+                stage.tree_depth = max(lengths.values(), default=0)
+                stage.header_size = len(header)
+            if verbose and size:
+                print("Bits per symbol:", nbits / size)
+            if source is None:
+                f1.seek(0)
+                chunks = read_chunks(f1, chunk_size)
+            else:
+                chunks = map_chunks(source, chunk_size)
+            index = None
+            if index_interval and not stored:
+                index = SeekIndex(index_interval, size)
+                chunks = split_chunks(chunks, index_interval)
+            with metrics.stage("encode") as stage, \
+                    open(out_file, "wb" if source is None else "w+b") as f2:
+                target = f2
+                if source is not None:
+                    f2.truncate(total)
+                    target = mmap.mmap(f2.fileno(), total)
+                try:
+                    target.write(header)
+                    if stored:
+                        copy_chunks(chunks, target)
+                    else:
+                        if symbolizer is not None:
+                            chunks = map(symbolizer.symbols, chunks)
+                        encode_chunks(chunks, table, target, chunk_size,
+                                      index)
+                finally:
+                    if target is not f2:
+                        target.close()
+                stage.bytes_in = size
+                stage.symbols = size if symbolizer is None else \
+                    sum(freq.values())
+                stage.bytes_out = total
+        finally:
+            if source is not None:
+                source.close()
+    if index is not None:
+        index.bind(header, total)
+        write_index(index, out_file + INDEX_SUFFIX)
+    else:
+        # an index left by an earlier compress would describe other data
+        remove_index(out_file + INDEX_SUFFIX)
+
+
+def compress_pipeline(in_file, out_file, pipeline, chunk_size=CHUNK_SIZE,
+                      metrics=None, **kwargs):
+    """ Run contents of in_file through pipeline, compress the result and
+    store it in out_file in MODE_PIPELINE, or in MODE_STORED if that is
+    no smaller than storing in_file as it is.
+
+    The pipeline's output goes through a temporary file, so memory use
+    only grows with the pipeline's block size. The "transform" stage is
+    measured into metrics, if given, as well as those of compress.
+    Other keyword arguments are passed on to compress.
+
+    @param str in_file: input file to compress
+    @param str out_file: output file to store compressed result
+    @param transforms.Pipeline pipeline: what to run in_file through
+    @param int chunk_size: number of bytes to read at a time
+    @param metrics.Metrics|NoneType metrics: where to record measurements
+    @rtype: NoneType
+    """
+    if metrics is None:
+        metrics = NO_METRICS
+    size = os.path.getsize(in_file)
+    header = pipeline_header_bytes(pipeline, size)
+    with tempfile.TemporaryDirectory() as tmp:
+        blocks = os.path.join(tmp, "blocks")
+        coded = os.path.join(tmp, "blocks.huf")
+        with metrics.stage("transform") as stage, \
+                open(in_file, "rb") as f1, open(blocks, "wb") as f2:
+            for block in pipeline.forward(read_chunks(f1, chunk_size)):
+                f2.write(block)
+            stage.bytes_in = size
+            stage.bytes_out = f2.tell()
+        compress(blocks, coded, chunk_size, metrics=metrics, **kwargs)
+        stored = (len(header) + os.path.getsize(coded) >=
+                  len(stored_header_bytes(size)) + size)
+        with open(coded if not stored else in_file, "rb") as f1, \
+                open(out_file, "wb") as f2:
+            f2.write(header if not stored else stored_header_bytes(size))
+            copy_chunks(read_chunks(f1, chunk_size), f2)
+
+
+def compress_adaptive(in_file, out_file, chunk_size=CHUNK_SIZE):
+    """ Compress contents of in_file in MODE_ADAPTIVE and store results in
+    out_file.
+
+    in_file is read only once and output is written as soon as each chunk
+    is coded, so in_file may be a pipe.
+
+    @param str in_file: input file to compress
+    @param str out_file: output file to store compressed result
+    @param int chunk_size: number of bytes to read at a time
+    @rtype: NoneType
+    """
+    encoder = AdaptiveEncoder(chunk_size)
+    with open(in_file, "rb") as f1, open(out_file, "wb") as f2:
+        f2.write(MAGIC + bytes([FORMAT_VERSION, MODE_ADAPTIVE]))
+        for chunk in read_chunks(f1, chunk_size):
+            f2.write(encoder.encode(chunk))
+        f2.write(encoder.finish())
+
+
+def pair_symbols(text, prev):
+    """ Return an iterator over prev_byte * 256 + byte for the bytes of
+    text, where the byte before the first one is prev.
+
+    @param bytes text: a bytes object
+    @param int prev: the byte before text
+    @rtype: iterator[int]
+
+    >>> list(pair_symbols(bytes([1, 2]), 3))
+    [769, 258]
+    """
+    return map(or_, map(lshift, chain([prev], text[:-1]), repeat(8)), text)
+
+
+def make_pair_dict(text, prev=0):
+    """ Return a dictionary that maps prev_byte * 256 + byte for the bytes
+    of text to its frequency, where the byte before the first one is prev.
+
+    @param bytes text: a bytes object
+    @param int prev: the byte before text
+    @rtype: dict(int,int)
+
+    >>> make_pair_dict(b"aab", 97) == {97 * 256 + 97: 2, 97 * 256 + 98: 1}
+    True
+    """
+    if USE_NUMPY and isinstance(text, (bytes, bytearray, memoryview)):
+        return numpy_backend.pair_counts(text, prev)
+    counts = Counter(pair_symbols(text, prev))
+    return {symbol: counts[symbol] for symbol in sorted(counts)}
+
+
+def context_lengths(pair_freq):
+    """ Return the code lengths for MODE_CONTEXT: a list that maps each
+    previous byte to a table number, and the code lengths of each table.
+
+    Every previous byte gets a table of its own unless that table (with
+    its cost in the header) would take more bits than coding the bytes
+    that follow it with an order-0 table. Those sparse contexts share
+    table 0, built from their combined frequencies.
+
+    @param dict(int,int) pair_freq: frequencies as made by make_pair_dict
+    @rtype: tuple(list[int],list[dict(int,int)])
+
+    >>> context_map, tables = context_lengths(make_pair_dict(b"abc" * 100))
+    >>> context_map[97], context_map[98], context_map[99]
+    (1, 0, 2)
+    >>> tables == [{97: 1, 99: 1}, {98: 1}, {97: 1}]
+    True
+    """
+    contexts = [{} for _ in range(256)]
+    total = {}
+    # in order of pair, so the tables do not depend on how the input
+    # was read
+    for pair in sorted(pair_freq):
+        count = pair_freq[pair]
+        contexts[pair >> 8][pair & 255] = count
+        total[pair & 255] = total.get(pair & 255, 0) + count
+    order0 = code_lengths(total)
+    own = {}
+    shared = {}
+    for context, freq in enumerate(contexts):
+        if not freq:
+            continue
+        lengths = code_lengths(freq)
+        own_bits = (sum([freq[s] * lengths[s] for s in freq]) +
+                    8 * len(lengths_to_bytes(lengths)))
+        if own_bits < sum([freq[s] * order0[s] for s in freq]):
+            own[context] = lengths
+        else:
+            for s in freq:
+                shared[s] = shared.get(s, 0) + freq[s]
+    tables = [code_lengths(shared)] if shared else []
+    context_map = [0] * 256
+    for context in sorted(own):
+        context_map[context] = len(tables)
+        tables.append(own[context])
+    return context_map, tables
+
+
+def pair_table(context_map, tables):
+    """ Return a list that maps prev_byte * 256 + byte to the code of byte
+    in the table of prev_byte, as a (value, length) pair, for write_codes.
+
+    @param list[int] context_map: table number of each previous byte
+    @param list[dict(int,int)] tables: code lengths of each table
+    @rtype: list[tuple(int,int)|NoneType]
+    """
+    codes = [codes_to_table(canonical_codes(lengths)) for lengths in tables]
+    result = [None] * (1 << 16)
+    for context, number in enumerate(context_map):
+        if number < len(codes):
+            table = codes[number]
+            result[context << 8:(context << 8) + len(table)] = table
+    return result
+
+
+def context_header_bytes(context_map, tables, size):
+    """ Return the header of a MODE_CONTEXT compressed file: the size, the
+    number of tables (2 bytes), the table number of each previous byte
+    (256 bytes) and the code lengths of each table (see lengths_to_bytes).
+
+    @param list[int] context_map: table number of each previous byte
+    @param list[dict(int,int)] tables: code lengths of each table
+    @param int size: number of symbols that will follow
+    @rtype: bytes
+    """
+    return (MAGIC + bytes([FORMAT_VERSION, MODE_CONTEXT]) +
+            size_to_bytes(size, SIZE_BYTES) +
+            size_to_bytes(len(tables), 2) + bytes(context_map) +
+            b"".join([lengths_to_bytes(lengths) for lengths in tables]))
+
+
+def compress_context(in_file, out_file, chunk_size=CHUNK_SIZE):
+    """ Compress contents of in_file in MODE_CONTEXT, coding each byte with
+    the table for the byte before it, and store results in out_file.
+
+    @param str in_file: input file to compress
+    @param str out_file: output file to store compressed result
+    @param int chunk_size: number of bytes to read at a time
+    @rtype: NoneType
+    """
+    with open(in_file, "rb") as f1:
+        pair_freq = {}
+        size = 0
+        prev = 0
+        for chunk in read_chunks(f1, chunk_size):
+            for pair, count in make_pair_dict(chunk, prev).items():
+                pair_freq[pair] = pair_freq.get(pair, 0) + count
+            size += len(chunk)
+            prev = chunk[-1]
+        context_map, tables = context_lengths(pair_freq)
+        table = pair_table(context_map, tables)
+        f1.seek(0)
+        with open(out_file, "wb") as f2:
+            f2.write(context_header_bytes(context_map, tables, size))
+            writer = BitWriter(chunk_size)
+            prev = 0
+            for chunk in read_chunks(f1, chunk_size):
+                write_codes(writer, chunk, table, prev)
+                prev = chunk[-1]
+                f2.write(writer.drain())
+            f2.write(writer.getvalue())
 
 
 # ====================
 # Functions for decompression
+
+# width in bits of the window generate_uncompressed looks up at a time
+DECODE_BITS = 12
+# lookup window width for ContextDecoder, which builds up to 256 tables
+CONTEXT_DECODE_BITS = 8
+
 HuffmanNode(None, HuffmanNode(101, None, None), HuffmanNode(None, HuffmanNode(115, None, None), HuffmanNode(110, None, None)))
 
 def generate_tree_general(node_lst, root_index):
@@ -411,50 +1314,331 @@ HuffmanNode(None, HuffmanNode(10, None, None), HuffmanNode(12, None, None)))
     return g    
 
 
-def generate_uncompressed(tree, text, size):
+def build_decode_table(codes, bits=DECODE_BITS, next_tables=None,
+                       expand=None):
+    """ Return a lookup table for decoding the next bits-bit window of
+    input against codes.
+
+    Entry i of the table describes window value i (most significant bit
+    first) as a tuple (symbols, used, sub): symbols are the bytes of every
+    code that completes inside the window, used is how many bits of the
+    window those codes take up, and sub is a table for the next window
+    when a code is longer than the window (else None). An entry with no
+    symbols, used == 0 and no sub-table marks bits that no code can match.
+
+    With next_tables, for decoders that switch tables after every symbol,
+    each entry holds at most one symbol, and in place of None its last
+    item is next_tables[symbol], the table to decode the next symbol with.
+
+    With expand, symbols need not be bytes: each stands for the bytes
+    expand(symbol), and each entry holds at most one symbol. Tables with
+    many long codes are also far quicker to build that way.
+
+    @param dict(int,str) codes: mapping from symbols to codes
+    @param int bits: window width in bits (e.g. 8, 12 or 16)
+    @param list[list]|NoneType next_tables: table to use after each symbol
+    @param callable|NoneType expand: bytes of each symbol
+    @rtype: list[tuple(bytes,int,list|NoneType)]
+
+    >>> table = build_decode_table({0: "0", 1: "10", 2: "11"}, 4)
+    >>> table[0b1011]
+    (b'\\x01\\x02', 4, None)
+    >>> table[0b1001]
+    (b'\\x01\\x00', 3, None)
+    >>> build_decode_table({256: "0", 97: "1"}, 4,
+    ...                    expand={256: b"the", 97: b"a"}.get)[0b0111]
+    (b'the', 1, None)
+    """
+    if next_tables is not None or expand is not None:
+        return _build_single_table([(int(code, 2), len(code), symbol)
+                                    for symbol, code in codes.items()],
+                                   bits, next_tables, expand)
+    lookup = {(len(code), int(code, 2)): symbol
+              for symbol, code in codes.items()}
+    max_len = max(len(code) for code in codes.values())
+    return _build_table(lookup, max_len, 0, 0, bits)
+
+
+def _build_single_table(items, bits, next_tables, expand=None):
+    """ Return the decode table, with one symbol per entry, for the
+    (code, length, symbol) triples in items.
+    """
+    table = [(b"", 0, None)] * (1 << bits)
+    longer = {}
+    for code, length, symbol in items:
+        if length <= bits:
+            # every window that starts with code
+            shift = bits - length
+            table[code << shift:(code + 1) << shift] = \
+                [(bytes([symbol]) if expand is None else expand(symbol),
+                  length,
+                  None if next_tables is None else next_tables[symbol])] * \
+                (1 << shift)
+        else:
+            rest = length - bits
+            longer.setdefault(code >> rest, []).append(
+                (code & ((1 << rest) - 1), rest, symbol))
+    for window, items in longer.items():
+        table[window] = (b"", bits,
+                         _build_single_table(items, bits, next_tables,
+                                             expand))
+    return table
+
+
+def _build_table(lookup, max_len, prefix, prefix_len, bits):
+    """ Return the decode table for windows that follow the partial code
+    prefix (of prefix_len bits) already read.
+    """
+    table = []
+    for window in range(1 << bits):
+        symbols = bytearray()
+        used = 0
+        code, code_len = prefix, prefix_len
+        for i in range(bits):
+            code = (code << 1) | ((window >> (bits - 1 - i)) & 1)
+            code_len += 1
+            if (code_len, code) in lookup:
+                symbols.append(lookup[(code_len, code)])
+                used = i + 1
+                code, code_len = 0, 0
+            elif code_len >= max_len:
+                # no code starts with these bits
+                code_len = -1
+                break
+        if symbols:
+            table.append((bytes(symbols), used, None))
+        elif code_len == -1:
+            table.append((b"", 0, None))
+        else:
+            table.append((b"", bits, _build_table(lookup, max_len,
+                                                  code, code_len, bits)))
+    return table
+
+
+class TableDecoder:
+    """ Decodes compressed data with build_decode_table, one piece of
+    input at a time.
+
+    Attributes:
+    ===========
+    @param int remaining: number of symbols still to be decoded
+    """
+
+    def __init__(self, codes, size, bits=DECODE_BITS, offset=0, table=None):
+        """ Create a new TableDecoder for size symbols coded with codes,
+        starting offset bits into the input.
+
+        A table already built for codes can be passed in to share it
+        between decoders; codes is then not used.
+
+        @param TableDecoder self: this TableDecoder
+        @param dict(int,str)|NoneType codes: mapping from symbols to codes
+        @param int size: number of symbols to decode
+        @param int bits: width of the lookup window, see build_decode_table
+        @param int offset: number of leading input bits to skip
+        @param list|NoneType table: build_decode_table(codes, bits)
+        @rtype: NoneType
+        """
+        self.remaining = size
+        self._offset = offset
+        self._bits = bits
+        if table is None:
+            table = build_decode_table(codes, bits) if size else []
+        self._root = table
+        self._table = self._root
+        self._reader = BitReader(b"")
+
+    def decode(self, data, final=False):
+        """ Return the symbols that can be decoded once data is appended to
+        the input so far. Bits of an unfinished code are kept until the
+        next call; pass final=True with the last piece of input.
+
+        @param TableDecoder self: this TableDecoder
+        @param bytes|memoryview data: next piece of compressed input
+        @param bool final: whether data ends the compressed input
+        @rtype: bytes
+
+        >>> d = TableDecoder({0: "0", 1: "10", 2: "11"}, 5, 4)
+        >>> list(d.decode(bytes([0b10111001])))
+        [1, 2, 1, 0]
+        >>> list(d.decode(bytes([0b10000000]), final=True))
+        [2]
+        """
+        reader = self._reader
+        reader.feed(data)
+        if self._offset and reader.bits_left >= self._offset:
+            reader.read(self._offset)
+            self._offset = 0
+        peek, skip = reader.peek, reader.skip
+        bits, root, table = self._bits, self._root, self._table
+        remaining = self.remaining
+        out = bytearray()
+        # each lookup uses at most bits bits, so this many are safe to do
+        # without running past the input
+        safe = reader.bits_left // bits
+        while remaining > 0 and safe > 0:
+            for _ in range(safe):
+                symbols, used, sub = table[peek(bits)]
+                if not used:
+                    remaining = 0
+                    break
+                out += symbols
+                remaining -= len(symbols)
+                skip(used)
+                table = root if sub is None else sub
+                if remaining <= 0:
+                    break
+            safe = reader.bits_left // bits
+        if final:
+            # past the end of the input the reader pads with zeros
+            while remaining > 0 and reader.bits_left > 0:
+                symbols, used, sub = table[peek(bits)]
+                if not used:
+                    break
+                out += symbols
+                remaining -= len(symbols)
+                skip(used)
+                table = root if sub is None else sub
+        if remaining < 0:
+            # the last lookup decoded past the end
+            del out[remaining:]
+            remaining = 0
+        self._table, self.remaining = table, remaining
+        return bytes(out)
+
+
+class StoredDecoder:
+    """ Passes MODE_STORED data through, one piece of input at a time.
+
+    Attributes:
+    ===========
+    @param int remaining: number of bytes still to be copied
+    """
+
+    def __init__(self, size):
+        """ Create a new StoredDecoder for size bytes.
+
+        @param StoredDecoder self: this StoredDecoder
+        @param int size: number of bytes to copy
+        @rtype: NoneType
+        """
+        self.remaining = size
+
+    def decode(self, data, final=False):
+        """ Return data, up to the number of bytes remaining.
+
+        @param StoredDecoder self: this StoredDecoder
+        @param bytes|memoryview data: next piece of input
+        @param bool final: whether data ends the input
+        @rtype: bytes
+
+        >>> d = StoredDecoder(3)
+        >>> d.decode(b"ab") + d.decode(b"cd", final=True)
+        b'abc'
+        """
+        out = bytes(data[:self.remaining])
+        self.remaining -= len(out)
+        return out
+
+
+class ContextDecoder:
+    """ Decodes MODE_CONTEXT data, one piece of input at a time.
+
+    Every entry of the decode tables for a completed symbol leads straight
+    to the table for the context that symbol starts, so switching tables
+    costs nothing beyond the lookup itself.
+
+    Attributes:
+    ===========
+    @param int remaining: number of symbols still to be decoded
+    """
+
+    def __init__(self, context_map, codes_list, size,
+                 bits=CONTEXT_DECODE_BITS):
+        """ Create a new ContextDecoder for size symbols.
+
+        @param ContextDecoder self: this ContextDecoder
+        @param list[int] context_map: table number of each previous byte
+        @param list[dict(int,str)] codes_list: codes of each table
+        @param int size: number of symbols to decode
+        @param int bits: width of the lookup window, see build_decode_table
+        @rtype: NoneType
+        """
+        self.remaining = size
+        self._bits = bits
+        # the tables refer to each other, so fill them in once all exist
+        tables = [[] for _ in codes_list] if size else []
+        by_context = [tables[n] if n < len(tables) else None
+                      for n in context_map]
+        for table, codes in zip(tables, codes_list):
+            table[:] = build_decode_table(codes, bits, by_context)
+        self._table = by_context[0]
+        self._reader = BitReader(b"")
+
+    def decode(self, data, final=False):
+        """ Return the symbols that can be decoded once data is appended to
+        the input so far. Bits of an unfinished code are kept until the
+        next call; pass final=True with the last piece of input.
+
+        @param ContextDecoder self: this ContextDecoder
+        @param bytes|memoryview data: next piece of compressed input
+        @param bool final: whether data ends the compressed input
+        @rtype: bytes
+
+        >>> codes = [{97: "0", 98: "1"}, {97: "1", 98: "0"}]
+        >>> d = ContextDecoder([0] * 98 + [1] * 158, codes, 4)
+        >>> d.decode(bytes([0b01000000]), final=True)
+        b'abbb'
+        """
+        reader = self._reader
+        reader.feed(data)
+        peek, skip = reader.peek, reader.skip
+        bits, table = self._bits, self._table
+        remaining = self.remaining
+        out = bytearray()
+        safe = reader.bits_left // bits
+        while remaining > 0 and safe > 0:
+            for _ in range(safe):
+                symbols, used, table = table[peek(bits)]
+                if not used:
+                    remaining = 0
+                    break
+                skip(used)
+                out += symbols
+                remaining -= len(symbols)
+                if not remaining:
+                    break
+            safe = reader.bits_left // bits
+        if final:
+            while remaining > 0 and reader.bits_left > 0:
+                symbols, used, table = table[peek(bits)]
+                if not used:
+                    break
+                skip(used)
+                out += symbols
+                remaining -= len(symbols)
+        self._table, self.remaining = table, remaining
+        return bytes(out)
+
+
+def generate_uncompressed(tree, text, size, bits=DECODE_BITS):
     """ Use Huffman tree to decompress size bytes from text.
 
     @param HuffmanNode tree: a HuffmanNode tree rooted at 'tree'
     @param bytes text: text to decompress
     @param int size: number of bytes to decompress from text.
+    @param int bits: width of the lookup window, see build_decode_table
     @rtype: bytes
+
+    >>> tree = HuffmanNode(None, HuffmanNode(3), HuffmanNode(2))
+    >>> list(generate_uncompressed(tree, bytes([0b01100000]), 4))
+    [3, 2, 2, 3]
     """
-    dict_StC = get_codes(tree) #dictionary maps symbols to codes
-    dict_CtS = {} #dictionary maps codes to symbols
-    for symb in dict_StC:
-        dict_CtS[dict_StC[symb]] = symb
-        
-    text_bits = ""
-    for byt in text:
-        text_bits += byte_to_bits(byt)
-
-    uncompress_lst = []
-    current_bit = ""
-    for bit in text_bits:
-        current_bit += bit
-        if current_bit in dict_CtS and len(uncompress_lst) < size:
-            uncompress_lst.append(dict_CtS[current_bit])
-            current_bit = ""
-##        if len(uncompress_lst) == size:
-##            break
-        
-## DOES NOT WORK \/
-##    text_bits = ""
-##    for byt in text:
-##        text_bits += [byte_to_bits(byt)]
-##
-##    uncompress_lst = []
-##    current_bit = ""
-##    i = 0
-##    while len(uncompress_lst) != size:
-##        current_bit += bit[i]
-##        i += 0
-##        if current_bit in dict_CtS:
-##            uncompress_lst.append(dict_CtS[current_bit])
-##            current_bit = ""
-    return bytes(uncompress_lst)
-            
-        
+    if size == 0:
+        return bytes([])
+    return TableDecoder(get_codes(tree), size, bits).decode(text, final=True)
+
+
 def bytes_to_nodes(buf):
     """ Return a list of ReadNodes corresponding to the bytes in buf.
 
@@ -476,7 +1660,7 @@ def bytes_to_nodes(buf):
 
 def bytes_to_size(buf):
     """ Return the size corresponding to the
-    given 4-byte little-endian representation.
+    given little-endian representation, as written by size_to_bytes.
 
     @param bytes buf: a bytes object
     @rtype: int
@@ -487,23 +1671,476 @@ def bytes_to_size(buf):
     return int.from_bytes(buf, "little")
 
 
-def uncompress(in_file, out_file):
+def read_lengths(f, symbol_bytes=1):
+    """ Read code lengths written by lengths_to_bytes from file f.
+
+    @param file f: a file opened for reading in binary mode
+    @param int symbol_bytes: bytes per symbol they were written with
+    @rtype: dict(int,int)
+
+    >>> read_lengths(BytesIO(bytes([2, 1, 0, 2, 0, 65, 66, 67]))) == \
+    {65: 1, 66: 2, 67: 2}
+    True
+    >>> read_lengths(BytesIO(lengths_to_bytes({300: 1, 65: 1}, 3)), 3)
+    {65: 1, 300: 1}
+    """
+    max_len = f.read(1)[0]
+    if symbol_bytes > 1:
+        counts = f.read(symbol_bytes * max_len)
+        lengths = {}
+        for n in range(1, max_len + 1):
+            start = symbol_bytes * (n - 1)
+            count = bytes_to_size(counts[start:start + symbol_bytes])
+            buf = f.read(symbol_bytes * count)
+            for i in range(0, len(buf), symbol_bytes):
+                lengths[bytes_to_size(buf[i:i + symbol_bytes])] = n
+        return lengths
+    counts = f.read(2 * max_len)
+    lengths = {}
+    for n in range(1, max_len + 1):
+        for symbol in f.read(bytes_to_size(counts[2 * n - 2:2 * n])):
+            lengths[symbol] = n
+    return lengths
+
+
+def read_header(f):
+    """ Read the header at the start of compressed file f and return the
+    codes and the uncompressed size, leaving f at the first byte of
+    compressed data. Files in the original tree format are also accepted.
+
+    @param file f: a compressed file opened for reading in binary mode
+    @rtype: tuple(dict(int,str),int)
+    """
+    head = f.read(len(MAGIC))
+    if head != MAGIC:
+        return read_tree_header(head, f)
+    return read_static_header(read_mode(f), f)
+
+
+def read_mode(f):
+    """ Read the version and mode bytes that follow MAGIC in compressed
+    file f and return the mode.
+
+    @param file f: a compressed file opened for reading in binary mode
+    @rtype: int
+    """
+    version, mode = f.read(2)
+    if version > FORMAT_VERSION:
+        raise ValueError("unsupported format version {}".format(version))
+    return mode
+
+
+def read_static_header(mode, f):
+    """ Read the rest of a MODE_STATIC header and return the codes and the
+    uncompressed size.
+
+    @param int mode: mode byte of the header
+    @param file f: a compressed file opened for reading in binary mode
+    @rtype: tuple(dict(int,str),int)
+    """
+    lengths, size = read_static_lengths(mode, f)
+    return canonical_codes(lengths), size
+
+
+def read_static_lengths(mode, f):
+    """ Read the rest of a MODE_STATIC header and return the code lengths
+    and the uncompressed size.
+
+    @param int mode: mode byte of the header
+    @param file f: a compressed file opened for reading in binary mode
+    @rtype: tuple(dict(int,int),int)
+    """
+    if mode in (MODE_ADAPTIVE, MODE_CONTEXT, MODE_DICTIONARY, MODE_STORED,
+                MODE_SYMBOLS, MODE_PIPELINE):
+        raise ValueError("mode {} files have no single code table"
+                         .format(mode))
+    if mode != MODE_STATIC:
+        raise ValueError("unknown compression mode {}".format(mode))
+    size = bytes_to_size(f.read(SIZE_BYTES))
+    return read_lengths(f), size
+
+
+def read_context_header(f):
+    """ Read the rest of a MODE_CONTEXT header and return the table number
+    of each previous byte, the codes of each table and the uncompressed
+    size.
+
+    @param file f: a compressed file opened for reading in binary mode
+    @rtype: tuple(list[int],list[dict(int,str)],int)
+    """
+    size = bytes_to_size(f.read(SIZE_BYTES))
+    count = bytes_to_size(f.read(2))
+    context_map = list(f.read(256))
+    codes_list = [canonical_codes(read_lengths(f)) for _ in range(count)]
+    return context_map, codes_list, size
+
+
+def read_symbols_header(f):
+    """ Read the rest of a MODE_SYMBOLS header and return the symbolizer,
+    the code lengths and the uncompressed size.
+
+    @param file f: a compressed file opened for reading in binary mode
+    @rtype: tuple(symbolizer.ByteSymbols,dict(int,int),int)
+    """
+    size = bytes_to_size(f.read(SIZE_BYTES))
+    symbolizer_id = f.read(1)[0]
+    if symbolizer_id not in SYMBOLIZERS:
+        raise ValueError("unknown symbolizer {}".format(symbolizer_id))
+    state = f.read(bytes_to_size(f.read(4)))
+    symbolizer = SYMBOLIZERS[symbolizer_id].from_bytes(state)
+    return symbolizer, read_lengths(f, SYMBOL_BYTES), size
+
+
+def read_decoder(f, dictionary=None, cache=None):
+    """ Read the header at the start of compressed file f and return a
+    decoder for the compressed data after it, in whichever mode f was
+    written. MODE_DICTIONARY files need the dictionary they were
+    compressed with. MODE_STATIC decode tables are looked up in cache
+    if one is given.
+
+    @param file f: a compressed file opened for reading in binary mode
+    @param dictionary.Dictionary|NoneType dictionary: dictionary to use
+    @param codecache.CodeCache|NoneType cache: where to look up tables
+    @rtype: TableDecoder|AdaptiveDecoder|ContextDecoder|StoredDecoder|
+        PipelineDecoder
+    """
+    head = f.read(len(MAGIC))
+    if head != MAGIC:
+        return TableDecoder(*read_tree_header(head, f))
+    mode = read_mode(f)
+    if mode == MODE_ADAPTIVE:
+        return AdaptiveDecoder()
+    if mode == MODE_STORED:
+        return StoredDecoder(bytes_to_size(f.read(SIZE_BYTES)))
+    if mode == MODE_CONTEXT:
+        return ContextDecoder(*read_context_header(f))
+    if mode == MODE_PIPELINE:
+        size = bytes_to_size(f.read(SIZE_BYTES))
+        pipeline = Pipeline.read(f)
+        return PipelineDecoder(pipeline, read_decoder(f, dictionary, cache),
+                               size)
+    if mode == MODE_SYMBOLS:
+        symbolizer, lengths, size = read_symbols_header(f)
+        table = []
+        if size:
+            table = build_decode_table(canonical_codes(lengths),
+                                       expand=symbolizer.expand)
+        return TableDecoder(None, size, table=table)
+    if mode == MODE_DICTIONARY:
+        size = bytes_to_size(f.read(SIZE_BYTES))
+        dictionary_id = bytes_to_size(f.read(DICTIONARY_ID_BYTES))
+        if dictionary is None or dictionary.id != dictionary_id:
+            raise ValueError("compressed with dictionary {:08x}"
+                             .format(dictionary_id))
+        return dictionary.decoder(size)
+    if cache is not None:
+        lengths, size = read_static_lengths(mode, f)
+        return cache.for_lengths(lengths).decoder(size)
+    return TableDecoder(*read_static_header(mode, f))
+
+
+def read_tree_header(head, f):
+    """ Read the rest of a header in the original format, which stores the
+    node count, the tree nodes in postorder and a 4-byte size, and return
+    the codes and the size. head is what has already been read of it.
+
+    @param bytes head: first bytes of the header
+    @param file f: a compressed file opened for reading in binary mode
+    @rtype: tuple(dict(int,str),int)
+    """
+    num_nodes = head[0]
+    buf = head[1:] + f.read(num_nodes * 4 + 1 - len(head))
+    node_lst = bytes_to_nodes(buf)
+    tree = HuffmanTree.from_read_nodes(node_lst, num_nodes - 1)
+    size = bytes_to_size(f.read(4))
+    return tree.codes(), size
+
+
+def uncompress_bytes(buf, dictionary=None, cache=None):
+    """ Return the uncompressed form of buf, which holds the contents of
+    a file written by compress.
+
+    @param bytes buf: compressed bytes
+    @param dictionary.Dictionary|NoneType dictionary: for MODE_DICTIONARY
+    @param codecache.CodeCache|NoneType cache: where to look up tables
+    @rtype: bytes
+
+    >>> uncompress_bytes(compress_bytes(b"abracadabra"))
+    b'abracadabra'
+    """
+    f = BytesIO(buf)
+    return read_decoder(f, dictionary, cache).decode(f.read(), final=True)
+
+
+class ViewReader:
+    """ Reads a bytes-like object like a binary file, without copying it
+    first as BytesIO does.
+    """
+
+    def __init__(self, data):
+        """ Create a new ViewReader at the start of data.
+
+        @param ViewReader self: this ViewReader
+        @param bytes|bytearray|memoryview data: bytes to read
+        @rtype: NoneType
+        """
+        self._view = memoryview(data).cast("B")
+        self._pos = 0
+
+    def read(self, n=-1):
+        """ Return the next n bytes, or all the rest if n is negative.
+
+        @param ViewReader self: this ViewReader
+        @param int n: number of bytes
+        @rtype: bytes
+
+        >>> f = ViewReader(b"abcd")
+        >>> f.read(1), f.read(), f.read(1)
+        (b'a', b'bcd', b'')
+        """
+        end = len(self._view) if n < 0 else self._pos + n
+        result = bytes(self._view[self._pos:end])
+        self._pos += len(result)
+        return result
+
+    def tell(self):
+        """ Return the number of bytes read so far.
+
+        @param ViewReader self: this ViewReader
+        @rtype: int
+        """
+        return self._pos
+
+    def rest(self):
+        """ Return a view of the bytes not read yet.
+
+        @param ViewReader self: this ViewReader
+        @rtype: memoryview
+        """
+        return self._view[self._pos:]
+
+
+def uncompressed_size(src, dictionary=None):
+    """ Return the number of bytes src, a compressed buffer, uncompresses
+    to, or None for MODE_ADAPTIVE, which does not store it.
+
+    @param bytes|bytearray|memoryview src: compressed bytes
+    @param dictionary.Dictionary|NoneType dictionary: for MODE_DICTIONARY
+    @rtype: int|NoneType
+
+    >>> uncompressed_size(compress_bytes(b"abracadabra"))
+    11
+    """
+    return read_decoder(ViewReader(src), dictionary).remaining
+
+
+def decompress_into(src, dst, dictionary=None, cache=None):
+    """ Uncompress src, which holds the contents of a file written by
+    compress, into the start of writable buffer dst and return the number
+    of bytes written. src is decoded in place, without being copied; dst
+    needs uncompressed_size(src) bytes.
+
+    @param bytes|bytearray|memoryview src: compressed bytes
+    @param bytearray|memoryview|mmap.mmap dst: where to write the result
+    @param dictionary.Dictionary|NoneType dictionary: for MODE_DICTIONARY
+    @param codecache.CodeCache|NoneType cache: where to look up tables
+    @rtype: int
+
+    >>> buf = bytearray(16)
+    >>> n = decompress_into(compress_bytes(b"abracadabra"), buf)
+    >>> bytes(buf[:n])
+    b'abracadabra'
+    """
+    f = ViewReader(src)
+    decoder = read_decoder(f, dictionary, cache)
+    out = memoryview(dst).cast("B")
+    size = decoder.remaining
+    if size is not None and len(out) < size:
+        raise ValueError("{} bytes needed, buffer has {}"
+                         .format(size, len(out)))
+    if isinstance(decoder, StoredDecoder):
+        out[:size] = f.rest()[:size]
+        return size
+    result = decoder.decode(f.rest(), final=True)
+    if len(out) < len(result):
+        raise ValueError("{} bytes needed, buffer has {}"
+                         .format(len(result), len(out)))
+    out[:len(result)] = result
+    return len(result)
+
+
+def iter_decode(chunks, decoder):
+    """ Yield what decoder decodes from each of chunks, as soon as it is
+    decoded, skipping pieces that decode to nothing.
+
+    @param iterable[bytes] chunks: pieces of the compressed data
+    @param TableDecoder|AdaptiveDecoder|ContextDecoder|StoredDecoder decoder:
+        decoder from read_decoder
+    @rtype: generator[bytes]
+    """
+    for chunk in chunks:
+        data = decoder.decode(chunk)
+        if data:
+            yield data
+    data = decoder.decode(b"", final=True)
+    if data:
+        yield data
+
+
+def decode_chunks(chunks, decoder, out):
+    """ Decode chunks with decoder and write the result to out as it is
+    produced.
+
+    @param iterable[bytes] chunks: pieces of the compressed data
+    @param TableDecoder|AdaptiveDecoder|ContextDecoder|StoredDecoder decoder:
+        decoder from read_decoder
+    @param file|mmap.mmap out: where to write the decoded bytes
+    @rtype: NoneType
+    """
+    for data in iter_decode(chunks, decoder):
+        out.write(data)
+
+
+def iter_decompress(source, chunk_size=ITER_CHUNK_SIZE, dictionary=None,
+                    cache=None):
+    """ Yield the uncompressed contents of source, a compressed file or
+    the name of one, a piece at a time, as soon as each is decoded.
+
+    source is read chunk_size bytes at a time, and each piece is what
+    those bytes decode to, so memory use and the wait for the first
+    piece do not grow with the size of source. Stopping early, e.g. by
+    breaking out of a for loop, decodes no more of it; a file named by
+    source is closed then, but a file object is left open, just past
+    what has been read.
+
+    @param str|file source: file name, or file opened for reading in
+        binary mode at the start of the compressed data
+    @param int chunk_size: number of bytes to read at a time
+    @param dictionary.Dictionary|NoneType dictionary: for MODE_DICTIONARY
+    @param codecache.CodeCache|NoneType cache: where to look up tables
+    @rtype: generator[bytes]
+
+    >>> f = BytesIO(compress_bytes(b"abracadabra" * 100))
+    >>> pieces = iter_decompress(f, 16)
+    >>> next(pieces)[:11]
+    b'abracadabra'
+    >>> len(b"".join(iter_decompress(BytesIO(f.getvalue()), 16)))
+    1100
+    """
+    f = source if hasattr(source, "read") else open(source, "rb")
+    try:
+        decoder = read_decoder(f, dictionary, cache)
+        yield from iter_decode(read_chunks(f, chunk_size), decoder)
+    finally:
+        if f is not source:
+            f.close()
+
+
+def uncompress(in_file, out_file, chunk_size=CHUNK_SIZE, use_mmap=False,
+               dictionary=None, cache=None, metrics=None):
     """ Uncompress contents of in_file and store results in out_file.
 
+    The compressed data is read and decoded chunk_size bytes at a time, so
+    memory use does not grow with the size of in_file.
+
+    With use_mmap, in_file is memory-mapped and decoded through memoryviews,
+    and out_file is created at the size stored in the header and filled in
+    through a memory map. MODE_ADAPTIVE files store no size, so their
+    output is written as usual.
+
+    The "header" and "decode" stages are measured into metrics, if given.
+
     @param str in_file: input file to uncompress
     @param str out_file: output file that will hold the uncompressed results
+    @param int chunk_size: number of bytes to read at a time
+    @param bool use_mmap: whether to go through memory maps
+    @param dictionary.Dictionary|NoneType dictionary: for MODE_DICTIONARY
+    @param codecache.CodeCache|NoneType cache: where to look up tables
+    @param metrics.Metrics|NoneType metrics: where to record measurements
     @rtype: NoneType
     """
+    if metrics is None:
+        metrics = NO_METRICS
     with open(in_file, "rb") as f:
-        num_nodes = f.read(1)[0]
-        buf = f.read(num_nodes * 4)
-        node_lst = bytes_to_nodes(buf)
-        # use generate_tree_general or generate_tree_postorder here
-        tree = generate_tree_general(node_lst, num_nodes - 1)
-        size = bytes_to_size(f.read(4))
-        with open(out_file, "wb") as g:
-            text = f.read()
-            g.write(generate_uncompressed(tree, text, size))
+        source = map_input(f) if use_mmap else None
+        if source is None:
+            with metrics.stage("header") as stage:
+                decoder = read_decoder(f, dictionary, cache)
+                stage.header_size = start = f.tell()
+                stage.symbols = decoder.remaining
+            with metrics.stage("decode") as stage, open(out_file, "wb") as g:
+                decode_chunks(read_chunks(f, chunk_size), decoder, g)
+                stage.bytes_in = f.tell() - start
+                stage.bytes_out = stage.symbols = g.tell()
+            return
+        with source:
+            with metrics.stage("header") as stage:
+                decoder = read_decoder(source, dictionary, cache)
+                stage.header_size = start = source.tell()
+                stage.symbols = size = decoder.remaining
+            chunks = map_chunks(source, chunk_size, start)
+            with metrics.stage("decode") as stage, \
+                    open(out_file, "w+b") as g:
+                if size is None:
+                    decode_chunks(chunks, decoder, g)
+                    size = g.tell()
+                elif size:
+                    g.truncate(size)
+                    with mmap.mmap(g.fileno(), size) as target:
+                        decode_chunks(chunks, decoder, target)
+                stage.bytes_in = len(source) - start
+                stage.bytes_out = stage.symbols = size
+            # the decoder holds a view of source, which must go before
+            # source can be closed
+            del decoder, chunks
+
+
+def read_range(path, start, length, bits=8):
+    """ Return length bytes of the uncompressed contents of path from
+    offset start on (fewer if the contents end first).
+
+    Only the data from the last seek index entry at or before start is
+    read and decoded, if compress wrote an index for path; otherwise, or
+    if the index was written for another version of path, path is
+    decoded from the beginning. MODE_STORED files are read
+    directly. The lookup window is narrower than
+    uncompress's by default, since for a short range building the table
+    takes longer than decoding.
+
+    @param str path: compressed file to read from
+    @param int start: offset of the first byte wanted
+    @param int length: number of bytes wanted
+    @param int bits: width of the lookup window, see build_decode_table
+    @rtype: bytes
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) == MAGIC and read_mode(f) == MODE_STORED:
+            size = bytes_to_size(f.read(SIZE_BYTES))
+            f.seek(start, 1)
+            return f.read(max(0, min(length, size - start)))
+        f.seek(0)
+        codes, size = read_header(f)
+        end = min(size, start + length)
+        if start >= end:
+            return b""
+        data_start = f.tell()
+        f.seek(0)
+        header = f.read(data_start)
+        index = read_index(path + INDEX_SUFFIX)
+        if index is None or not index.describes(
+                header, os.fstat(f.fileno()).st_size, size):
+            index = SeekIndex(CHUNK_SIZE, size, [0])
+        first, offset = index.locate(start)
+        f.seek(data_start + offset // 8)
+        decoder = TableDecoder(codes, end - first, bits, offset % 8)
+        out = bytearray()
+        # an interval rarely takes up more bytes compressed than uncompressed
+        for chunk in read_chunks(f, index.interval):
+            out += decoder.decode(chunk)
+            if not decoder.remaining:
+                break
+        out += decoder.decode(b"", final=True)
+        return bytes(out[start - first:])
 
 
 # ====================
@@ -513,6 +2150,11 @@ def improve_tree(tree, freq_dict):
     """ Improve the tree as much as possible, without changing its shape,
     by swapping nodes. The improvements are with respect to freq_dict.
 
+    The leaves are sorted by depth and the symbols by frequency, and the
+    most frequent symbol goes to the shallowest leaf, and so on, which
+    takes O(n log n) time for n leaves. Symbols missing from freq_dict
+    count as never occurring.
+
     @param HuffmanNode tree: Huffman tree rooted at 'tree'
     @param dict(int,int) freq_dict: frequency dictionary
     @rtype: NoneType
@@ -526,42 +2168,78 @@ def improve_tree(tree, freq_dict):
     >>> avg_length(tree, freq)
     2.31
     """
-    actual = huffman_tree(freq_dict)
-    
-    node_list = postorder_leafnodes(tree)
-    actual_list = postorder_leafnodes(actual)
-    
-    for i in range(len(node_list)):
-        if node_list[i] and actual_list[i] and node_list[i].symbol != actual_list[i].symbol:
-            for node in node_list:
-                if node.symbol == actual_list[i].symbol:
-                    node_list[i].symbol, node.symbol = node.symbol, node_list[i].symbol
-                    
+    leaves = sorted(leaf_depths(tree), key=lambda item: item[1])
+    symbols = sorted([leaf.symbol for leaf, _ in leaves],
+                     key=lambda symbol: -freq_dict.get(symbol, 0))
+    for (leaf, _), symbol in zip(leaves, symbols):
+        leaf.symbol = symbol
+
+
+def leaf_depths(tree):
+    """ Return the leaves of tree from left to right, with their depths.
+
+    @param HuffmanNode tree: a Huffman tree rooted at node 'tree'
+    @rtype: list[tuple(HuffmanNode,int)]
+
+    >>> tree = HuffmanNode(None, HuffmanNode(3), \
+    HuffmanNode(None, HuffmanNode(2), HuffmanNode(9)))
+    >>> [(leaf.symbol, depth) for leaf, depth in leaf_depths(tree)]
+    [(3, 1), (2, 2), (9, 2)]
+    """
+    leaves = []
+    stack = [(tree, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if not node:
+            continue
+        if node.is_leaf():
+            leaves.append((node, depth))
+        else:
+            stack.append((node.right, depth + 1))
+            stack.append((node.left, depth + 1))
+    return leaves
+
+
+def refit_lengths(lengths, freq_dict):
+    """ Return code lengths with the same lengths as lengths, and so the
+    same shape of tree, given to the same symbols but reassigned so that
+    more frequent symbols in freq_dict get shorter codes, as improve_tree
+    does for trees. Symbols missing from freq_dict count as never
+    occurring; symbols missing from lengths are not given a length.
+
+    @param dict(int,int) lengths: mapping from symbols to code lengths
+    @param dict(int,int) freq_dict: frequency dictionary
+    @rtype: dict(int,int)
+
+    >>> refit_lengths({97: 1, 98: 2, 99: 2}, {98: 5, 99: 1})
+    {98: 1, 99: 2, 97: 2}
+    """
+    symbols = sorted(lengths, key=lambda symbol: -freq_dict.get(symbol, 0))
+    return dict(zip(symbols, sorted(lengths.values())))
+
+
 def postorder_leafnodes(tree):
-    if not tree:
-        return []
-    elif tree.is_leaf():
-        return [tree]
-    return postorder_leafnodes(tree.left) + postorder_leafnodes(tree.right)
+    """ Return the leaves of tree from left to right.
+
+    @param HuffmanNode tree: a Huffman tree rooted at node 'tree'
+    @rtype: list[HuffmanNode]
+    """
+    leaves = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if not node:
+            continue
+        if node.is_leaf():
+            leaves.append(node)
+        else:
+            stack.append(node.right)
+            stack.append(node.left)
+    return leaves
 
 
 if __name__ == "__main__":
-    # TODO: Uncomment these when you have implemented all the functions
-    import doctest
-    doctest.testmod()
-
-    import time
-
-    mode = input("Press c to compress or u to uncompress: ")
-    if mode == "c":
-        fname = input("File to compress: ")
-        start = time.time()
-        compress(fname, fname + ".huf")
-        print("compressed {} in {} seconds."
-              .format(fname, time.time() - start))
-    elif mode == "u":
-        fname = input("File to uncompress: ")
-        start = time.time()
-        uncompress(fname, fname + ".orig")
-        print("uncompressed {} in {} seconds."
-              .format(fname, time.time() - start))
+    # see cli.py for the commands, e.g. python huffman.py compress book.txt
+    import sys
+    from cli import main
+    sys.exit(main())
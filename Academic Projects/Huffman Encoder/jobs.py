@@ -0,0 +1,194 @@
+"""
+Compress and decompress jobs, one file or stream each, with measurements.
+
+A job is a tuple (command, input, output, workers, block_size), where
+command is "compress" or "decompress" and input or output may be "-" for
+standard input or output. run_job runs one and returns what was
+measured; safe_job does the same but describes errors instead of raising
+them, for running many jobs at once. cli.py and aio.py both run their
+work as jobs.
+"""
+
+import os
+import sys
+import time
+
+from huffman import compress, uncompress, read_decoder, decode_chunks
+from huffman import read_chunks, CHUNK_SIZE
+from metrics import Metrics
+from parallel import compress_stream, uncompress_stream, BLOCK_MAGIC
+from parallel import is_block_file
+
+
+STDIO = "-"
+SUFFIX = ".huf"
+ORIG_SUFFIX = ".orig"
+
+
+def output_name(command, name):
+    """ Return the default output file for running command on file name.
+
+    @param str command: "compress" or "decompress"
+    @param str name: input file
+    @rtype: str
+
+    >>> output_name("compress", "book.txt")
+    'book.txt.huf'
+    >>> output_name("decompress", "book.txt.huf")
+    'book.txt'
+    >>> output_name("decompress", "book.bin")
+    'book.bin.orig'
+    """
+    if name == STDIO:
+        return STDIO
+    if command == "compress":
+        return name + SUFFIX
+    if name.endswith(SUFFIX) and len(name) > len(SUFFIX):
+        return name[:-len(SUFFIX)]
+    return name + ORIG_SUFFIX
+
+
+def open_input(name):
+    """ Return binary file name opened for reading, or standard input.
+
+    @param str name: file name or "-"
+    @rtype: file
+    """
+    return sys.stdin.buffer if name == STDIO else open(name, "rb")
+
+
+def open_output(name):
+    """ Return binary file name opened for writing, or standard output.
+
+    @param str name: file name or "-"
+    @rtype: file
+    """
+    return sys.stdout.buffer if name == STDIO else open(name, "wb")
+
+
+class PrefixReader:
+    """ A binary file that reads bytes already taken from another file,
+    then the rest of that file.
+
+    >>> from io import BytesIO
+    >>> f = BytesIO(b"abcdef")
+    >>> r = PrefixReader(f.read(2), f)
+    >>> r.read(1), r.read(3), r.read()
+    (b'a', b'bcd', b'ef')
+    """
+
+    def __init__(self, prefix, f):
+        """ Create a new PrefixReader that reads prefix, then f.
+
+        @param PrefixReader self: this PrefixReader
+        @param bytes prefix: bytes to read first
+        @param file f: a file opened for reading in binary mode
+        @rtype: NoneType
+        """
+        self._prefix = prefix
+        self._f = f
+
+    def read(self, size=-1):
+        """ Return up to size bytes, or all that is left if size is
+        negative.
+
+        @param PrefixReader self: this PrefixReader
+        @param int size: number of bytes to read
+        @rtype: bytes
+        """
+        if size is None or size < 0:
+            data, self._prefix = self._prefix + self._f.read(), b""
+            return data
+        data, self._prefix = self._prefix[:size], self._prefix[size:]
+        if len(data) < size:
+            data += self._f.read(size - len(data))
+        return data
+
+
+def read_exactly(f, size):
+    """ Return the next size bytes of binary file f, or fewer only if f
+    ends first. Pipes may return fewer bytes per read than asked for.
+
+    @param file f: a file opened for reading in binary mode
+    @param int size: number of bytes to read
+    @rtype: bytes
+    """
+    data = b""
+    while len(data) < size:
+        more = f.read(size - len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+
+def decompress_stream(f1, f2, workers, chunk_size=CHUNK_SIZE):
+    """ Uncompress binary file f1, a block file or a file in the format
+    compress writes, into binary file f2.
+
+    @param file f1: a file opened for reading in binary mode
+    @param file f2: a file opened for writing in binary mode
+    @param int workers: number of processes for block files
+    @param int chunk_size: number of bytes to read at a time
+    @rtype: NoneType
+    """
+    head = read_exactly(f1, len(BLOCK_MAGIC))
+    f1 = PrefixReader(head, f1)
+    if head == BLOCK_MAGIC:
+        uncompress_stream(f1, f2, workers)
+    else:
+        decoder = read_decoder(f1)
+        decode_chunks(read_chunks(f1, chunk_size), decoder, f2)
+
+
+def run_job(job):
+    """ Run one command on one file and return what was measured.
+
+    job is (command, input, output, workers, block_size). Files go through
+    huffman.compress and huffman.uncompress; standard input or output,
+    and block files to decompress, go through compress_stream and
+    decompress_stream.
+
+    @param tuple job: what to run
+    @rtype: dict
+    """
+    command, name, out, workers, block_size = job
+    stats = {"command": command, "input": name, "output": out}
+    start = time.perf_counter()
+    streamed = STDIO in (name, out) or (command == "decompress" and
+                                        is_block_file(name))
+    if streamed:
+        f1, f2 = open_input(name), open_output(out)
+        try:
+            if command == "compress":
+                compress_stream(f1, f2, block_size, workers)
+            else:
+                decompress_stream(f1, f2, workers)
+            f2.flush()
+        finally:
+            for f in (f1, f2):
+                if f not in (sys.stdin.buffer, sys.stdout.buffer):
+                    f.close()
+    else:
+        metrics = Metrics()
+        if command == "compress":
+            compress(name, out, metrics=metrics, verbose=False)
+        else:
+            uncompress(name, out, metrics=metrics)
+        stats["stages"] = metrics.as_dict()
+        stats["bytes_in"] = os.path.getsize(name)
+        stats["bytes_out"] = os.path.getsize(out)
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def safe_job(job):
+    """ Return run_job(job), or a description of the error it raised.
+
+    @param tuple job: what to run, see run_job
+    @rtype: dict
+    """
+    try:
+        return run_job(job)
+    except (OSError, ValueError) as error:
+        return {"command": job[0], "input": job[1], "error": str(error)}
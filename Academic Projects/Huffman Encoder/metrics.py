@@ -0,0 +1,203 @@
+"""
+Per-stage measurements of compress and uncompress.
+
+Pass a Metrics to huffman.compress or huffman.uncompress to have each of
+their stages timed and described. Without one they use NO_METRICS, whose
+stages record nothing, so the only cost is a few calls per file.
+
+    >>> m = Metrics()
+    >>> with m.stage("count") as s:
+    ...     s.bytes_in = 10
+    >>> [(s.name, s.bytes_in) for s in m.stages]
+    [('count', 10)]
+
+A Metrics can also call a function with each Stage as it ends, profile
+each stage with cProfile, or track the peak memory each stage allocates
+with tracemalloc, so hot spots can be found without editing the code.
+"""
+
+import cProfile
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+
+class Stage:
+    """ What was measured for one stage of compress or uncompress. Fields
+    that were not measured are None.
+
+    Attributes:
+    ===========
+    @param str name: name of the stage
+    @param float seconds: wall time taken
+    @param int|NoneType bytes_in: bytes the stage read
+    @param int|NoneType bytes_out: bytes the stage wrote
+    @param int|NoneType symbols: symbols the stage handled
+    @param int|NoneType tree_depth: longest code
+    @param int|NoneType header_size: bytes of header
+    @param int|NoneType peak_memory: most bytes allocated at once, beyond
+        what was allocated when the stage began, if traced
+    @param cProfile.Profile|NoneType profile: profile of the stage, if
+        profiled
+    """
+
+    FIELDS = ("seconds", "bytes_in", "bytes_out", "symbols", "tree_depth",
+              "header_size", "peak_memory")
+
+    def __init__(self, name):
+        """ Create a new Stage called name with nothing measured yet.
+
+        @param Stage self: this Stage
+        @param str name: name of the stage
+        @rtype: NoneType
+        """
+        self.name = name
+        self.seconds = 0.0
+        self.bytes_in = self.bytes_out = self.symbols = None
+        self.tree_depth = self.header_size = self.peak_memory = None
+        self.profile = None
+
+    def __repr__(self):
+        """ Return a string representation of self, with the fields that
+        were measured.
+
+        @param Stage self: this Stage
+        @rtype: str
+
+        >>> s = Stage("encode")
+        >>> s.bytes_in = 4
+        >>> s
+        Stage('encode', seconds=0.0, bytes_in=4)
+        """
+        return "Stage({!r}, {})".format(self.name, ", ".join(
+            ["{}={!r}".format(field, value)
+             for field, value in self.as_dict().items() if field != "name"]))
+
+    def as_dict(self):
+        """ Return the name and measured fields of self.
+
+        @param Stage self: this Stage
+        @rtype: dict(str,object)
+        """
+        result = {"name": self.name}
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                result[field] = value
+        return result
+
+
+class Metrics:
+    """ Collects a Stage for each stage of compress or uncompress.
+
+    Attributes:
+    ===========
+    @param list[Stage] stages: stages measured so far, in order
+    @param callable|NoneType callback: called with each Stage as it ends
+    @param bool profile: whether to profile each stage with cProfile
+    @param bool trace_memory: whether to track peak memory with tracemalloc
+    """
+
+    def __init__(self, callback=None, profile=False, trace_memory=False):
+        """ Create a new Metrics with no stages.
+
+        @param Metrics self: this Metrics
+        @param callable|NoneType callback: called with each Stage as it
+            ends
+        @param bool profile: whether to profile each stage with cProfile
+        @param bool trace_memory: whether to track peak memory with
+            tracemalloc
+        @rtype: NoneType
+        """
+        self.stages = []
+        self.callback = callback
+        self.profile = profile
+        self.trace_memory = trace_memory
+
+    @contextmanager
+    def stage(self, name):
+        """ Measure the code run in the with block as stage name, and give
+        the block the Stage to fill in what it knows.
+
+        If tracemalloc is already tracing, its peak is reset for the stage.
+        Before Python 3.9 it cannot be, and the peak reported is the
+        highest since tracing began, which may be from before the stage.
+
+        @param Metrics self: this Metrics
+        @param str name: name of the stage
+        @rtype: contextmanager[Stage]
+        """
+        stage = Stage(name)
+        tracing = self.trace_memory and not tracemalloc.is_tracing()
+        base = 0
+        if tracing:
+            tracemalloc.start()
+        elif self.trace_memory:
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        if self.profile:
+            stage.profile = cProfile.Profile()
+            stage.profile.enable()
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage.seconds = time.perf_counter() - start
+            if self.profile:
+                stage.profile.disable()
+            if self.trace_memory:
+                stage.peak_memory = max(
+                    0, tracemalloc.get_traced_memory()[1] - base)
+                if tracing:
+                    tracemalloc.stop()
+            self.stages.append(stage)
+            if self.callback is not None:
+                self.callback(stage)
+
+    def as_dict(self):
+        """ Return the measured fields of every stage, by stage name.
+
+        @param Metrics self: this Metrics
+        @rtype: dict(str,dict)
+        """
+        return {stage.name: stage.as_dict() for stage in self.stages}
+
+    def print_stats(self, file=sys.stderr, top=10):
+        """ Print a line for each stage to file, followed by the top
+        functions of each stage's profile, if profiled.
+
+        @param Metrics self: this Metrics
+        @param file file: where to print
+        @param int top: number of functions to print per profile
+        @rtype: NoneType
+        """
+        for stage in self.stages:
+            print(stage, file=file)
+        for stage in self.stages:
+            if stage.profile is not None:
+                print("profile of {}:".format(stage.name), file=file)
+                pstats.Stats(stage.profile, stream=file).sort_stats(
+                    "cumulative").print_stats(top)
+
+
+class NullMetrics:
+    """ A Metrics that measures nothing, for when none is wanted.
+    """
+
+    stages = ()
+
+    def stage(self, name):
+        """ Return a context that gives a Stage nobody keeps.
+
+        @param NullMetrics self: this NullMetrics
+        @param str name: name of the stage
+        @rtype: contextmanager[Stage]
+        """
+        return nullcontext(_UNUSED_STAGE)
+
+
+_UNUSED_STAGE = Stage("")
+NO_METRICS = NullMetrics()
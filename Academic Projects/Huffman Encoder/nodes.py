@@ -1,5 +1,7 @@
 """Classes for representing nodes"""
 
+from array import array
+
 
 class HuffmanNode:
     """ A node in a Huffman tree.
@@ -111,6 +113,418 @@ class ReadNode:
         return 'ReadNode({}, {}, {}, {})'.format(
             self.l_type, self.l_data, self.r_type, self.r_data)
 
+class HuffmanTree:
+    """ A Huffman tree stored as parallel arrays, one entry per node.
+
+    Nodes are identified by their index. Leaves have left and right -1;
+    internal nodes have symbol -1. This takes a few bytes per node where a
+    HuffmanNode takes a whole object, and walking the tree is array
+    indexing rather than attribute lookups.
+
+    Attributes:
+    ===========
+    @param array left: index of each node's left child, or -1
+    @param array right: index of each node's right child, or -1
+    @param array symbol: symbol of each leaf, or -1
+    @param array number: postorder number of each internal node, or -1
+    @param int root: index of the root node
+    """
+
+    def __init__(self):
+        """ Create a new, empty HuffmanTree.
+
+        @param HuffmanTree self: this HuffmanTree
+        @rtype: NoneType
+        """
+        self.left = array("i")
+        self.right = array("i")
+        self.symbol = array("i")
+        self.number = array("i")
+        self.root = -1
+
+    def __len__(self):
+        """ Return the number of nodes in this tree.
+
+        @param HuffmanTree self: this HuffmanTree
+        @rtype: int
+        """
+        return len(self.symbol)
+
+    def __repr__(self):
+        """ Return a string representation of the tree as nested nodes.
+
+        @param HuffmanTree self: this HuffmanTree
+        @rtype: str
+        """
+        return 'HuffmanTree({})'.format(self.to_node())
+
+    def add_leaf(self, symbol):
+        """ Add a leaf for symbol and return its index.
+
+        @param HuffmanTree self: this HuffmanTree
+        @param int symbol: symbol for the leaf
+        @rtype: int
+        """
+        return self._add(-1, -1, symbol)
+
+    def add_node(self, left, right):
+        """ Add an internal node with the given children and return its
+        index. The newest node becomes the root.
+
+        @param HuffmanTree self: this HuffmanTree
+        @param int left: index of the left child
+        @param int right: index of the right child
+        @rtype: int
+        """
+        self.root = self._add(left, right, -1)
+        return self.root
+
+    def _add(self, left, right, symbol):
+        """ Append a node and return its index.
+
+        @param HuffmanTree self: this HuffmanTree
+        @param int left: index of the left child, or -1
+        @param int right: index of the right child, or -1
+        @param int symbol: symbol of a leaf, or -1
+        @rtype: int
+        """
+        self.left.append(left)
+        self.right.append(right)
+        self.symbol.append(symbol)
+        self.number.append(-1)
+        return len(self.symbol) - 1
+
+    def node(self, index):
+        """ Return a view of node index.
+
+        @param HuffmanTree self: this HuffmanTree
+        @param int index: index of a node
+        @rtype: NodeView
+        """
+        return NodeView(self, index)
+
+    def is_leaf(self, index):
+        """ Return True iff node index is a leaf.
+
+        @param HuffmanTree self: this HuffmanTree
+        @param int index: index of a node
+        @rtype: bool
+        """
+        return self.left[index] < 0 and self.right[index] < 0
+
+    def postorder(self):
+        """ Return the indices of the internal nodes in postorder.
+
+        @param HuffmanTree self: this HuffmanTree
+        @rtype: list[int]
+
+        >>> t = HuffmanTree.from_node(HuffmanNode(None, HuffmanNode(3), \
+        HuffmanNode(None, HuffmanNode(2), HuffmanNode(5))))
+        >>> [t.node(i).left.symbol for i in t.postorder()]
+        [2, 3]
+        """
+        left, right = self.left, self.right
+        order = []
+        stack = [self.root] if self.symbol else []
+        while stack:
+            index = stack.pop()
+            if left[index] >= 0 or right[index] >= 0:
+                order.append(index)
+                stack.append(left[index])
+                stack.append(right[index])
+        order.reverse()
+        return order
+
+    def number_nodes(self):
+        """ Number the internal nodes in postorder, starting at 0.
+
+        @param HuffmanTree self: this HuffmanTree
+        @rtype: NoneType
+        """
+        for counter, index in enumerate(self.postorder()):
+            self.number[index] = counter
+
+    def code_lengths(self):
+        """ Return a dict mapping each symbol to the depth of its leaf.
+
+        @param HuffmanTree self: this HuffmanTree
+        @rtype: dict(int,int)
+        """
+        left, right, symbol = self.left, self.right, self.symbol
+        lengths = {}
+        stack = [(self.root, 0)] if self.symbol else []
+        while stack:
+            index, depth = stack.pop()
+            if symbol[index] >= 0:
+                lengths[symbol[index]] = depth
+            else:
+                stack.append((left[index], depth + 1))
+                stack.append((right[index], depth + 1))
+        return lengths
+
+    def codes(self):
+        """ Return a dict mapping each symbol to its code.
+
+        @param HuffmanTree self: this HuffmanTree
+        @rtype: dict(int,str)
+
+        >>> t = HuffmanTree.from_node(HuffmanNode(None, HuffmanNode(3), \
+        HuffmanNode(2)))
+        >>> t.codes() == {3: "0", 2: "1"}
+        True
+        """
+        left, right, symbol = self.left, self.right, self.symbol
+        codes = {}
+        # right is pushed first so that, as in a preorder walk, a symbol
+        # that appears twice keeps its right-hand code
+        stack = [(self.root, "")] if self.symbol else []
+        while stack:
+            index, code = stack.pop()
+            if right[index] >= 0:
+                stack.append((right[index], code + "1"))
+            if left[index] >= 0:
+                stack.append((left[index], code + "0"))
+            if symbol[index] >= 0:
+                codes[symbol[index]] = code
+        return codes
+
+    def to_bytes(self):
+        """ Return the postorder bytes representation of the internal
+        nodes, as described in the handout.
+        Precondition: the nodes are numbered and symbols fit in a byte.
+
+        @param HuffmanTree self: this HuffmanTree
+        @rtype: bytes
+
+        >>> t = HuffmanTree.from_node(HuffmanNode(None, HuffmanNode(None, \
+        HuffmanNode(3), HuffmanNode(2)), HuffmanNode(5)))
+        >>> t.number_nodes()
+        >>> list(t.to_bytes())
+        [0, 3, 0, 2, 1, 0, 0, 5]
+        """
+        symbol, number = self.symbol, self.number
+        L = []
+        for index in self.postorder():
+            for child in (self.left[index], self.right[index]):
+                if symbol[child] >= 0:
+                    L.extend((0, symbol[child]))
+                else:
+                    L.extend((1, number[child]))
+        return bytes(L)
+
+    def to_node(self):
+        """ Return this tree as a tree of HuffmanNodes. Nodes shared in
+        this tree are shared in the result.
+
+        @param HuffmanTree self: this HuffmanTree
+        @rtype: HuffmanNode|NoneType
+        """
+        if not self.symbol:
+            return None
+        left, right, symbol = self.left, self.right, self.symbol
+        made = [None] * len(self)
+        stack = [self.root]
+        while stack:
+            index = stack[-1]
+            if made[index] is not None:
+                stack.pop()
+                continue
+            waiting = [child for child in (left[index], right[index])
+                       if child >= 0 and made[child] is None]
+            if waiting:
+                stack.extend(waiting)
+                continue
+            stack.pop()
+            made[index] = HuffmanNode(
+                symbol[index] if symbol[index] >= 0 else None,
+                made[left[index]] if left[index] >= 0 else None,
+                made[right[index]] if right[index] >= 0 else None)
+            made[index].number = (self.number[index]
+                                  if self.number[index] >= 0 else None)
+        return made[self.root]
+
+    @classmethod
+    def from_node(cls, node):
+        """ Return the HuffmanTree equivalent to the tree rooted at node.
+
+        @param type cls: HuffmanTree
+        @param HuffmanNode node: root of a tree of HuffmanNodes
+        @rtype: HuffmanTree
+
+        >>> n = HuffmanNode(None, HuffmanNode(3), HuffmanNode(2))
+        >>> HuffmanTree.from_node(n).to_node() == n
+        True
+        """
+        tree = cls()
+        ids = {}
+        stack = [node] if node else []
+        while stack:
+            current = stack[-1]
+            if id(current) in ids:
+                stack.pop()
+                continue
+            waiting = [child for child in (current.left, current.right)
+                       if child and id(child) not in ids]
+            if waiting:
+                stack.extend(waiting)
+                continue
+            stack.pop()
+            if current.is_leaf():
+                index = tree.add_leaf(-1 if current.symbol is None
+                                      else current.symbol)
+            else:
+                index = tree._add(ids[id(current.left)] if current.left
+                                  else -1,
+                                  ids[id(current.right)] if current.right
+                                  else -1, -1)
+            if current.number is not None:
+                tree.number[index] = current.number
+            ids[id(current)] = index
+        tree.root = ids[id(node)] if node else -1
+        return tree
+
+    @classmethod
+    def from_codes(cls, codes):
+        """ Return the tree whose leaves have the given codes.
+
+        @param type cls: HuffmanTree
+        @param dict(int,str) codes: mapping from symbols to prefix-free codes
+        @rtype: HuffmanTree
+
+        >>> HuffmanTree.from_codes({3: "0", 2: "1"}).codes() == \
+        {3: "0", 2: "1"}
+        True
+        """
+        tree = cls()
+        tree.root = tree._add(-1, -1, -1)
+        for symbol, code in codes.items():
+            index = tree.root
+            for bit in code:
+                children = tree.left if bit == "0" else tree.right
+                if children[index] < 0:
+                    children[index] = tree._add(-1, -1, -1)
+                index = children[index]
+            tree.symbol[index] = symbol
+        return tree
+
+    @classmethod
+    def from_read_nodes(cls, node_lst, root_index):
+        """ Return the tree rooted at node_lst[root_index], where node_lst
+        is in any order.
+
+        @param type cls: HuffmanTree
+        @param list[ReadNode] node_lst: a list of ReadNode objects
+        @param int root_index: index in 'node_lst'
+        @rtype: HuffmanTree
+
+        >>> lst = [ReadNode(0, 5, 0, 7), ReadNode(0, 10, 0, 12), \
+        ReadNode(1, 1, 1, 0)]
+        >>> HuffmanTree.from_read_nodes(lst, 2).codes() == \
+        {10: "00", 12: "01", 5: "10", 7: "11"}
+        True
+        """
+        tree = cls()
+        ids = {}
+        stack = [root_index]
+        while stack:
+            k = stack[-1]
+            if k in ids:
+                stack.pop()
+                continue
+            a = node_lst[k]
+            waiting = [data for kind, data in ((a.l_type, a.l_data),
+                                               (a.r_type, a.r_data))
+                       if kind == 1 and data not in ids]
+            if waiting:
+                stack.extend(waiting)
+                continue
+            stack.pop()
+            children = [ids[data] if kind == 1 else tree.add_leaf(data)
+                        for kind, data in ((a.l_type, a.l_data),
+                                           (a.r_type, a.r_data))]
+            ids[k] = tree._add(children[0], children[1], -1)
+        tree.root = ids[root_index]
+        return tree
+
+
+class NodeView:
+    """ A read-only view of one node of a HuffmanTree, with the same
+    attributes as a HuffmanNode.
+
+    Attributes:
+    ===========
+    @param HuffmanTree tree: the tree the node is in
+    @param int index: index of the node in tree
+    """
+    __slots__ = ("tree", "index")
+
+    def __init__(self, tree, index):
+        """ Create a new NodeView of node index of tree.
+
+        @param NodeView self: this NodeView
+        @param HuffmanTree tree: the tree the node is in
+        @param int index: index of the node in tree
+        @rtype: NoneType
+        """
+        self.tree, self.index = tree, index
+
+    def __repr__(self):
+        """ Return a string representation of this view.
+
+        @param NodeView self: this NodeView
+        @rtype: str
+        """
+        return 'NodeView({})'.format(self.index)
+
+    @property
+    def symbol(self):
+        """ Return the symbol at this node, if any.
+
+        @param NodeView self: this NodeView
+        @rtype: int|NoneType
+        """
+        symbol = self.tree.symbol[self.index]
+        return symbol if symbol >= 0 else None
+
+    @property
+    def left(self):
+        """ Return a view of the left child, if any.
+
+        @param NodeView self: this NodeView
+        @rtype: NodeView|NoneType
+        """
+        child = self.tree.left[self.index]
+        return NodeView(self.tree, child) if child >= 0 else None
+
+    @property
+    def right(self):
+        """ Return a view of the right child, if any.
+
+        @param NodeView self: this NodeView
+        @rtype: NodeView|NoneType
+        """
+        child = self.tree.right[self.index]
+        return NodeView(self.tree, child) if child >= 0 else None
+
+    @property
+    def number(self):
+        """ Return the node number, if any.
+
+        @param NodeView self: this NodeView
+        @rtype: int|NoneType
+        """
+        number = self.tree.number[self.index]
+        return number if number >= 0 else None
+
+    def is_leaf(self):
+        """ Return True iff this node is a leaf.
+
+        @param NodeView self: this NodeView
+        @rtype: bool
+        """
+        return self.tree.is_leaf(self.index)
+
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
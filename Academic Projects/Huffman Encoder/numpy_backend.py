@@ -0,0 +1,156 @@
+"""
+NumPy versions of the per-byte loops in huffman.py.
+
+huffman.py uses these when NumPy can be imported and falls back to pure
+Python otherwise; importing this module raises ImportError without NumPy.
+"""
+
+import numpy as np
+
+
+def freq_counts(text):
+    """ Return a dictionary that maps each byte in text to its frequency,
+    in increasing order of byte.
+
+    @param bytes|bytearray|memoryview text: bytes to count
+    @rtype: dict(int,int)
+
+    >>> freq_counts(bytes([66, 65, 67, 66])) == {65: 1, 66: 2, 67: 1}
+    True
+    """
+    counts = np.bincount(np.frombuffer(text, dtype=np.uint8), minlength=256)
+    symbols = np.flatnonzero(counts)
+    return dict(zip(symbols.tolist(), counts[symbols].tolist()))
+
+
+def pair_indices(symbols, prev):
+    """ Return prev_byte * 256 + byte for each byte in symbols, where the
+    byte before the first one is prev.
+
+    @param numpy.ndarray symbols: uint8 array of bytes
+    @param int prev: the byte before symbols
+    @rtype: numpy.ndarray
+
+    >>> pair_indices(np.array([1, 2], dtype=np.uint8), 3).tolist()
+    [769, 258]
+    """
+    pairs = symbols.astype(np.intp)
+    pairs[1:] |= pairs[:-1] << 8
+    pairs[:1] |= prev << 8
+    return pairs
+
+
+def pair_counts(text, prev):
+    """ Return a dictionary that maps prev_byte * 256 + byte for the bytes
+    of text to its frequency, in increasing order, where the byte before
+    the first one is prev.
+
+    @param bytes|bytearray|memoryview text: bytes to count
+    @param int prev: the byte before text
+    @rtype: dict(int,int)
+
+    >>> pair_counts(b"aab", 97) == {97 * 256 + 97: 2, 97 * 256 + 98: 1}
+    True
+    """
+    pairs = pair_indices(np.frombuffer(text, dtype=np.uint8), prev)
+    counts = np.bincount(pairs, minlength=1 << 16)
+    symbols = np.flatnonzero(counts)
+    return dict(zip(symbols.tolist(), counts[symbols].tolist()))
+
+
+def code_arrays(table):
+    """ Return arrays of the code values and code lengths in table,
+    indexed by symbol, with length 0 for symbols that have no code.
+
+    @param list[tuple(int,int)|NoneType] table: code for each symbol
+    @rtype: tuple(numpy.ndarray,numpy.ndarray)
+    """
+    values = np.zeros(max(len(table), 256), dtype=np.uint64)
+    lengths = np.zeros(max(len(table), 256), dtype=np.uint64)
+    for symbol, code in enumerate(table):
+        if code is not None:
+            values[symbol], lengths[symbol] = code
+    return values, lengths
+
+
+def pack_codes(text, values, lengths, prev=None):
+    """ Return the codes for the bytes of text packed into bytes (the last
+    one padded with zeros), and the number of bits they take up.
+
+    If prev is given, values and lengths are indexed by pair_indices(text,
+    prev) rather than by byte.
+
+    The cumulative sum of the code lengths gives each code's bit offset,
+    and so the 64-bit word it starts in. Codes do not overlap, so adding
+    up the codes shifted into place within each word packs them; a code
+    that runs past the end of its word has its low bits added to the
+    next word.
+
+    @param bytes|bytearray|memoryview text: bytes to encode
+    @param numpy.ndarray values: code value for each symbol
+    @param numpy.ndarray lengths: code length for each symbol, at most 64
+    @param int|NoneType prev: the byte before text, for pair codes
+    @rtype: tuple(bytes,int)
+
+    >>> v, n = code_arrays([(0, 1), (2, 2), (3, 2)])
+    >>> data, nbits = pack_codes(bytes([1, 2, 1, 0, 2]), v, n)
+    >>> [bin(b) for b in data], nbits
+    (['0b10111001', '0b10000000'], 9)
+    """
+    symbols = np.frombuffer(text, dtype=np.uint8)
+    if not len(symbols):
+        return b"", 0
+    if prev is not None:
+        symbols = pair_indices(symbols, prev)
+    code_values = values[symbols]
+    code_lengths = lengths[symbols]
+    ends = np.cumsum(code_lengths)
+    nbits = int(ends[-1])
+    starts = ends - code_lengths
+    word = starts >> np.uint64(6)
+    # bit offset in its word at which each code ends, from 1 to 127
+    end_in_word = (starts & np.uint64(63)) + code_lengths
+    fits = end_in_word <= 64
+    spills = ~fits
+    placed = np.empty_like(code_values)
+    placed[fits] = code_values[fits] << (np.uint64(64) - end_in_word[fits])
+    placed[spills] = code_values[spills] >> (end_in_word[spills] -
+                                             np.uint64(64))
+    words = np.zeros(nbits // 64 + 2, dtype=np.uint64)
+    first = np.flatnonzero(np.r_[True, word[1:] != word[:-1]])
+    words[word[first]] = np.add.reduceat(placed, first)
+    words[word[spills] + np.uint64(1)] |= \
+        code_values[spills] << (np.uint64(128) - end_in_word[spills])
+    return words.astype(">u8").tobytes()[:(nbits + 7) // 8], nbits
+
+
+def suffix_array(data):
+    """ Return the start of each suffix of data in sorted order, as
+    transforms.suffix_array does, by prefix doubling on arrays.
+
+    @param bytes|bytearray|memoryview data: bytes to sort the suffixes of
+    @rtype: numpy.ndarray
+
+    >>> suffix_array(b"banana").tolist()
+    [6, 5, 3, 1, 0, 4, 2]
+    """
+    n = len(data) + 1
+    rank = np.zeros(n, dtype=np.int64)
+    rank[:-1] = np.frombuffer(data, dtype=np.uint8)
+    rank[:-1] += 1
+    scale = max(n, 257)
+    shifted = np.zeros(n, dtype=np.int64)
+    ranks = np.zeros(n, dtype=np.int64)
+    k = 1
+    while True:
+        shifted[:] = 0
+        if k < n:
+            shifted[:n - k] = rank[k:]
+        keys = rank * scale + shifted
+        order = np.argsort(keys, kind="stable")
+        ordered = keys[order]
+        np.cumsum(ordered[1:] != ordered[:-1], out=ranks[1:])
+        rank[order] = ranks
+        if ranks[-1] == n - 1:
+            return order
+        k *= 2
@@ -0,0 +1,160 @@
+"""
+Block-parallel compression and decompression.
+
+The input is cut into fixed-size blocks. Each block is compressed on its
+own, with its own tree and header, so blocks can be coded on separate
+processes. A block file is laid out as
+
+    BLOCK_MAGIC | block size (4 bytes) |
+    length of block 0 (4 bytes) | block 0 | length of block 1 | ...
+
+where every block is in the format compress writes. Since no block
+depends on what comes after it, block files can be written and read
+through pipes, see compress_stream and uncompress_stream.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from os import cpu_count
+
+from huffman import compress_bytes, uncompress_bytes, read_chunks
+from huffman import size_to_bytes, bytes_to_size
+
+
+BLOCK_MAGIC = b"HUFB"
+BLOCK_SIZE = 1 << 20
+
+
+def ordered_map(pool, func, items, window):
+    """ Yield func(item) for each item in items, in order, while keeping at
+    most window calls submitted to pool at once.
+
+    Unlike pool.map, items is only read as far as the window reaches, so
+    a large input is never all in memory.
+
+    @param Executor pool: executor to run func on
+    @param callable func: function of one argument
+    @param iterable items: arguments for func
+    @param int window: largest number of calls in flight
+    @rtype: iterator
+    """
+    pending = deque()
+    for item in items:
+        if len(pending) >= window:
+            yield pending.popleft().result()
+        pending.append(pool.submit(func, item))
+    while pending:
+        yield pending.popleft().result()
+
+
+def read_blocks(f):
+    """ Yield the compressed blocks of block file f, whose header has
+    already been read.
+
+    @param file f: a block file opened for reading in binary mode
+    @rtype: iterator[bytes]
+    """
+    length = f.read(4)
+    while length:
+        yield f.read(bytes_to_size(length))
+        length = f.read(4)
+
+
+def block_map(func, items, workers):
+    """ Yield func(item) for each item in items, in order, on workers
+    processes, or in this process if workers is 1.
+
+    @param callable func: function of one argument
+    @param iterable items: arguments for func
+    @param int workers: number of processes
+    @rtype: iterator
+    """
+    if workers == 1:
+        yield from map(func, items)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        yield from ordered_map(pool, func, items, 2 * workers)
+
+
+def compress_stream(f1, f2, block_size=BLOCK_SIZE, workers=None):
+    """ Compress the rest of binary file f1 into a block file written to
+    binary file f2, block_size bytes per block, on workers processes.
+
+    Either file may be a pipe.
+
+    @param file f1: a file opened for reading in binary mode
+    @param file f2: a file opened for writing in binary mode
+    @param int block_size: number of input bytes per block
+    @param int|NoneType workers: number of processes, default one per CPU
+    @rtype: NoneType
+
+    >>> from io import BytesIO
+    >>> f = BytesIO()
+    >>> compress_stream(BytesIO(b"abracadabra"), f, 4, 1)
+    >>> f.seek(0)
+    0
+    >>> g = BytesIO()
+    >>> uncompress_stream(f, g, 1)
+    >>> g.getvalue()
+    b'abracadabra'
+    """
+    workers = workers or cpu_count() or 1
+    f2.write(BLOCK_MAGIC + size_to_bytes(block_size))
+    for block in block_map(compress_bytes, read_chunks(f1, block_size),
+                           workers):
+        f2.write(size_to_bytes(len(block)) + block)
+
+
+def uncompress_stream(f1, f2, workers=None):
+    """ Uncompress the block file read from binary file f1 into binary
+    file f2 on workers processes.
+
+    Either file may be a pipe.
+
+    @param file f1: a file opened for reading in binary mode
+    @param file f2: a file opened for writing in binary mode
+    @param int|NoneType workers: number of processes, default one per CPU
+    @rtype: NoneType
+    """
+    workers = workers or cpu_count() or 1
+    if f1.read(len(BLOCK_MAGIC)) != BLOCK_MAGIC:
+        raise ValueError("not a block file")
+    f1.read(4)  # block size
+    for text in block_map(uncompress_bytes, read_blocks(f1), workers):
+        f2.write(text)
+
+
+def is_block_file(path):
+    """ Return whether the file path starts like a block file.
+
+    @param str path: file to look at
+    @rtype: bool
+    """
+    with open(path, "rb") as f:
+        return f.read(len(BLOCK_MAGIC)) == BLOCK_MAGIC
+
+
+def compress_blocks(in_file, out_file, block_size=BLOCK_SIZE, workers=None):
+    """ Compress in_file into block file out_file, block_size bytes per
+    block, on workers processes.
+
+    @param str in_file: input file to compress
+    @param str out_file: output file to store compressed result
+    @param int block_size: number of input bytes per block
+    @param int|NoneType workers: number of processes, default one per CPU
+    @rtype: NoneType
+    """
+    with open(in_file, "rb") as f1, open(out_file, "wb") as f2:
+        compress_stream(f1, f2, block_size, workers)
+
+
+def uncompress_blocks(in_file, out_file, workers=None):
+    """ Uncompress block file in_file into out_file on workers processes.
+
+    @param str in_file: block file to uncompress
+    @param str out_file: output file that will hold the uncompressed results
+    @param int|NoneType workers: number of processes, default one per CPU
+    @rtype: NoneType
+    """
+    with open(in_file, "rb") as f1, open(out_file, "wb") as f2:
+        uncompress_stream(f1, f2, workers)
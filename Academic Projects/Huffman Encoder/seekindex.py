@@ -0,0 +1,215 @@
+"""
+Seek indexes for random access into compressed files.
+
+An index is kept next to the compressed file it describes, in a sidecar
+file, so the compressed format itself does not change. It records the
+bit offset, from the start of the compressed data, of every interval-th
+symbol. An index file is laid out as
+
+    INDEX_MAGIC | version (1 byte) | interval (4 bytes) | size (8 bytes) |
+    file size (8 bytes) | header CRC (4 bytes) |
+    number of offsets (4 bytes) | offset 0 (8 bytes) | offset 1 | ...
+
+where size is the number of symbols in the compressed file, file size
+its length in bytes and header CRC the CRC-32 of its header, so an index
+that belongs to another version of the file can be told apart. Version 1
+indexes had neither of the last two and are never trusted.
+"""
+
+import os
+import sys
+import zlib
+from array import array
+
+
+INDEX_MAGIC = b"HUFI"
+INDEX_VERSION = 2
+INDEX_SUFFIX = ".idx"
+INDEX_INTERVAL = 1 << 16
+
+
+class SeekIndex:
+    """ Bit offsets of every interval-th symbol of a compressed file.
+
+    Attributes:
+    ===========
+    @param int interval: number of symbols between offsets
+    @param int size: number of symbols in the compressed file
+    @param array offsets: bit offset of symbol i * interval, for each i
+    @param int|NoneType file_size: length of the compressed file, if known
+    @param int|NoneType header_crc: CRC-32 of its header, if known
+    """
+
+    def __init__(self, interval, size=0, offsets=(), file_size=None,
+                 header_crc=None):
+        """ Create a new SeekIndex.
+
+        @param SeekIndex self: this SeekIndex
+        @param int interval: number of symbols between offsets
+        @param int size: number of symbols in the compressed file
+        @param iterable[int] offsets: bit offsets recorded so far
+        @param int|NoneType file_size: length of the compressed file
+        @param int|NoneType header_crc: CRC-32 of its header
+        @rtype: NoneType
+        """
+        self.interval = interval
+        self.size = size
+        self.offsets = array("Q", offsets)
+        self.file_size = file_size
+        self.header_crc = header_crc
+
+    def bind(self, header, file_size):
+        """ Record that self describes the compressed file with header
+        header and length file_size.
+
+        @param SeekIndex self: this SeekIndex
+        @param bytes header: header of the compressed file
+        @param int file_size: length of the compressed file in bytes
+        @rtype: NoneType
+        """
+        self.file_size = file_size
+        self.header_crc = zlib.crc32(header)
+
+    def describes(self, header, file_size, size):
+        """ Return whether self was written for the compressed file with
+        header header, length file_size and size symbols.
+
+        @param SeekIndex self: this SeekIndex
+        @param bytes header: header of the compressed file
+        @param int file_size: length of the compressed file in bytes
+        @param int size: number of symbols in the compressed file
+        @rtype: bool
+
+        >>> index = SeekIndex(4, 10, [0, 9, 20])
+        >>> index.bind(b"header", 100)
+        >>> index.describes(b"header", 100, 10)
+        True
+        >>> index.describes(b"other", 100, 10)
+        False
+        """
+        return (self.size == size and self.file_size == file_size and
+                self.header_crc == zlib.crc32(header) and
+                len(self.offsets) > 0)
+
+    def __eq__(self, other):
+        """ Return whether self is equivalent to other.
+
+        @param SeekIndex self: this SeekIndex
+        @param SeekIndex|Any other: object to compare with
+        @rtype: bool
+        """
+        return (type(self) == type(other) and
+                self.interval == other.interval and
+                self.size == other.size and self.offsets == other.offsets and
+                self.file_size == other.file_size and
+                self.header_crc == other.header_crc)
+
+    def __repr__(self):
+        """ Return constructor-style string representation.
+
+        @param SeekIndex self: this SeekIndex
+        @rtype: str
+        """
+        return "SeekIndex({}, {}, {})".format(self.interval, self.size,
+                                              list(self.offsets))
+
+    def locate(self, position):
+        """ Return the position of the last indexed symbol at or before
+        position, and its bit offset.
+
+        @param SeekIndex self: this SeekIndex
+        @param int position: index of a symbol
+        @rtype: tuple(int,int)
+
+        >>> SeekIndex(4, 10, [0, 9, 20]).locate(6)
+        (4, 9)
+        """
+        i = min(position // self.interval, len(self.offsets) - 1)
+        return i * self.interval, self.offsets[i]
+
+    def to_bytes(self):
+        """ Return the index file contents for self.
+
+        @param SeekIndex self: this SeekIndex
+        @rtype: bytes
+
+        >>> index = SeekIndex(4, 10, [0, 9, 20], 100, 12345)
+        >>> SeekIndex.from_bytes(index.to_bytes()) == index
+        True
+        """
+        offsets = array("Q", self.offsets)
+        if sys.byteorder == "little":
+            offsets.byteswap()
+        return (INDEX_MAGIC + bytes([INDEX_VERSION]) +
+                self.interval.to_bytes(4, "big") +
+                self.size.to_bytes(8, "big") +
+                (self.file_size or 0).to_bytes(8, "big") +
+                (self.header_crc or 0).to_bytes(4, "big") +
+                len(offsets).to_bytes(4, "big") + offsets.tobytes())
+
+    @classmethod
+    def from_bytes(cls, buf):
+        """ Return the SeekIndex stored in buf, the contents of an index
+        file.
+
+        @param type cls: SeekIndex
+        @param bytes buf: index file contents
+        @rtype: SeekIndex
+        """
+        if buf[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+            raise ValueError("not an index file")
+        pos = len(INDEX_MAGIC)
+        version = buf[pos]
+        if version > INDEX_VERSION:
+            raise ValueError("unsupported index version {}".format(version))
+        interval = int.from_bytes(buf[pos + 1:pos + 5], "big")
+        size = int.from_bytes(buf[pos + 5:pos + 13], "big")
+        pos += 13
+        file_size = header_crc = None
+        if version >= 2:
+            file_size = int.from_bytes(buf[pos:pos + 8], "big")
+            header_crc = int.from_bytes(buf[pos + 8:pos + 12], "big")
+            pos += 12
+        count = int.from_bytes(buf[pos:pos + 4], "big")
+        offsets = array("Q")
+        offsets.frombytes(buf[pos + 4:pos + 4 + 8 * count])
+        if sys.byteorder == "little":
+            offsets.byteswap()
+        return cls(interval, size, offsets, file_size, header_crc)
+
+
+def write_index(index, path):
+    """ Write index to the index file path.
+
+    @param SeekIndex index: index to write
+    @param str path: index file to create
+    @rtype: NoneType
+    """
+    with open(path, "wb") as f:
+        f.write(index.to_bytes())
+
+
+def remove_index(path):
+    """ Remove the index file path, if there is one.
+
+    @param str path: index file to remove
+    @rtype: NoneType
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def read_index(path):
+    """ Return the SeekIndex in the index file path, or None if there is
+    no such file.
+
+    @param str path: index file to read
+    @rtype: SeekIndex|NoneType
+    """
+    try:
+        with open(path, "rb") as f:
+            return SeekIndex.from_bytes(f.read())
+    except FileNotFoundError:
+        return None
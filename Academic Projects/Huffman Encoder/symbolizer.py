@@ -0,0 +1,291 @@
+"""
+Symbolizers: ways of cutting bytes into the symbols a code is built for.
+
+Bytes are the usual symbols, but text compresses better, and decodes more
+bytes per table lookup, with larger ones: 16-bit pairs of bytes, or whole
+words. A symbolizer turns each chunk of input into tokens, which are
+counted over the whole input; fit then picks the alphabet from the
+counts, freq says how often each symbol will occur, and symbols turns a
+chunk into symbols. Decoding only needs expand, the bytes of each symbol.
+
+Symbols are ints and may go well past 255; compress writes them into the
+header with SYMBOL_BYTES bytes each (see huffman.MODE_SYMBOLS). Each
+symbolizer has an ID for the header, and to_bytes and from_bytes for
+whatever it needs to expand symbols again, e.g. its vocabulary.
+"""
+
+import re
+import sys
+from array import array
+from collections import Counter
+
+
+# bytes per symbol, and per count of codes of a length, in the header
+SYMBOL_BYTES = 3
+
+
+class ByteSymbols:
+    """ Each byte is a symbol, as in the rest of the codec.
+    """
+
+    ID = 0
+
+    def tokens(self, chunk):
+        """ Return the tokens of chunk.
+
+        @param ByteSymbols self: this ByteSymbols
+        @param bytes chunk: a piece of input
+        @rtype: iterable
+        """
+        return chunk
+
+    def fit(self, token_counts):
+        """ Choose the alphabet for token_counts, the counts of tokens over
+        the whole input.
+
+        @param ByteSymbols self: this ByteSymbols
+        @param Counter token_counts: number of times each token occurs
+        @rtype: NoneType
+        """
+
+    def freq(self, token_counts):
+        """ Return the frequency of each symbol for token_counts.
+
+        @param ByteSymbols self: this ByteSymbols
+        @param Counter token_counts: number of times each token occurs
+        @rtype: dict(int,int)
+        """
+        return dict(token_counts)
+
+    def symbols(self, chunk):
+        """ Return the symbols of chunk.
+
+        @param ByteSymbols self: this ByteSymbols
+        @param bytes chunk: a piece of input
+        @rtype: iterable[int]
+        """
+        return chunk
+
+    def expand(self, symbol):
+        """ Return the bytes symbol stands for.
+
+        @param ByteSymbols self: this ByteSymbols
+        @param int symbol: a symbol
+        @rtype: bytes
+        """
+        return bytes([symbol])
+
+    def to_bytes(self):
+        """ Return what from_bytes needs to make an equivalent symbolizer.
+
+        @param ByteSymbols self: this ByteSymbols
+        @rtype: bytes
+        """
+        return b""
+
+    @classmethod
+    def from_bytes(cls, buf):
+        """ Return the symbolizer stored in buf by to_bytes.
+
+        @param type cls: this class
+        @param bytes buf: stored symbolizer
+        @rtype: ByteSymbols
+        """
+        return cls()
+
+
+class PairSymbols(ByteSymbols):
+    """ Each two bytes, little-endian, are a 16-bit symbol. An odd byte at
+    the end of a chunk is the symbol PAIRS + the byte.
+
+    >>> p = PairSymbols()
+    >>> list(p.symbols(b"abc"))
+    [25185, 65635]
+    >>> b"".join([p.expand(s) for s in p.symbols(b"abc")])
+    b'abc'
+    """
+
+    ID = 1
+    PAIRS = 1 << 16
+
+    def tokens(self, chunk):
+        """ Return the tokens of chunk, which are its symbols.
+
+        @param PairSymbols self: this PairSymbols
+        @param bytes chunk: a piece of input
+        @rtype: iterable[int]
+        """
+        return self.symbols(chunk)
+
+    def symbols(self, chunk):
+        """ Return the symbols of chunk.
+
+        @param PairSymbols self: this PairSymbols
+        @param bytes chunk: a piece of input
+        @rtype: iterable[int]
+        """
+        even = len(chunk) & ~1
+        pairs = array("H")
+        pairs.frombytes(chunk[:even])
+        if sys.byteorder == "big":
+            pairs.byteswap()
+        if even < len(chunk):
+            pairs = pairs.tolist()
+            pairs.append(self.PAIRS + chunk[even])
+        return pairs
+
+    def expand(self, symbol):
+        """ Return the bytes symbol stands for.
+
+        @param PairSymbols self: this PairSymbols
+        @param int symbol: a symbol
+        @rtype: bytes
+        """
+        if symbol >= self.PAIRS:
+            return bytes([symbol - self.PAIRS])
+        return symbol.to_bytes(2, "little")
+
+
+class WordSymbols(ByteSymbols):
+    """ Words, with the space before them if any, are symbols from 256 up,
+    if they occur often enough to be in the vocabulary; everything else is
+    spelled out in byte symbols.
+
+    >>> w = WordSymbols()
+    >>> w.fit(Counter(w.tokens(b"the cat and the hat and the bat the end")))
+    >>> w.vocabulary
+    [b' the', b' and']
+    >>> list(w.symbols(b"the bat and"))
+    [116, 104, 101, 32, 98, 97, 116, 257]
+
+    Attributes:
+    ===========
+    @param list[bytes] vocabulary: word of each symbol from 256 up
+    """
+
+    ID = 2
+    TOKEN = re.compile(rb" ?\w+|\W|\w")
+    # longest word the vocabulary may hold
+    MAX_WORD = 255
+
+    def __init__(self, max_words=1 << 16, min_count=2, vocabulary=()):
+        """ Create a new WordSymbols with up to max_words words, each seen
+        at least min_count times, in its vocabulary.
+
+        @param WordSymbols self: this WordSymbols
+        @param int max_words: most words in the vocabulary
+        @param int min_count: fewest times a word must occur
+        @param iterable[bytes] vocabulary: words to start with
+        @rtype: NoneType
+        """
+        self.max_words = max_words
+        self.min_count = min_count
+        self.vocabulary = list(vocabulary)
+        self._index = {word: 256 + i for i, word in enumerate(self.vocabulary)}
+
+    def tokens(self, chunk):
+        """ Return the tokens of chunk: words, each with the space before
+        it if any, and single other bytes.
+
+        @param WordSymbols self: this WordSymbols
+        @param bytes chunk: a piece of input
+        @rtype: list[bytes]
+        """
+        return self.TOKEN.findall(chunk)
+
+    def fit(self, token_counts):
+        """ Choose the vocabulary: the words of more than one byte that
+        occur at least min_count times, those that save the most bytes
+        first.
+
+        @param WordSymbols self: this WordSymbols
+        @param Counter token_counts: number of times each token occurs
+        @rtype: NoneType
+        """
+        words = [(-count * (len(word) - 1), word)
+                 for word, count in token_counts.items()
+                 if count >= self.min_count and
+                 1 < len(word) <= self.MAX_WORD]
+        words.sort()
+        self.vocabulary = [word for _, word in words[:self.max_words]]
+        self._index = {word: 256 + i for i, word in enumerate(self.vocabulary)}
+
+    def freq(self, token_counts):
+        """ Return the frequency of each symbol for token_counts.
+
+        @param WordSymbols self: this WordSymbols
+        @param Counter token_counts: number of times each token occurs
+        @rtype: dict(int,int)
+        """
+        freq = Counter()
+        index = self._index
+        for token, count in token_counts.items():
+            symbol = index.get(token)
+            if symbol is not None:
+                freq[symbol] += count
+            else:
+                for byte in token:
+                    freq[byte] += count
+        return dict(freq)
+
+    def symbols(self, chunk):
+        """ Return the symbols of chunk.
+
+        @param WordSymbols self: this WordSymbols
+        @param bytes chunk: a piece of input
+        @rtype: list[int]
+        """
+        index = self._index
+        result = []
+        for token in self.TOKEN.findall(chunk):
+            symbol = index.get(token)
+            if symbol is not None:
+                result.append(symbol)
+            else:
+                result.extend(token)
+        return result
+
+    def expand(self, symbol):
+        """ Return the bytes symbol stands for.
+
+        @param WordSymbols self: this WordSymbols
+        @param int symbol: a symbol
+        @rtype: bytes
+        """
+        if symbol < 256:
+            return bytes([symbol])
+        return self.vocabulary[symbol - 256]
+
+    def to_bytes(self):
+        """ Return the vocabulary: the number of words (4 bytes), then
+        each word's length (1 byte) and bytes.
+
+        @param WordSymbols self: this WordSymbols
+        @rtype: bytes
+
+        >>> w = WordSymbols(vocabulary=[b" the", b"and"])
+        >>> WordSymbols.from_bytes(w.to_bytes()).vocabulary
+        [b' the', b'and']
+        """
+        return len(self.vocabulary).to_bytes(4, "little") + b"".join(
+            [bytes([len(word)]) + word for word in self.vocabulary])
+
+    @classmethod
+    def from_bytes(cls, buf):
+        """ Return the WordSymbols with the vocabulary stored in buf.
+
+        @param type cls: WordSymbols
+        @param bytes buf: stored vocabulary
+        @rtype: WordSymbols
+        """
+        count = int.from_bytes(buf[:4], "little")
+        words = []
+        pos = 4
+        for _ in range(count):
+            end = pos + 1 + buf[pos]
+            words.append(bytes(buf[pos + 1:end]))
+            pos = end
+        return cls(vocabulary=words)
+
+
+SYMBOLIZERS = {cls.ID: cls for cls in (ByteSymbols, PairSymbols, WordSymbols)}
@@ -4,21 +4,63 @@
 Property testing for functions in huffman.py.
 """
 
+import asyncio
+import io
+import os
+import tempfile
+import tracemalloc
 import unittest
+from unittest import mock
 from random import shuffle
+from math import log2
+import huffman
 from huffman import byte_to_bits, bits_to_byte, get_bit, make_freq_dict
 from huffman import huffman_tree, get_codes, number_nodes
 from huffman import generate_compressed, generate_uncompressed
 from huffman import avg_length, tree_to_bytes, num_nodes_to_bytes
-from nodes import HuffmanNode
+from huffman import improve_tree, leaf_depths
+from huffman import TableDecoder, canonical_codes, code_lengths
+from huffman import compress_bytes, uncompress_bytes
+from huffman import limited_code_lengths, compress, uncompress, read_range
+from huffman import compress_adaptive, compress_context, stored_header_bytes
+from huffman import compress_bound, compress_into, decompress_into
+from huffman import uncompressed_size, iter_decompress
+from dictionary import Dictionary, train_dictionary
+from dictionary import compress_many, uncompress_many
+from codecache import CodeCache
+from metrics import Metrics
+import cli
+import aio
+from jobs import decompress_stream
+from parallel import compress_stream, compress_blocks, uncompress_blocks
+from tuner import TableTuner
+from symbolizer import SYMBOLIZERS
+from transforms import Pipeline, STAGES
+from bitio import BitReader, BitWriter
+from nodes import HuffmanNode, HuffmanTree
 from hypothesis import given, assume, settings
-from hypothesis.strategies import binary, integers, dictionaries, text
+from hypothesis.strategies import binary, integers, dictionaries, text, lists
 
 settings.register_profile("norand", settings(derandomize=True,
                                              max_examples=200))
 settings.load_profile("norand")
 
 
+class Trickle(io.RawIOBase):
+    """A raw stream that returns one byte per read, like a slow pipe"""
+
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        byte = self.data.read(1)
+        buf[:len(byte)] = byte
+        return len(byte)
+
+
 class TestByteUtilities(unittest.TestCase):
     """Property tests for byte functions"""
     
@@ -45,6 +87,21 @@ class TestByteUtilities(unittest.TestCase):
         self.assertTrue(isinstance(b, int))
         self.assertTrue(0 <= b <= 1)
 
+    @given(lists(integers(1, 70), 0, 50, 200))
+    def test_bit_writer_reader(self, lengths):
+        """BitReader reads back the codes BitWriter wrote, and the
+        writer pads to whole bytes"""
+
+        codes = [((1 << n) - 1) // 3 for n in lengths]
+        w = BitWriter()
+        for code, n in zip(codes, lengths):
+            w.write(code, n)
+        data = w.getvalue()
+        self.assertEqual(len(data), (sum(lengths) + 7) // 8)
+        r = BitReader(data)
+        self.assertEqual(codes, [r.read(n) for n in lengths])
+        self.assertTrue(0 <= r.bits_left < 8)
+
 
 class TestCompressionCode(unittest.TestCase):
     """Property tests for Huffman functions"""
@@ -106,6 +163,55 @@ class TestCompressionCode(unittest.TestCase):
         self.assertTrue(isinstance(f, float))
         self.assertTrue(0 <= f <= 8.0)
 
+    @given(dictionaries(integers(0, 255), integers(1, 1000), dict, 2, 256, 256))
+    def test_improve_tree(self, d):
+        """improve_tree makes a tree of the right shape, with its symbols
+        shuffled, as good as the Huffman tree"""
+
+        t = huffman_tree(d)
+        best = avg_length(t, d)
+        leaves = [leaf for leaf, _ in leaf_depths(t)]
+        symbols = [leaf.symbol for leaf in leaves]
+        shuffle(symbols)
+        for leaf, symbol in zip(leaves, symbols):
+            leaf.symbol = symbol
+        improve_tree(t, d)
+        self.assertAlmostEqual(best, avg_length(t, d))
+
+    @given(dictionaries(integers(0, 255), integers(1, 1000), dict, 2, 256, 256),
+           binary(0, 100, 1000))
+    def test_table_tuner(self, d, b):
+        """a TableTuner keeps the shape of its code, and re-fitting never
+        makes the counted symbols take more bits"""
+
+        lengths = code_lengths(d)
+        tuner = TableTuner(lengths, min_gain=0)
+        tuner.update(b)
+        before = tuner.current_length()
+        tuner.maybe_refit()
+        self.assertLessEqual(tuner.current_length(), before + 1e-9)
+        self.assertEqual(sorted(lengths.values()),
+                         sorted(tuner.lengths.values()))
+        self.assertEqual(set(lengths), set(tuner.lengths))
+
+    @given(dictionaries(integers(0, 255), integers(1, 1000), dict, 2, 256, 256),
+           binary(1, 100, 1000), binary(1, 100, 1000))
+    def test_table_tuner_bound(self, d, b, c):
+        """the entropy a TableTuner keeps as it counts is that of its
+        counts, and bounds what a re-fit can save"""
+
+        tuner = TableTuner(code_lengths(d), decay=0.5)
+        tuner.update(b)
+        tuner.update(c)
+        counts = [n for n in tuner.counts.values() if n]
+        total = sum(counts)
+        entropy = -sum([n / total * log2(n / total) for n in counts])
+        self.assertAlmostEqual(entropy, tuner.entropy_length())
+        self.assertLessEqual(tuner.entropy_length(),
+                             tuner.refit_length() + 1e-9)
+        self.assertLessEqual(tuner.predicted_gain(),
+                             tuner.gain_bound() + 1e-6)
+
     @given(binary(2, 100, 1000))
     def test_generate_compressed(self, b):
         """generate_compressed should return a bytes
@@ -130,6 +236,78 @@ class TestCompressionCode(unittest.TestCase):
         compressed2 = generate_compressed(b, c)
         self.assertEqual(len(compressed2), len(compressed))
         
+    @given(dictionaries(integers(0, 255), integers(1, 1000), dict, 1, 256, 256))
+    def test_canonical_codes(self, d):
+        """canonical codes keep the Huffman code lengths and no code
+        is a prefix of another"""
+
+        lengths = code_lengths(d)
+        codes = canonical_codes(lengths)
+        self.assertEqual(lengths, {k: len(codes[k]) for k in codes})
+        ordered = sorted(codes.values())
+        for a, b in zip(ordered, ordered[1:]):
+            self.assertFalse(b.startswith(a))
+
+    @given(dictionaries(integers(0, 255), integers(1, 1000), dict, 2, 256, 256),
+           integers(1, 16))
+    def test_limited_code_lengths(self, d, limit):
+        """package-merge lengths respect the limit and form a prefix
+        code, and are as good as Huffman when the limit does not bind"""
+
+        assume(len(d) <= 2 ** limit)
+        lengths = limited_code_lengths(d, limit)
+        self.assertTrue(max(lengths.values()) <= limit)
+        self.assertTrue(sum([2 ** -n for n in lengths.values()]) <= 1)
+        huffman = code_lengths(d)
+        cost = sum([d[k] * lengths[k] for k in d])
+        best = sum([d[k] * huffman[k] for k in d])
+        self.assertTrue(cost >= best)
+        if max(huffman.values()) <= limit:
+            self.assertEqual(cost, best)
+
+    @given(dictionaries(integers(0, 255), integers(1, 1000), dict, 2, 256, 256))
+    def test_huffman_tree_flat(self, d):
+        """a HuffmanTree converts to and from HuffmanNodes and gives the
+        same codes and serialization as the HuffmanNode functions"""
+
+        t = huffman_tree(d)
+        flat = HuffmanTree.from_node(t)
+        self.assertEqual(t, flat.to_node())
+        self.assertEqual(get_codes(t), flat.codes())
+        number_nodes(t)
+        flat.number_nodes()
+        self.assertEqual(tree_to_bytes(t), flat.to_bytes())
+        self.assertEqual(t.number, flat.node(flat.root).number)
+
+    def test_deep_tree(self):
+        """trees far deeper than the recursion limit can be built,
+        numbered and coded"""
+
+        n = 5000
+        t = huffman_tree({k: 2 ** k for k in range(n)})
+        number_nodes(t)
+        self.assertEqual(n, t.number + 2)
+        c = get_codes(t)
+        self.assertEqual(n - 1, max([len(code) for code in c.values()]))
+
+    @unittest.skipIf(huffman.numpy_backend is None, "needs NumPy")
+    @given(binary(0, 100, 1000))
+    def test_numpy_backend(self, b):
+        """the NumPy backend counts and encodes exactly like the
+        pure Python code"""
+
+        saved = huffman.USE_NUMPY
+        try:
+            results = []
+            for use_numpy in (False, True):
+                huffman.USE_NUMPY = use_numpy
+                d = make_freq_dict(b)
+                c = get_codes(huffman_tree(d)) if d else {}
+                results.append((list(d.items()), generate_compressed(b, c)))
+        finally:
+            huffman.USE_NUMPY = saved
+        self.assertEqual(results[0], results[1])
+
     @given(binary(2, 100, 1000))
     def test_tree_to_bytes(self, b):
         """tree_to_bytes generates a bytes representation of
@@ -182,5 +360,422 @@ class TestRoundTrip(unittest.TestCase):
         uncompressed = generate_uncompressed(tree, compressed, len(orig_text))
         assert orig_text == uncompressed
 
+    @given(binary(1, 100, 1000), integers(1, 12))
+    def test_round_trip_window(self, b, bits):
+        """generate_uncompressed inverts generate_compressed whatever
+        the width of its lookup window"""
+
+        freq = make_freq_dict(b)
+        assume(len(freq) > 1)
+        tree = huffman_tree(freq)
+        compressed = generate_compressed(b, get_codes(tree))
+        self.assertEqual(b, generate_uncompressed(tree, compressed, len(b),
+                                                  bits))
+
+    @given(binary(0, 100, 1000))
+    def test_round_trip_bytes(self, b):
+        """uncompress_bytes inverts compress_bytes"""
+
+        self.assertEqual(b, uncompress_bytes(compress_bytes(b)))
+
+    @given(binary(1, 100, 1000), integers(1, 16))
+    def test_round_trip_chunked(self, b, chunk_size):
+        """TableDecoder gives the same result whichever way the
+        compressed input is split into chunks"""
+
+        freq = make_freq_dict(b)
+        assume(len(freq) > 1)
+        codes = get_codes(huffman_tree(freq))
+        compressed = generate_compressed(b, codes)
+        decoder = TableDecoder(codes, len(b))
+        pieces = [decoder.decode(compressed[i:i + chunk_size])
+                  for i in range(0, len(compressed), chunk_size)]
+        pieces.append(decoder.decode(b"", final=True))
+        self.assertEqual(b, b"".join(pieces))
+
+    @given(binary(0, 64, 256), integers(1, 16))
+    def test_round_trip_mmap(self, b, chunk_size):
+        """compress and uncompress write the same files with and without
+        memory maps"""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            names = [os.path.join(tmp, name) for name in "abcde"]
+            with open(names[0], "wb") as f:
+                f.write(b)
+            compress(names[0], names[1], chunk_size)
+            compress(names[0], names[2], chunk_size, use_mmap=True)
+            uncompress(names[2], names[3], chunk_size, use_mmap=True)
+            uncompress(names[1], names[4], chunk_size)
+            with open(names[1], "rb") as f1, open(names[2], "rb") as f2:
+                self.assertEqual(f1.read(), f2.read())
+            for name in names[3:]:
+                with open(name, "rb") as f:
+                    self.assertEqual(b, f.read())
+
+    @given(binary(0, 64, 256), integers(1, 8), integers(0, 300),
+           integers(0, 300))
+    def test_read_range(self, b, interval, start, length):
+        """read_range gives the same bytes as slicing the original, with
+        and without a seek index"""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            name = os.path.join(tmp, "a")
+            # b alone is usually stored; padded with zeros it gets coded
+            for data in (b, b + bytes(4 * len(b))):
+                with open(name, "wb") as f:
+                    f.write(data)
+                compress(name, name + ".huf", 4)
+                self.assertEqual(data[start:start + length],
+                                 read_range(name + ".huf", start, length))
+                compress(name, name + ".huf", 4, index_interval=interval)
+                self.assertEqual(data[start:start + length],
+                                 read_range(name + ".huf", start, length))
+
+    def test_read_range_stale_index(self):
+        """an index left from compressing other data of the same length is
+        not used, whether compress removes it or it is put back"""
+
+        first = b"gchhbcegic" * 1000
+        second = b"abcdefghij" * 1000
+        with tempfile.TemporaryDirectory() as tmp:
+            name = os.path.join(tmp, "a")
+            with open(name, "wb") as f:
+                f.write(first)
+            compress(name, name + ".huf", index_interval=1000, verbose=False)
+            with open(name + ".huf.idx", "rb") as f:
+                stale = f.read()
+            with open(name, "wb") as f:
+                f.write(second)
+            compress(name, name + ".huf", verbose=False)
+            self.assertFalse(os.path.exists(name + ".huf.idx"))
+            self.assertEqual(second[5000:5020],
+                             read_range(name + ".huf", 5000, 20))
+            with open(name + ".huf.idx", "wb") as f:
+                f.write(stale)
+            self.assertEqual(second[5000:5020],
+                             read_range(name + ".huf", 5000, 20))
+
+    @given(binary(0, 64, 256), integers(1, 8))
+    def test_round_trip_stored(self, b, chunk_size):
+        """compress output is never bigger than storing the input, and
+        uncompresses to the original"""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            names = [os.path.join(tmp, name) for name in "abc"]
+            with open(names[0], "wb") as f:
+                f.write(b)
+            compress(names[0], names[1], chunk_size)
+            self.assertLessEqual(os.path.getsize(names[1]),
+                                 len(stored_header_bytes(len(b))) + len(b))
+            uncompress(names[1], names[2], chunk_size)
+            with open(names[2], "rb") as f:
+                self.assertEqual(b, f.read())
+            self.assertEqual(b, uncompress_bytes(compress_bytes(b)))
+
+    @given(lists(binary(0, 8, 16), 0, 20, 40), integers(0, 2),
+           integers(1, 8))
+    def test_round_trip_symbols(self, words, symbolizer_id, chunk_size):
+        """text compressed with any symbolizer uncompresses to the
+        original, whatever the chunk size"""
+
+        b = b" ".join(words + words)
+        with tempfile.TemporaryDirectory() as tmp:
+            names = [os.path.join(tmp, name) for name in "abc"]
+            with open(names[0], "wb") as f:
+                f.write(b)
+            compress(names[0], names[1], chunk_size, verbose=False,
+                     symbolizer=SYMBOLIZERS[symbolizer_id]())
+            uncompress(names[1], names[2], chunk_size)
+            with open(names[2], "rb") as f:
+                self.assertEqual(b, f.read())
+
+    @given(binary(0, 100, 300), lists(integers(0, 2), 0, 3, 4),
+           integers(1, 64))
+    def test_round_trip_pipeline(self, b, stage_ids, block_size):
+        """any chain of transforms over any block size round trips, with
+        runs long enough for run-length coding"""
+
+        b = b + b[:1] * 300 + b
+        pipeline = Pipeline([STAGES[i]() for i in stage_ids], block_size)
+        with tempfile.TemporaryDirectory() as tmp:
+            names = [os.path.join(tmp, name) for name in "abc"]
+            with open(names[0], "wb") as f:
+                f.write(b)
+            compress(names[0], names[1], 16, verbose=False,
+                     pipeline=pipeline)
+            uncompress(names[1], names[2], 16)
+            with open(names[2], "rb") as f:
+                self.assertEqual(b, f.read())
+            with open(names[1], "rb") as f:
+                self.assertEqual(b, uncompress_bytes(f.read()))
+
+    @given(binary(0, 100, 1000), integers(1, 64))
+    def test_iter_decompress(self, b, chunk_size):
+        """iter_decompress yields non-empty pieces that join up to the
+        original, from a file object or a file name"""
+
+        compressed = compress_bytes(b)
+        pieces = list(iter_decompress(io.BytesIO(compressed), chunk_size))
+        self.assertTrue(all(pieces))
+        self.assertEqual(b, b"".join(pieces))
+        with tempfile.TemporaryDirectory() as tmp:
+            name = os.path.join(tmp, "a.huf")
+            with open(name, "wb") as f:
+                f.write(compressed)
+            self.assertEqual(b, b"".join(iter_decompress(name, chunk_size)))
+
+    @given(binary(0, 100, 1000), integers(0, 16))
+    def test_round_trip_into(self, b, slack):
+        """compress_into and decompress_into round trip through reused
+        buffers, writing what compress_bytes returns"""
+
+        buf = bytearray(compress_bound(len(b)) + slack)
+        n = compress_into(memoryview(b), buf)
+        self.assertEqual(compress_bytes(b), bytes(buf[:n]))
+        out = bytearray(uncompressed_size(buf[:n]) + slack)
+        self.assertEqual(len(b), decompress_into(memoryview(buf)[:n], out))
+        self.assertEqual(b, bytes(out[:len(b)]))
+        if b:
+            with self.assertRaises(ValueError):
+                decompress_into(buf[:n], bytearray(len(b) - 1))
+
+    @given(binary(0, 64, 256), integers(1, 8), integers(0, 1))
+    def test_metrics(self, b, chunk_size, use_mmap):
+        """compress and uncompress record the sizes of what they read and
+        wrote in each stage"""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            names = [os.path.join(tmp, name) for name in "abc"]
+            with open(names[0], "wb") as f:
+                f.write(b)
+            m = Metrics()
+            compress(names[0], names[1], chunk_size, use_mmap=use_mmap,
+                     metrics=m)
+            uncompress(names[1], names[2], chunk_size, use_mmap=use_mmap,
+                       metrics=m)
+            stats = m.as_dict()
+            self.assertEqual(["count", "code_table", "encode", "header",
+                              "decode"], [s.name for s in m.stages])
+            self.assertEqual(len(b), stats["count"]["bytes_in"])
+            self.assertEqual(os.path.getsize(names[1]),
+                             stats["encode"]["bytes_out"])
+            self.assertEqual(os.path.getsize(names[1]),
+                             stats["header"]["header_size"] +
+                             stats["decode"]["bytes_in"])
+            self.assertEqual(len(b), stats["decode"]["bytes_out"])
+
+    def test_metrics_traced(self):
+        """a traced stage reports the memory it allocated when tracemalloc
+        is already tracing, with or without tracemalloc.reset_peak, and
+        leaves it tracing"""
+
+        reset_peak = getattr(tracemalloc, "reset_peak", None)
+        tracemalloc.start()
+        try:
+            for has_reset in (True, False):
+                if not has_reset and reset_peak is not None:
+                    del tracemalloc.reset_peak
+                m = Metrics(trace_memory=True)
+                with m.stage("alloc"):
+                    buf = bytearray(1 << 20)
+                self.assertGreaterEqual(m.stages[0].peak_memory, len(buf))
+                self.assertTrue(tracemalloc.is_tracing())
+        finally:
+            if reset_peak is not None:
+                tracemalloc.reset_peak = reset_peak
+            tracemalloc.stop()
+
+    @given(lists(binary(0, 64, 256), 1, 2, 3), integers(1, 2))
+    def test_round_trip_cli(self, texts, workers):
+        """the command line compresses files matched by a pattern and
+        decompresses them to the originals"""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            names = [os.path.join(tmp, "{}.txt".format(i))
+                     for i in range(len(texts))]
+            for name, b in zip(names, texts):
+                with open(name, "wb") as f:
+                    f.write(b)
+            pattern = os.path.join(tmp, "*.txt")
+            self.assertEqual(0, cli.main(["compress", "-j", str(workers),
+                                          pattern]))
+            for name in names:
+                os.remove(name)
+            self.assertEqual(0, cli.main(["decompress", pattern + ".huf"]))
+            for name, b in zip(names, texts):
+                with open(name, "rb") as f:
+                    self.assertEqual(b, f.read())
+
+    @given(binary(0, 64, 256), integers(1, 64))
+    def test_round_trip_cli_stream(self, b, block_size):
+        """a block file the command line writes from standard input
+        decompresses by name"""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            name = os.path.join(tmp, "t.txt")
+            stdin = io.TextIOWrapper(io.BytesIO(b))
+            with mock.patch("sys.stdin", stdin):
+                self.assertEqual(0, cli.main(["compress", "--block-size",
+                                              str(block_size), "-o",
+                                              name + ".huf", "-"]))
+            self.assertEqual(0, cli.main(["decompress", name + ".huf"]))
+            with open(name, "rb") as f:
+                self.assertEqual(b, f.read())
+
+    # each example starts two process pools, so keep to a few
+    @settings(max_examples=10)
+    @given(binary(0, 64, 256), integers(1, 16))
+    def test_round_trip_blocks(self, b, block_size):
+        """compress_blocks and uncompress_blocks round trip on two
+        processes, empty files and files of many blocks included"""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            names = [os.path.join(tmp, name) for name in "abc"]
+            for data in (b, b""):
+                with open(names[0], "wb") as f:
+                    f.write(data)
+                compress_blocks(names[0], names[1], block_size, workers=2)
+                uncompress_blocks(names[1], names[2], workers=2)
+                with open(names[2], "rb") as f:
+                    self.assertEqual(data, f.read())
+
+    @given(binary(0, 64, 256), integers(1, 64))
+    def test_round_trip_decompress_trickle(self, b, block_size):
+        """decompress_stream tells block files from other compressed files
+        on a pipe that returns one byte per read"""
+
+        blocks = io.BytesIO()
+        compress_stream(io.BytesIO(b), blocks, block_size, 1)
+        for packed in (blocks.getvalue(), compress_bytes(b)):
+            out = io.BytesIO()
+            decompress_stream(io.BufferedReader(Trickle(packed)), out, 1)
+            self.assertEqual(b, out.getvalue())
+
+    @given(lists(binary(0, 64, 256), 2, 4, 6), integers(1, 3))
+    def test_round_trip_aio_many(self, texts, limit):
+        """compress_many compresses files concurrently, gives their stats
+        in the order of the inputs, and each file uncompresses to the
+        original"""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            names = [os.path.join(tmp, "{}.txt".format(i))
+                     for i in range(len(texts))]
+            for name, b in zip(names, texts):
+                with open(name, "wb") as f:
+                    f.write(b)
+
+            async def round_trip():
+                stats = await aio.compress_many(names, limit=limit)
+                await asyncio.gather(*[aio.uncompress(name + ".huf",
+                                                      name + ".orig")
+                                       for name in names])
+                return stats
+
+            stats = asyncio.run(round_trip())
+            self.assertEqual(names, [s["input"] for s in stats])
+            self.assertEqual([name + ".huf" for name in names],
+                             [s["output"] for s in stats])
+            self.assertFalse(any(["error" in s for s in stats]))
+            for name, b in zip(names, texts):
+                with open(name + ".orig", "rb") as f:
+                    self.assertEqual(b, f.read())
+
+    @given(binary(0, 64, 256), integers(1, 64), integers(1, 16))
+    def test_round_trip_aio(self, b, block_size, piece):
+        """iter_compress and iter_uncompress round trip, however the input
+        and the compressed stream are cut up"""
+
+        async def round_trip():
+            pieces = [b[i:i + piece] for i in range(0, len(b), piece)]
+            packed = b"".join([chunk async for chunk in
+                               aio.iter_compress(pieces, block_size)])
+            pieces = [packed[i:i + piece]
+                      for i in range(0, len(packed), piece)]
+            return b"".join([chunk async for chunk in
+                             aio.iter_uncompress(pieces)])
+
+        self.assertEqual(b, asyncio.run(round_trip()))
+
+    @given(binary(0, 64, 512), integers(1, 16))
+    def test_round_trip_adaptive(self, b, chunk_size):
+        """compress_adaptive output uncompresses to the original"""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            names = [os.path.join(tmp, name) for name in "abc"]
+            with open(names[0], "wb") as f:
+                f.write(b)
+            compress_adaptive(names[0], names[1], chunk_size)
+            uncompress(names[1], names[2], chunk_size)
+            with open(names[2], "rb") as f:
+                self.assertEqual(b, f.read())
+            uncompress(names[1], names[2], chunk_size, use_mmap=True)
+            with open(names[2], "rb") as f:
+                self.assertEqual(b, f.read())
+
+    @given(binary(0, 64, 512), integers(1, 16))
+    def test_round_trip_context(self, b, chunk_size):
+        """compress_context output uncompresses to the original"""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            names = [os.path.join(tmp, name) for name in "abc"]
+            with open(names[0], "wb") as f:
+                f.write(b)
+            compress_context(names[0], names[1], chunk_size)
+            uncompress(names[1], names[2], chunk_size)
+            with open(names[2], "rb") as f:
+                self.assertEqual(b, f.read())
+
+    @given(binary(0, 64, 512), lists(binary(0, 16, 64), 0, 8, 16))
+    def test_round_trip_dictionary(self, sample, payloads):
+        """payloads compressed with a dictionary trained on any sample
+        uncompress to the originals, also after saving the dictionary"""
+
+        d = train_dictionary([sample])
+        buffers = compress_many(payloads, d)
+        self.assertEqual(payloads, uncompress_many(buffers, d))
+        d = Dictionary.from_bytes(d.to_bytes())
+        self.assertEqual(payloads, uncompress_many(buffers, d))
+
+    @given(lists(binary(0, 64, 256), 1, 3, 4), integers(1, 4))
+    def test_round_trip_cache(self, texts, maxsize):
+        """a cache with no tolerance gives the same output as none, and a
+        tolerant one still round trips"""
+
+        exact = CodeCache(maxsize, bits=8)
+        tolerant = CodeCache(maxsize, 0.05, bits=8)
+        for b in texts + texts:
+            compressed = compress_bytes(b, cache=exact)
+            self.assertEqual(compress_bytes(b), compressed)
+            self.assertEqual(b, uncompress_bytes(compressed, cache=exact))
+            compressed = compress_bytes(b, cache=tolerant)
+            self.assertEqual(b, uncompress_bytes(compressed,
+                                                 cache=tolerant))
+        self.assertTrue(exact.info().currsize <= maxsize)
+
+    @given(dictionaries(integers(0, 255), integers(1, 1000), dict, 2, 256, 256))
+    def test_cache_tree(self, d):
+        """a cache hit gives back the tree already built, not a new one"""
+
+        cache = CodeCache()
+        tree = cache.for_freq(d).tree
+        tables = cache.for_freq(d)
+        self.assertEqual(1, cache.info().hits)
+        self.assertIs(tree, tables.tree)
+        self.assertIs(tables.tree, tables.tree)
+        self.assertEqual(tables.codes, tree.codes())
+
+    @given(binary(0, 256, 512), integers(0, 255), integers(1, 64))
+    def test_cache_low_entropy(self, wide, symbol, repeats):
+        """a tolerant cache never codes a block of one symbol with a table
+        built for a wider block, which would take more than 1 bit each"""
+
+        cache = CodeCache(tolerance=0.05, bits=8)
+        wide += bytes(range(256))
+        compress_bytes(wide, cache=cache)
+        narrow = bytes([symbol]) * (16 * repeats)
+        compressed = compress_bytes(narrow, cache=cache)
+        self.assertEqual(len(compress_bytes(narrow)), len(compressed))
+        self.assertEqual(narrow, uncompress_bytes(compressed, cache=cache))
+
 if __name__ == "__main__":
     unittest.main()
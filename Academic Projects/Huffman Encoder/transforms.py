@@ -0,0 +1,401 @@
+"""
+Transforms that make data easier to compress, run before Huffman coding.
+
+A Pipeline runs its stages over the input a block at a time, each stage
+on the output of the one before, and frames each transformed block with
+its length (4 bytes). compress(..., pipeline=...) codes the framed
+blocks and records the stages in the header (huffman.MODE_PIPELINE), so
+uncompress runs their inverses, in reverse order, with no help.
+
+The stages are RunLength, for long runs of one byte such as silence;
+BlockSort, the Burrows-Wheeler transform, which sorts the bytes by what
+follows them so that similar contexts bring the same bytes together; and
+MoveToFront, which turns such clusters into runs of small numbers. The
+usual chain is the one bzip2 uses:
+
+    >>> p = Pipeline([RunLength(), BlockSort(), MoveToFront()])
+    >>> framed = b"".join(p.forward([b"banana bandana"]))
+    >>> p.inverse(framed[4:])
+    b'banana bandana'
+"""
+
+import re
+from collections import deque
+from itertools import accumulate, chain, repeat
+from operator import add, mul, ne, sub
+
+try:
+    import numpy_backend
+except ImportError:
+    numpy_backend = None
+
+# whether to sort suffixes with numpy_backend; on when NumPy is installed
+USE_NUMPY = numpy_backend is not None
+
+# input bytes per block; a block is what BlockSort sorts at once
+BLOCK_SIZE = 1 << 18
+# bytes of each block's length, and of the block size in the header
+LENGTH_BYTES = 4
+
+
+class RunLength:
+    """ Run-length encoding as bzip2 does it first: after four equal bytes
+    comes the number (0 to 255) of further copies of that byte.
+
+    >>> RunLength().forward(b"abbbbbbc")
+    b'abbbb\\x02c'
+    >>> RunLength().inverse(b"abbbb\\x02c")
+    b'abbbbbbc'
+    """
+
+    ID = 0
+    RUN = re.compile(rb"(.)\1{3,}", re.DOTALL)
+    # four equal bytes and the count after them
+    CODED_RUN = re.compile(rb"(.)\1{3}(.)", re.DOTALL)
+
+    @staticmethod
+    def _code_run(match):
+        """ Return the run-length code for the run in match.
+
+        @param re.Match match: a run of four or more equal bytes
+        @rtype: bytes
+        """
+        byte = match.group(1)
+        n = len(match.group(0))
+        pieces = []
+        while n >= 4:
+            extra = min(n - 4, 255)
+            pieces.append(byte * 4 + bytes([extra]))
+            n -= 4 + extra
+        # a short tail starts a new run, so it cannot be mistaken for one
+        pieces.append(byte * n)
+        return b"".join(pieces)
+
+    def forward(self, block):
+        """ Return block with its runs coded.
+
+        @param RunLength self: this RunLength
+        @param bytes block: a block of input
+        @rtype: bytes
+        """
+        return self.RUN.sub(self._code_run, block)
+
+    def inverse(self, block):
+        """ Return the block forward turned into block.
+
+        @param RunLength self: this RunLength
+        @param bytes block: a block of forward's output
+        @rtype: bytes
+        """
+        return self.CODED_RUN.sub(
+            lambda match: match.group(1) * (4 + match.group(2)[0]), block)
+
+
+class MoveToFront:
+    """ Move-to-front coding: each byte becomes its position in a list of
+    all bytes, most recently seen first, so repeats become 0.
+
+    >>> MoveToFront().forward(b"aaabbba")
+    b'a\\x00\\x00b\\x00\\x00\\x01'
+    >>> MoveToFront().inverse(b"a\\x00\\x00b\\x00\\x00\\x01")
+    b'aaabbba'
+    """
+
+    ID = 1
+    RUN = re.compile(rb"(.)\1*", re.DOTALL)
+    # a position and the repeats after it
+    CODED_RUN = re.compile(rb".\x00*", re.DOTALL)
+
+    def forward(self, block):
+        """ Return the position of each byte of block.
+
+        @param MoveToFront self: this MoveToFront
+        @param bytes block: a block of input
+        @rtype: bytes
+        """
+        order = bytearray(range(256))
+        out = bytearray()
+        # a run of one byte is its position and then zeros
+        for match in self.RUN.finditer(block):
+            byte = match.group(1)[0]
+            i = order.index(byte)
+            if i:
+                del order[i]
+                order.insert(0, byte)
+            out.append(i)
+            out += bytes(match.end() - match.start() - 1)
+        return bytes(out)
+
+    def inverse(self, block):
+        """ Return the block forward turned into block.
+
+        @param MoveToFront self: this MoveToFront
+        @param bytes block: a block of forward's output
+        @rtype: bytes
+        """
+        order = bytearray(range(256))
+        out = bytearray()
+        for match in self.CODED_RUN.finditer(block):
+            i = block[match.start()]
+            byte = order[i]
+            if i:
+                del order[i]
+                order.insert(0, byte)
+            out += bytes([byte]) * (match.end() - match.start())
+        return bytes(out)
+
+
+def suffix_array(data):
+    """ Return the start of each suffix of data, in sorted order, taking
+    data to end with a byte smaller than any other; the empty suffix,
+    len(data), comes first.
+
+    Suffixes are sorted by their first k bytes for k = 1, 2, 4, ... until
+    no two are alike, each round sorting by the ranks from the round
+    before (prefix doubling), in O(n log^2 n) time at worst. With NumPy
+    installed, numpy_backend.suffix_array does the same on arrays.
+
+    @param bytes data: a bytes object
+    @rtype: list[int]
+
+    >>> suffix_array(b"banana")
+    [6, 5, 3, 1, 0, 4, 2]
+    """
+    if USE_NUMPY and data:
+        return numpy_backend.suffix_array(data).tolist()
+    n = len(data) + 1
+    rank = [byte + 1 for byte in data]
+    rank.append(0)
+    order = sorted(range(n), key=rank.__getitem__)
+    scale = max(n, 257)
+    k = 1
+    while True:
+        # past the end counts as 0: such suffixes already differ from the
+        # rest in their first k bytes, which take in the end
+        keys = list(map(add, map(mul, rank, repeat(scale)),
+                        chain(rank[k:], repeat(0, min(k, n)))))
+        order.sort(key=keys.__getitem__)
+        ordered = list(map(keys.__getitem__, order))
+        ranks = list(accumulate(chain([0], map(ne, ordered, ordered[1:]))))
+        deque(map(rank.__setitem__, order, ranks), 0)
+        if ranks[-1] == n - 1:
+            return order
+        k *= 2
+
+
+class BlockSort:
+    """ The Burrows-Wheeler transform: the byte before each suffix of the
+    block, in the sorted order of the suffixes, after the position of the
+    empty suffix (4 bytes), which the inverse needs.
+
+    >>> BlockSort().forward(b"banana")
+    b'\\x04\\x00\\x00\\x00annbaa'
+    >>> BlockSort().inverse(b"\\x04\\x00\\x00\\x00annbaa")
+    b'banana'
+    """
+
+    ID = 2
+
+    def forward(self, block):
+        """ Return the transform of block.
+
+        @param BlockSort self: this BlockSort
+        @param bytes block: a block of input
+        @rtype: bytes
+        """
+        if not block:
+            return bytes(LENGTH_BYTES)
+        order = suffix_array(block)
+        # the empty suffix has no byte before it; say where it was instead
+        primary = order.index(0)
+        last = bytearray(map(block.__getitem__, map(sub, order, repeat(1))))
+        del last[primary]
+        return primary.to_bytes(LENGTH_BYTES, "little") + bytes(last)
+
+    def inverse(self, block):
+        """ Return the block forward turned into block.
+
+        @param BlockSort self: this BlockSort
+        @param bytes block: a block of forward's output
+        @rtype: bytes
+        """
+        primary = int.from_bytes(block[:LENGTH_BYTES], "little")
+        last = list(block[LENGTH_BYTES:])
+        n = len(last)
+        # -1 stands for the end of the block, smaller than any byte
+        last.insert(primary, -1)
+        # the suffix after the one that starts at the byte in sorted
+        # position i is the one in row follow[i]
+        follow = sorted(range(n + 1), key=last.__getitem__)
+        first = [-1] + sorted(last[:primary] + last[primary + 1:])
+        out = bytearray(n)
+        row = 0
+        for i in range(n):
+            row = follow[row]
+            out[i] = first[row]
+        return bytes(out)
+
+
+STAGES = {cls.ID: cls for cls in (RunLength, MoveToFront, BlockSort)}
+
+
+class Pipeline:
+    """ A chain of stages run over blocks of input.
+
+    Attributes:
+    ===========
+    @param list stages: the stages, in the order forward runs them
+    @param int block_size: input bytes per block
+    """
+
+    def __init__(self, stages, block_size=BLOCK_SIZE):
+        """ Create a new Pipeline of stages over blocks of block_size
+        bytes.
+
+        @param Pipeline self: this Pipeline
+        @param list stages: RunLength, MoveToFront or BlockSort stages
+        @param int block_size: input bytes per block
+        @rtype: NoneType
+        """
+        self.stages = list(stages)
+        self.block_size = block_size
+
+    def __repr__(self):
+        """ Return a string representation of self.
+
+        @param Pipeline self: this Pipeline
+        @rtype: str
+
+        >>> Pipeline([RunLength(), BlockSort()], 1024)
+        Pipeline([RunLength, BlockSort], 1024)
+        """
+        return "Pipeline([{}], {})".format(
+            ", ".join([type(stage).__name__ for stage in self.stages]),
+            self.block_size)
+
+    def blocks(self, chunks):
+        """ Yield chunks cut and joined into blocks of block_size bytes,
+        and a shorter last block.
+
+        @param Pipeline self: this Pipeline
+        @param iterable[bytes] chunks: pieces of input
+        @rtype: generator[bytes]
+        """
+        buf = bytearray()
+        for chunk in chunks:
+            buf += chunk
+            while len(buf) >= self.block_size:
+                yield bytes(buf[:self.block_size])
+                del buf[:self.block_size]
+        if buf:
+            yield bytes(buf)
+
+    def forward(self, chunks):
+        """ Yield each block of chunks run through every stage, after its
+        length.
+
+        @param Pipeline self: this Pipeline
+        @param iterable[bytes] chunks: pieces of input
+        @rtype: generator[bytes]
+        """
+        for block in self.blocks(chunks):
+            for stage in self.stages:
+                block = stage.forward(block)
+            yield len(block).to_bytes(LENGTH_BYTES, "little") + block
+
+    def inverse(self, block):
+        """ Return block, one block of forward's output without its
+        length, run back through every stage.
+
+        @param Pipeline self: this Pipeline
+        @param bytes block: a transformed block
+        @rtype: bytes
+        """
+        for stage in reversed(self.stages):
+            block = stage.inverse(block)
+        return block
+
+    def to_bytes(self):
+        """ Return the number of stages (1 byte), the ID of each (1 byte)
+        and the block size (4 bytes).
+
+        @param Pipeline self: this Pipeline
+        @rtype: bytes
+
+        >>> list(Pipeline([RunLength(), BlockSort()], 1024).to_bytes())
+        [2, 0, 2, 0, 4, 0, 0]
+        """
+        return (bytes([len(self.stages)]) +
+                bytes([stage.ID for stage in self.stages]) +
+                self.block_size.to_bytes(LENGTH_BYTES, "little"))
+
+    @classmethod
+    def read(cls, f):
+        """ Read a Pipeline written by to_bytes from file f.
+
+        @param type cls: Pipeline
+        @param file f: a file opened for reading in binary mode
+        @rtype: Pipeline
+        """
+        count = f.read(1)[0]
+        stages = []
+        for stage_id in f.read(count):
+            if stage_id not in STAGES:
+                raise ValueError("unknown pipeline stage {}".format(stage_id))
+            stages.append(STAGES[stage_id]())
+        return cls(stages, int.from_bytes(f.read(LENGTH_BYTES), "little"))
+
+
+class PipelineDecoder:
+    """ Decodes MODE_PIPELINE data, one piece of input at a time: decodes
+    it with the decoder of the coded blocks, and runs each block back
+    through the pipeline once all of it has been decoded.
+
+    Attributes:
+    ===========
+    @param int remaining: number of bytes still to be decoded
+    """
+
+    def __init__(self, pipeline, decoder, size):
+        """ Create a new PipelineDecoder for size bytes put through
+        pipeline, whose blocks decoder decodes.
+
+        @param PipelineDecoder self: this PipelineDecoder
+        @param Pipeline pipeline: the stages the blocks went through
+        @param object decoder: decoder of the framed blocks, from
+            huffman.read_decoder
+        @param int size: number of bytes to decode
+        @rtype: NoneType
+        """
+        self.remaining = size
+        self._pipeline = pipeline
+        self._decoder = decoder
+        self._buf = bytearray()
+
+    def decode(self, data, final=False):
+        """ Return the bytes of every block that can be finished once data
+        is appended to the input so far; pass final=True with the last
+        piece of input.
+
+        @param PipelineDecoder self: this PipelineDecoder
+        @param bytes|memoryview data: next piece of compressed input
+        @param bool final: whether data ends the compressed input
+        @rtype: bytes
+        """
+        buf = self._buf
+        buf += self._decoder.decode(data, final)
+        out = bytearray()
+        start = 0
+        while len(buf) - start >= LENGTH_BYTES:
+            end = start + LENGTH_BYTES + int.from_bytes(
+                buf[start:start + LENGTH_BYTES], "little")
+            if len(buf) < end:
+                break
+            out += self._pipeline.inverse(
+                bytes(buf[start + LENGTH_BYTES:end]))
+            start = end
+        del buf[:start]
+        if final and buf:
+            raise ValueError("pipeline data ends in the middle of a block")
+        self.remaining -= len(out)
+        return bytes(out)
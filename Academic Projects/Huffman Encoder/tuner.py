@@ -0,0 +1,251 @@
+"""
+Re-fitting a fixed-shape code table to frequencies that drift.
+
+A long-lived encoder, e.g. one compressing a stream with a Dictionary or a
+table from a CodeCache, can keep the shape of its code (the lengths it
+uses, and so the longest code and the decoder's table width) and only
+reassign which symbol gets which length, with huffman.refit_lengths, as
+the data changes. A TableTuner counts the symbols coded so far and
+decides when that is worth doing: when the bits a re-fit is predicted to
+save over the next horizon symbols, given the counts so far, are at least
+min_gain per unit of rebuild work, taken to be n log2 n for n symbols.
+
+Working out the exact saving needs the re-fit itself, so should_refit
+first checks a bound kept up to date as symbols are counted: no code,
+re-fitted or not, beats the entropy of the counts. Only if that bound
+allows a big enough saving does it sort, and then at most once every
+rebuild_cost() symbols counted, so deciding costs O(1) per symbol.
+
+    >>> t = TableTuner({97: 1, 98: 2, 99: 2}, horizon=100)
+    >>> t.update(b"bbbbbbbbbbbbc")
+    >>> t.should_refit()
+    True
+    >>> t.maybe_refit(), t.lengths[98]
+    (True, 1)
+"""
+
+from math import log2
+
+from huffman import make_freq_dict, refit_lengths, canonical_codes
+from huffman import codes_to_table
+
+
+# bits a re-fit must be predicted to save per unit of rebuild work
+MIN_GAIN = 1.0
+# number of symbols a re-fit is expected to be used for
+HORIZON = 1 << 16
+
+
+class TableTuner:
+    """ Code lengths of a fixed shape, re-fitted to the symbols counted as
+    they are coded.
+
+    Attributes:
+    ===========
+    @param dict(int,int) lengths: current mapping from symbols to lengths
+    @param dict(int,float) counts: symbol counts, with older counts decayed
+    @param float min_gain: bits to save per unit of rebuild work
+    @param int horizon: number of symbols a re-fit is expected to serve
+    @param float decay: factor older counts are scaled by at each update
+    @param int refits: number of re-fits so far
+    """
+
+    def __init__(self, lengths, min_gain=MIN_GAIN, horizon=HORIZON,
+                 decay=1.0):
+        """ Create a new TableTuner for code lengths lengths, with nothing
+        counted.
+
+        @param TableTuner self: this TableTuner
+        @param dict(int,int) lengths: mapping from symbols to code lengths
+        @param float min_gain: bits to save per unit of rebuild work
+        @param int horizon: number of symbols a re-fit is expected to serve
+        @param float decay: factor older counts are scaled by at each
+            update, 1.0 to keep them all
+        @rtype: NoneType
+        """
+        self.lengths = dict(lengths)
+        self.counts = dict.fromkeys(lengths, 0)
+        self.min_gain = min_gain
+        self.horizon = horizon
+        self.decay = decay
+        self.refits = 0
+        self._total = 0
+        self._bits = 0
+        # sum of count * log2(count), for the entropy of the counts
+        self._plogp = 0.0
+        # symbols counted since should_refit last sorted
+        self._unchecked = 0
+        self._codes = self._table = None
+
+    def add(self, freq_dict):
+        """ Count the symbols in freq_dict. Symbols without a code are
+        not counted.
+
+        The running totals are kept up to date as counts are added, so
+        this takes time in the number of symbols in freq_dict, plus the
+        size of the table if counts decay.
+
+        @param TableTuner self: this TableTuner
+        @param dict(int,int) freq_dict: frequency dictionary
+        @rtype: NoneType
+        """
+        counts, lengths = self.counts, self.lengths
+        if self.decay != 1.0:
+            for symbol in counts:
+                counts[symbol] *= self.decay
+            # scaling every count by d scales sum c log2 c to
+            # d (sum c log2 c) + d log2(d) (sum c)
+            self._plogp = self.decay * (self._plogp +
+                                        log2(self.decay) * self._total)
+            self._total *= self.decay
+            self._bits *= self.decay
+        for symbol, count in freq_dict.items():
+            if symbol in counts:
+                old = counts[symbol]
+                new = counts[symbol] = old + count
+                self._plogp += new * log2(new) - (old * log2(old)
+                                                  if old else 0.0)
+                self._total += count
+                self._bits += count * lengths[symbol]
+                self._unchecked += count
+
+    def update(self, text):
+        """ Count the symbols of text, e.g. the bytes just coded.
+
+        @param TableTuner self: this TableTuner
+        @param bytes text: a bytes object
+        @rtype: NoneType
+        """
+        self.add(make_freq_dict(text))
+
+    def current_length(self):
+        """ Return the bits per symbol the counts take with the current
+        lengths, 0.0 if nothing has been counted.
+
+        @param TableTuner self: this TableTuner
+        @rtype: float
+        """
+        return self._bits / self._total if self._total else 0.0
+
+    def entropy_length(self):
+        """ Return the entropy of the counts in bits per symbol, which no
+        code, re-fitted or not, can beat; 0.0 if nothing has been counted.
+        Kept up to date by add, so this takes constant time.
+
+        @param TableTuner self: this TableTuner
+        @rtype: float
+        """
+        if not self._total:
+            return 0.0
+        return max(0.0, log2(self._total) - self._plogp / self._total)
+
+    def refit_length(self):
+        """ Return the bits per symbol the counts would take with re-fitted
+        lengths, 0.0 if nothing has been counted. This re-fits a copy of
+        the lengths, so it costs as much as refit.
+
+        @param TableTuner self: this TableTuner
+        @rtype: float
+        """
+        if not self._total:
+            return 0.0
+        lengths = refit_lengths(self.lengths, self.counts)
+        return sum([count * lengths[symbol]
+                    for symbol, count in self.counts.items()]) / self._total
+
+    def predicted_gain(self):
+        """ Return the bits a re-fit is predicted to save over the next
+        horizon symbols.
+
+        @param TableTuner self: this TableTuner
+        @rtype: float
+        """
+        return (self.current_length() - self.refit_length()) * self.horizon
+
+    def gain_bound(self):
+        """ Return the most bits a re-fit could save over the next horizon
+        symbols, in constant time.
+
+        @param TableTuner self: this TableTuner
+        @rtype: float
+        """
+        return (self.current_length() - self.entropy_length()) * self.horizon
+
+    def rebuild_cost(self):
+        """ Return the work of a re-fit, n log2 n for n symbols.
+
+        @param TableTuner self: this TableTuner
+        @rtype: float
+        """
+        n = len(self.lengths)
+        return n * max(1.0, log2(n)) if n else 1.0
+
+    def should_refit(self):
+        """ Return whether the predicted gain of a re-fit is at least
+        min_gain per unit of rebuild cost.
+
+        The predicted gain is only worked out if gain_bound allows enough,
+        and at least rebuild_cost() symbols have been counted since it last
+        said no, or a re-fit was made; otherwise this says no without
+        sorting anything.
+
+        @param TableTuner self: this TableTuner
+        @rtype: bool
+        """
+        cost = self.rebuild_cost()
+        need = self.min_gain * cost
+        if self.gain_bound() < need or self._unchecked < cost:
+            return False
+        gain = self.predicted_gain()
+        if gain > 0 and gain >= need:
+            return True
+        self._unchecked = 0
+        return False
+
+    def refit(self):
+        """ Re-fit the lengths to the counts.
+
+        @param TableTuner self: this TableTuner
+        @rtype: NoneType
+        """
+        self.lengths = refit_lengths(self.lengths, self.counts)
+        self._bits = sum([count * self.lengths[symbol]
+                          for symbol, count in self.counts.items()])
+        self._codes = self._table = None
+        self._unchecked = 0
+        self.refits += 1
+
+    def maybe_refit(self):
+        """ Re-fit the lengths if should_refit says so, and return whether
+        they were.
+
+        @param TableTuner self: this TableTuner
+        @rtype: bool
+        """
+        if not self.should_refit():
+            return False
+        self.refit()
+        return True
+
+    @property
+    def codes(self):
+        """ Return the canonical codes for the current lengths.
+
+        @param TableTuner self: this TableTuner
+        @rtype: dict(int,str)
+        """
+        if self._codes is None:
+            self._codes = canonical_codes(self.lengths)
+        return self._codes
+
+    @property
+    def table(self):
+        """ Return the encoder table for the current lengths, as made by
+        codes_to_table.
+
+        @param TableTuner self: this TableTuner
+        @rtype: list[tuple(int,int)|NoneType]
+        """
+        if self._table is None:
+            self._table = codes_to_table(self.codes)
+        return self._table